@@ -3,7 +3,7 @@ import graphene
 import crm.schema
 
 
-class Query(graphene.ObjectType):
+class Query(crm.schema.Query, graphene.ObjectType):
     hello = graphene.String(default_value="Hello, GraphQL!")
 
 
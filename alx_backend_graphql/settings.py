@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,6 +51,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Routage primaire / réplicas par requête (crm/routing.py)
+    'crm.routing.primary_pinning_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -81,9 +84,111 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Connexions persistantes : pragmas de crm/sqlite.py appliqués une fois
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Attente du verrou (s) : busy_timeout réglé par le module sqlite3
+            'timeout': 20,
+        },
+    }
+}
+
+# Profil SQLite appliqué à chaque connexion (pragmas : crm/sqlite.py). WAL sur
+# activation explicite en production : CRM_SQLITE_JOURNAL_MODE=WAL
+CRM_SQLITE = {
+    'JOURNAL_MODE': os.environ.get('CRM_SQLITE_JOURNAL_MODE') or None,
+}
+
+# Réplicas en lecture des opérations `query` (crm/routing.py), ex.
+# CRM_REPLICA_DATABASES=/srv/replica1.sqlite3,/srv/replica2.sqlite3
+CRM_REPLICA_DATABASES = [name for name in os.environ.get('CRM_REPLICA_DATABASES', '').split(',') if name]
+for _index, _name in enumerate(CRM_REPLICA_DATABASES, start=1):
+    DATABASES[f'replica{_index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _name,
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        # Base de test : celle du primaire (pas de réplication entre deux bases de test)
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['crm.routing.ReplicaRouter']
+CRM_DATABASE_ROUTING = {
+    'PRIMARY': 'default',
+    'REPLICAS': [f'replica{index}' for index in range(1, len(CRM_REPLICA_DATABASES) + 1)],
+    'EJECT_SECONDS': 30,
+    'PIN_SECONDS': 5,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Caches partagés par tous les processus (web, workers Celery, cron) : les
+# versions des étiquettes du cache de réponses (crm/response_cache.py) y sont
+# stockées, une écriture faite par un worker invalide donc les réponses servies
+# par le web. Par défaut, fichiers sous CRM_CACHE_DIR (processus d'une même
+# machine, sans service à lancer) ; en production, Redis avec CRM_CACHE_URL
+# (ex. redis://localhost:6379/1, une autre base que le broker Celery ; taille
+# bornée côté serveur : maxmemory, politique allkeys-lru).
+CRM_CACHE_URL = os.environ.get('CRM_CACHE_URL')
+CRM_CACHE_DIR = os.environ.get('CRM_CACHE_DIR', str(BASE_DIR / '.cache'))
+
+
+def _shared_cache(alias, **options):
+    if CRM_CACHE_URL:
+        return {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CRM_CACHE_URL, **options}
+    return {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CRM_CACHE_DIR, alias),
+        **options,
     }
+
+
+CACHES = {
+    'default': _shared_cache('default', KEY_PREFIX='crm'),
+    # Cache des réponses GraphQL (crm/response_cache.py)
+    'graphql': _shared_cache('graphql', KEY_PREFIX='graphql', TIMEOUT=60),
+}
+
+# Caches propres au processus : tests (test_settings.py) et benchmarks
+# mono-processus uniquement, l'invalidation n'y traverse pas les processus
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'graphql': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'graphql-responses',
+        'TIMEOUT': 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
 
+GRAPHQL_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'graphql',
+    'TIMEOUT': 60,
+}
+
+# Budget des opérations GraphQL (crm/complexity.py) : coût x first / last
+GRAPHQL_QUERY_COST = {
+    'MAX_COST': 10000,
+    'MAX_DEPTH': 12,
+    'LIST_SIZE': 10,
+}
+
+# Mesures par résolveur (crm/metrics.py), exposées sur /graphql/metrics
+GRAPHQL_METRICS = {
+    'ENABLED': True,
+    'DEBUG_HEADER': 'X-GraphQL-Debug',
+    'SINK': 'crm.metrics.InMemorySink',
+}
+
+# /graphql servi par la vue asynchrone (déploiement ASGI, voir asgi.py)
+GRAPHQL_ASYNC = os.environ.get('GRAPHQL_ASYNC', '0') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
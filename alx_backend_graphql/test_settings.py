@@ -0,0 +1,6 @@
+# alx_backend_graphql/test_settings.py
+"""Settings des tests (`manage.py test`) : caches en mémoire, sans Redis."""
+from .settings import *  # noqa: F401,F403
+from .settings import LOCAL_CACHES
+
+CACHES = LOCAL_CACHES
@@ -14,13 +14,20 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
+from crm.views import AsyncGraphQLView, CachedGraphQLView, export, graphql_metrics, graphql_stats
 from .schema import schema
 
+GraphQLViewClass = AsyncGraphQLView if settings.GRAPHQL_ASYNC else CachedGraphQLView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+path("graphql", csrf_exempt(GraphQLViewClass.as_view(graphiql=True, schema=schema))),
+    path("graphql/async", csrf_exempt(AsyncGraphQLView.as_view(graphiql=True, schema=schema))),
+    path("graphql/stats", graphql_stats),
+    path("graphql/metrics", graphql_metrics),
+    path("export/<str:kind>", export),
 ]
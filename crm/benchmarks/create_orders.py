@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Temps de create_orders (mutation createOrders) selon la taille du lot : le
+coût doit croître linéairement avec le nombre de commandes. Les UPDATE à
+base de CASE (réservation du stock, agrégats des clients, ventes
+journalières) sont découpés en paquets de quelques centaines de clés ; un
+CASE unique sur tout le lot coûte le carré de son nombre de branches.
+
+Le script travaille sur une base SQLite dédiée (jamais db.sqlite3) :
+    python crm/benchmarks/create_orders.py --sizes 1000 4000 10000
+
+Chaque lot est créé dans la même base, sur des clients et produits tirés au
+hasard ; le script affiche la durée totale, la durée par commande et la
+répartition entre réservation, INSERT et agrégats.
+"""
+
+import argparse
+import functools
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql.settings')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/tmp/crm_create_orders_bench.sqlite3', help="Fichier SQLite de benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 2000, 4000, 8000],
+                        help="Tailles de lot mesurées")
+    parser.add_argument('--customers', type=int, default=20_000)
+    parser.add_argument('--products', type=int, default=2_000)
+    parser.add_argument('--items-per-order', type=int, default=2)
+    return parser.parse_args()
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    settings.DATABASES['default']['NAME'] = db_path
+    # Mesure de create_orders seule : ni journal des requêtes (DEBUG) ni métriques
+    settings.DEBUG = False
+    settings.GRAPHQL_METRICS = {**settings.GRAPHQL_METRICS, 'ENABLED': False}
+    # Invalidations du cache de réponses en mémoire : ni Redis ni coût réseau
+    settings.CACHES = settings.LOCAL_CACHES
+    django.setup()
+
+
+def seed(args):
+    from django.core.management import call_command
+    from django.db import transaction
+    from crm.models import Customer, Product
+
+    call_command('migrate', verbosity=0)
+    rng = random.Random(42)
+    with transaction.atomic():
+        Customer.objects.bulk_create(
+            (Customer(first_name='Client', last_name=str(i), email=f'batch{i}@example.com')
+             for i in range(args.customers)),
+            batch_size=1000,
+        )
+        Product.objects.bulk_create(
+            (Product(name=f'Produit {i}', price=Decimal(rng.randint(100, 10000)) / 100, stock_quantity=10 ** 9)
+             for i in range(args.products)),
+            batch_size=1000,
+        )
+    return list(Customer.objects.values_list('pk', flat=True)), list(Product.objects.values_list('pk', flat=True))
+
+
+def timed(timings, label, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings[label] = timings.get(label, 0.0) + time.perf_counter() - start
+    return wrapper
+
+
+def main():
+    args = parse_args()
+    setup_django(args.db)
+    from unittest import mock
+    from crm import customer_stats, orders, rollup
+    from crm.models import Order, OrderItem
+
+    customer_ids, product_ids = seed(args)
+    rng = random.Random(1)
+    print(f"{args.customers} clients, {args.products} produits, {args.items_per_order} lignes par commande")
+    for size in args.sizes:
+        specs = []
+        for _ in range(size):
+            products = rng.sample(product_ids, args.items_per_order)
+            specs.append(orders.OrderSpec(rng.choice(customer_ids), products, [rng.randint(1, 3) for _ in products]))
+
+        timings = {}
+        with mock.patch.object(orders, 'reserve_stock', timed(timings, 'stock', orders.reserve_stock)), \
+                mock.patch.object(Order.objects, 'bulk_create', timed(timings, 'commandes', Order.objects.bulk_create)), \
+                mock.patch.object(OrderItem.objects, 'bulk_create', timed(timings, 'lignes', OrderItem.objects.bulk_create)), \
+                mock.patch.object(customer_stats, 'add_orders', timed(timings, 'clients', customer_stats.add_orders)), \
+                mock.patch.object(rollup, 'add_orders', timed(timings, 'ventes', rollup.add_orders)):
+            start = time.perf_counter()
+            results = orders.create_orders(specs)
+            elapsed = time.perf_counter() - start
+
+        errors = sum(error is not None for _, error in results)
+        detail = '  '.join(f"{label} {value:.2f}s" for label, value in timings.items())
+        print(f"{size:>7} commandes : {elapsed:7.2f}s  ({elapsed / size * 1000:.2f} ms/commande, "
+              f"{errors} erreur(s))  {detail}")
+
+
+if __name__ == '__main__':
+    main()
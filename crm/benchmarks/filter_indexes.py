@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark des filtres CustomerFilter / ProductFilter / OrderFilter avec et sans
+les index de la migration 0002_filter_indexes.
+
+Le script travaille sur une base SQLite dédiée (jamais db.sqlite3) :
+    python crm/benchmarks/filter_indexes.py --orders 1000000
+
+Pour chaque combinaison de filtres il affiche le plan de requête (EXPLAIN) et
+la latence médiane de ce que fait la connexion GraphQL : COUNT(*) + première page.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql.settings')
+
+STATUSES = ['pending', 'paid', 'shipped', 'delivered', 'cancelled']
+BATCH_SIZE = 10000
+PAGE_SIZE = 20
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/tmp/crm_filter_bench.sqlite3', help="Fichier SQLite de benchmark")
+    parser.add_argument('--orders', type=int, default=1_000_000)
+    parser.add_argument('--customers', type=int, default=50_000)
+    parser.add_argument('--products', type=int, default=5_000)
+    parser.add_argument('--items-per-order', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=5, help="Exécutions par mesure")
+    parser.add_argument('--reseed', action='store_true', help="Recrée la base même si elle existe")
+    return parser.parse_args()
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = db_path
+    django.setup()
+
+
+def insert_rows(cursor, table, columns, rows):
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            batch.clear()
+    if batch:
+        cursor.executemany(sql, batch)
+
+
+def seed(args):
+    from django.core.management import call_command
+    from django.db import connection, transaction
+    from crm.models import Customer, Product, Order, OrderItem
+
+    call_command('migrate', verbosity=0)
+    if Order.objects.exists() and not args.reseed:
+        print(f"Base existante réutilisée ({Order.objects.count()} commandes)")
+        return
+
+    rng = random.Random(42)
+    now = datetime.now(dt_timezone.utc)
+    start = time.perf_counter()
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in (OrderItem, Order, Product, Customer):
+            cursor.execute(f"DELETE FROM {model._meta.db_table}")
+
+        insert_rows(cursor, Customer._meta.db_table,
+                    ['id', 'first_name', 'last_name', 'email', 'phone', 'address', 'created_at'],
+                    ((i, f"Prénom{i}", f"Nom{i}", f"client{i}@example.com", '', '', now)
+                     for i in range(1, args.customers + 1)))
+        insert_rows(cursor, Product._meta.db_table,
+                    ['id', 'name', 'description', 'price', 'stock_quantity', 'is_available'],
+                    ((i, f"Produit {i}", '', f"{rng.uniform(1, 500):.2f}", rng.randint(0, 200), rng.random() < 0.8)
+                     for i in range(1, args.products + 1)))
+        insert_rows(cursor, Order._meta.db_table,
+                    ['id', 'customer_id', 'order_date', 'status', 'total_amount'],
+                    ((i, rng.randint(1, args.customers), now - timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60)),
+                      rng.choice(STATUSES), f"{rng.uniform(5, 2000):.2f}")
+                     for i in range(1, args.orders + 1)))
+        insert_rows(cursor, OrderItem._meta.db_table,
+                    ['order_id', 'product_id', 'quantity', 'unit_price'],
+                    ((order_id, rng.randint(1, args.products), rng.randint(1, 5), f"{rng.uniform(1, 500):.2f}")
+                     for order_id in range(1, args.orders + 1)
+                     for _ in range(args.items_per_order)))
+        cursor.execute("ANALYZE")
+    print(f"Seed : {args.orders} commandes en {time.perf_counter() - start:.1f}s")
+
+
+def scenarios():
+    from crm.filters import CustomerFilter, ProductFilter, OrderFilter
+    from crm.models import OrderItem
+
+    today = datetime.now(dt_timezone.utc).date()
+    month_ago = today - timedelta(days=30)
+    return [
+        ("orders status", OrderFilter, {'status': 'paid'}),
+        ("orders status+date", OrderFilter, {'status': 'paid', 'order_date_min': month_ago}),
+        ("orders date range", OrderFilter, {'order_date_min': month_ago, 'order_date_max': today}),
+        ("orders customer+date", OrderFilter, {'customer': 123, 'order_date_min': month_ago}),
+        ("orders total range", OrderFilter, {'total_min': 1500, 'total_max': 1600}),
+        ("products available+price", ProductFilter, {'is_available': True, 'price_min': 100, 'price_max': 120}),
+        ("products price range", ProductFilter, {'price_min': 10, 'price_max': 20}),
+        ("customers email", CustomerFilter, {'email': 'client42@example.com'}),
+        ("items of order", None, lambda: OrderItem.objects.filter(order_id=4242, product_id__isnull=False)),
+    ]
+
+
+def build_queryset(filterset_class, data):
+    if filterset_class is None:
+        return data()
+    filterset = filterset_class(data=data, queryset=filterset_class._meta.model.objects.all())
+    if not filterset.is_valid():
+        raise ValueError(filterset.errors)
+    return filterset.qs
+
+
+def measure(filterset_class, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        queryset = build_queryset(filterset_class, data)
+        start = time.perf_counter()
+        queryset.count()
+        list(queryset[:PAGE_SIZE])
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), build_queryset(filterset_class, data).explain()
+
+
+def run_all(repeat):
+    return {name: measure(filterset_class, data, repeat) for name, filterset_class, data in scenarios()}
+
+
+def toggle_indexes(create):
+    from django.apps import apps
+    from django.db import connection
+
+    with connection.schema_editor() as editor:
+        for model in apps.get_app_config('crm').get_models():
+            for index in model._meta.indexes:
+                if create:
+                    editor.add_index(model, index)
+                else:
+                    editor.remove_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def main():
+    args = parse_args()
+    setup_django(args.db)
+    seed(args)
+
+    toggle_indexes(create=False)
+    before = run_all(args.repeat)
+    toggle_indexes(create=True)
+    after = run_all(args.repeat)
+
+    for name, _, _ in scenarios():
+        (before_ms, before_plan), (after_ms, after_plan) = before[name], after[name]
+        print("=" * 70)
+        print(f"{name} : {before_ms:.2f} ms -> {after_ms:.2f} ms")
+        print(f"  avant : {before_plan}")
+        print(f"  après : {after_plan}")
+
+
+if __name__ == '__main__':
+    main()
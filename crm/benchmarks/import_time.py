@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Temps d'import au démarrage, mesuré avec `python -X importtime`, contre un
+budget : à lancer en CI pour repérer un import lourd ajouté au niveau module
+(gql, requests... dans crm/tasks.py ou crm/cron.py).
+
+    python crm/benchmarks/import_time.py
+    python crm/benchmarks/import_time.py --repeat 7 --budget manage=800 --budget worker=800
+
+Scénarios, chacun dans un processus neuf :
+- manage : `manage.py check` (settings, applications, URLconf et schéma) ;
+- worker : démarrage d'un worker Celery (django.setup() puis import des
+  modules de tâches découverts par autodiscover_tasks).
+
+Le script affiche, par scénario, le temps d'import total (médiane sur
+--repeat exécutions), les modules de premier niveau les plus coûteux et les
+modules interdits chargés (--forbid, par défaut gql et requests pour le
+worker). Code de sortie 1 si un budget est dépassé ou un module interdit
+chargé.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+WORKER_BOOT = (
+    "import sys, django; django.setup()\n"
+    "from crm.celery import app\n"
+    "app.loader.import_default_modules()\n"
+    "print('\\n'.join(sorted(sys.modules)), file=sys.stdout)\n"
+)
+
+SCENARIOS = {
+    'manage': [str(BASE_DIR / 'manage.py'), 'check'],
+    'worker': ['-c', WORKER_BOOT],
+}
+
+# Budgets par défaut (ms), avec une marge sur les mesures de référence
+DEFAULT_BUDGETS = {'manage': 900.0, 'worker': 900.0}
+DEFAULT_FORBIDDEN = {'worker': ['gql', 'requests']}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=SCENARIOS, action='append',
+                        help="Scénario à mesurer (répétable ; par défaut : tous)")
+    parser.add_argument('--repeat', type=int, default=5, help="Exécutions par scénario (médiane)")
+    parser.add_argument('--budget', action='append', default=[], metavar='SCENARIO=MS',
+                        help="Budget de temps d'import (répétable)")
+    parser.add_argument('--forbid', action='append', default=[], metavar='SCENARIO=MODULE',
+                        help="Module qui ne doit pas être chargé (répétable)")
+    parser.add_argument('--top', type=int, default=10, help="Modules de premier niveau affichés")
+    return parser.parse_args()
+
+
+def parse_importtime(output):
+    """
+    Lignes de -X importtime -> {module de premier niveau: cumul (µs)}. Les
+    modules importés par un autre (indentés) sont inclus dans son cumul.
+    """
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # En-tête, ou module indenté (importé par un autre)
+        if not cumulative_us.strip().isdigit() or name[:2] == '  ':
+            continue
+        name = name.strip()
+        modules[name] = modules.get(name, 0) + int(cumulative_us)
+    return modules
+
+
+def run_once(scenario):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'alx_backend_graphql.settings', 'PYTHONDONTWRITEBYTECODE': '1'}
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', *SCENARIOS[scenario]],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if process.returncode:
+        raise SystemExit(f"{scenario} : échec\n{process.stderr[-2000:]}")
+    return parse_importtime(process.stderr), set(process.stdout.split())
+
+
+def measure(scenario, repeat):
+    totals, runs, loaded = [], [], set()
+    for _ in range(repeat):
+        modules, names = run_once(scenario)
+        totals.append(sum(modules.values()) / 1000)
+        runs.append(modules)
+        loaded |= names
+    # Médiane prise parmi les mesures : détail des modules de cette exécution
+    total = statistics.median_low(totals)
+    return total, runs[totals.index(total)], loaded
+
+
+def key_values(values, cast=str):
+    result = {}
+    for value in values:
+        key, _, item = value.partition('=')
+        result.setdefault(key, []).append(cast(item))
+    return result
+
+
+def main():
+    args = parse_args()
+    budgets = {**DEFAULT_BUDGETS, **{key: items[-1] for key, items in key_values(args.budget, float).items()}}
+    forbidden = {**DEFAULT_FORBIDDEN, **key_values(args.forbid)}
+
+    failures = []
+    for scenario in args.scenario or SCENARIOS:
+        total, modules, loaded = measure(scenario, args.repeat)
+        budget = budgets.get(scenario)
+        status = 'ok' if budget is None or total <= budget else 'DÉPASSÉ'
+        limit = f"budget {budget:.0f} ms" if budget is not None else "sans budget"
+        print(f"\n== {scenario} : {total:.0f} ms ({limit} : {status})")
+        for name, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"   {cumulative / 1000:8.1f} ms  {name}")
+        if status != 'ok':
+            failures.append(f"{scenario} : {total:.0f} ms > {budget:.0f} ms")
+
+        # sys.modules n'est listé que par les scénarios qui l'affichent (worker)
+        present = [name for name in forbidden.get(scenario, []) if name in loaded]
+        if present:
+            print(f"   modules interdits chargés : {', '.join(present)}")
+            failures.append(f"{scenario} : {', '.join(present)} importé(s) au démarrage")
+
+    if failures:
+        print("\nÉchec :\n   " + "\n   ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Charge concurrente lectures / écritures sur SQLite : profil par défaut de
+Django contre le profil de production (crm/sqlite.py et settings : WAL,
+synchronous=NORMAL, mmap, cache, busy_timeout, verrou d'écriture pris dès
+l'entrée des blocs write_atomic(), connexions persistantes).
+
+Le script travaille sur des bases SQLite dédiées (jamais db.sqlite3) :
+    python crm/benchmarks/sqlite_concurrency.py --threads 16 --duration 20
+
+N threads enchaînent des « requêtes » : une écriture (create_orders, comme
+la mutation createOrder) avec la probabilité --write-ratio, sinon une
+lecture (page de commandes d'un client avec client et lignes). Chaque
+requête ouvre / recycle sa connexion comme une requête HTTP
+(close_old_connections). Le script affiche, par profil, le débit, les
+latences p50 / p99 par type d'opération et les erreurs (« database is
+locked »...).
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql.settings')
+
+PROFILES = ('baseline', 'production')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/tmp/crm_sqlite_bench', help="Préfixe des fichiers SQLite de benchmark")
+    parser.add_argument('--profile', choices=PROFILES, action='append',
+                        help="Profil à mesurer (répétable ; par défaut : les deux)")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help="Durée de la mesure (s)")
+    parser.add_argument('--write-ratio', type=float, default=0.2, help="Part des écritures")
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--seed-orders', type=int, default=20000)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def setup_django(db_path, profile):
+    import django
+    from django.conf import settings
+
+    database = settings.DATABASES['default']
+    database['NAME'] = db_path
+    if profile == 'baseline':
+        # Réglages par défaut de Django : journal rollback, FULL, write_atomic() sans verrou anticipé,
+        # connexion par requête, attente du verrou de 5 s
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS'] = {}
+        settings.CRM_SQLITE = {'ENABLED': False}
+    else:
+        settings.CRM_SQLITE = {**settings.CRM_SQLITE, 'JOURNAL_MODE': 'WAL'}
+    # Mesure de la base seule : ni journal des requêtes (DEBUG) ni signaux de métriques
+    settings.DEBUG = False
+    settings.GRAPHQL_METRICS = {**settings.GRAPHQL_METRICS, 'ENABLED': False}
+    # Invalidations du cache de réponses en mémoire : ni Redis ni coût réseau
+    settings.CACHES = settings.LOCAL_CACHES
+    django.setup()
+
+
+def seed(args):
+    from django.core.management import call_command
+    from django.db import transaction
+    from crm.models import Customer, Product
+    from crm.orders import create_orders
+
+    call_command('migrate', verbosity=0)
+    rng = random.Random(42)
+    with transaction.atomic():
+        Customer.objects.bulk_create(
+            Customer(first_name='Client', last_name=str(i), email=f'bench{i}@example.com')
+            for i in range(args.customers)
+        )
+        Product.objects.bulk_create(
+            Product(name=f'Produit {i}', price=Decimal(rng.randint(100, 10000)) / 100, stock_quantity=10 ** 9)
+            for i in range(args.products)
+        )
+    customer_ids = list(Customer.objects.values_list('pk', flat=True))
+    product_ids = list(Product.objects.values_list('pk', flat=True))
+    for start in range(0, args.seed_orders, 1000):
+        create_orders(random_spec(rng, customer_ids, product_ids) for _ in range(min(1000, args.seed_orders - start)))
+    return customer_ids, product_ids
+
+
+def random_spec(rng, customer_ids, product_ids):
+    from crm.orders import OrderSpec
+
+    products = rng.sample(product_ids, rng.randint(1, 3))
+    return OrderSpec(rng.choice(customer_ids), products, [rng.randint(1, 3) for _ in products])
+
+
+def write(rng, customer_ids, product_ids):
+    from crm.orders import create_orders
+
+    [(order, error)] = create_orders([random_spec(rng, customer_ids, product_ids)])
+    if error:
+        raise RuntimeError(error)
+
+
+def read(rng, customer_ids, product_ids):
+    from crm.models import Order
+
+    orders = (
+        Order.objects.filter(customer_id=rng.choice(customer_ids))
+        .select_related('customer')
+        .prefetch_related('items')
+        .order_by('-order_date', '-id')[:20]
+    )
+    for order in orders:
+        order.items.all()
+
+
+def worker(index, args, customer_ids, product_ids, deadline, barrier, results):
+    from django.db import close_old_connections, connections
+
+    rng = random.Random(index)
+    latencies = {'read': [], 'write': []}
+    errors = {}
+    barrier.wait()
+    try:
+        while time.perf_counter() < deadline:
+            kind = 'write' if rng.random() < args.write_ratio else 'read'
+            # Début / fin de requête HTTP : connexion fermée ou conservée selon CONN_MAX_AGE
+            close_old_connections()
+            start = time.perf_counter()
+            try:
+                (write if kind == 'write' else read)(rng, customer_ids, product_ids)
+            except Exception as e:
+                key = f"{kind}: {type(e).__name__}: {e}"
+                errors[key] = errors.get(key, 0) + 1
+            else:
+                latencies[kind].append(time.perf_counter() - start)
+            close_old_connections()
+    finally:
+        connections.close_all()
+    results.append((latencies, errors))
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_profile(args, profile):
+    db_path = f"{args.db}_{profile}.sqlite3"
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    setup_django(db_path, profile)
+    from django.db import connection, connections
+    from crm.sqlite import current_pragmas
+
+    customer_ids, product_ids = seed(args)
+    pragmas = current_pragmas(connection, ['journal_mode', 'synchronous', 'busy_timeout'])
+    connections.close_all()
+
+    results = []
+    barrier = threading.Barrier(args.threads)
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(index, args, customer_ids, product_ids, deadline, barrier, results))
+        for index in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = {'profile': profile, 'pragmas': pragmas, 'operations': {}, 'errors': {}}
+    total = 0
+    for kind in ('read', 'write'):
+        latencies = [value for thread_latencies, _ in results for value in thread_latencies[kind]]
+        total += len(latencies)
+        report['operations'][kind] = {
+            'count': len(latencies),
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        }
+    for _, errors in results:
+        for key, count in errors.items():
+            report['errors'][key] = report['errors'].get(key, 0) + count
+    report['throughput'] = total / args.duration
+    return report
+
+
+def print_report(report):
+    print(f"\n== {report['profile']} ({', '.join(f'{k}={v}' for k, v in report['pragmas'].items())})")
+    print(f"   débit : {report['throughput']:.0f} op/s")
+    for kind, stats in report['operations'].items():
+        print(
+            f"   {kind:<5} {stats['count']:>7} ok   p50 {stats['p50_ms']:7.2f} ms   "
+            f"p99 {stats['p99_ms']:8.2f} ms   moyenne {stats['mean_ms']:7.2f} ms"
+        )
+    errors = sum(report['errors'].values())
+    print(f"   erreurs : {errors}")
+    for key, count in sorted(report['errors'].items(), key=lambda item: -item[1])[:5]:
+        print(f"     {count:>6}  {key[:120]}")
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        print(json.dumps(run_profile(args, args.profile[0])))
+        return
+
+    # Un processus par profil : les settings ne sont lus qu'une fois par django.setup()
+    print(f"{args.threads} threads, {args.duration:.0f} s, {args.write_ratio:.0%} d'écritures")
+    reports = []
+    for profile in args.profile or PROFILES:
+        command = [sys.executable, __file__, '--child', '--profile', profile, *child_arguments(args)]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        reports.append(report)
+        print_report(report)
+
+    if len(reports) == 2:
+        before, after = reports
+        print(
+            f"\ndébit x{after['throughput'] / max(before['throughput'], 1e-9):.2f}, "
+            f"p99 écriture {before['operations']['write']['p99_ms']:.1f} -> "
+            f"{after['operations']['write']['p99_ms']:.1f} ms, "
+            f"erreurs {sum(before['errors'].values())} -> {sum(after['errors'].values())}"
+        )
+
+
+def child_arguments(args):
+    return [
+        '--db', args.db, '--threads', str(args.threads), '--duration', str(args.duration),
+        '--write-ratio', str(args.write_ratio), '--customers', str(args.customers),
+        '--products', str(args.products), '--seed-orders', str(args.seed_orders),
+    ]
+
+
+if __name__ == '__main__':
+    main()
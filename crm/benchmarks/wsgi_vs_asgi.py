@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test de charge de /graphql : déploiement WSGI (vue synchrone) contre ASGI
+(vue asynchrone, GRAPHQL_ASYNC=1 dans asgi.py).
+
+Démarrer les deux serveurs sur la même base, avec le même nombre de processus :
+    gunicorn alx_backend_graphql.wsgi -w 4 --threads 8 -b 127.0.0.1:8001
+    uvicorn alx_backend_graphql.asgi:application --workers 4 --port 8002
+
+puis :
+    python crm/benchmarks/wsgi_vs_asgi.py \\
+        --target wsgi=http://127.0.0.1:8001/graphql \\
+        --target asgi=http://127.0.0.1:8002/graphql \\
+        --concurrency 64 --duration 30
+
+Chaque cible reçoit la même requête (relations imbriquées) depuis N clients
+concurrents ; le script affiche le débit (req/s), les latences p50 / p99 et les
+erreurs. Le cache de réponses est contourné par une variable changeant à chaque
+requête, sauf avec --cached.
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+QUERY = """
+query Bench($first: Int) {
+    allOrders(first: $first) {
+        edges {
+            node {
+                totalAmount
+                customer { email }
+                items { quantity product { name price } }
+            }
+        }
+    }
+}
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True, metavar='NOM=URL',
+                        help="Point d'entrée GraphQL à mesurer (répétable)")
+    parser.add_argument('--concurrency', type=int, default=32, help="Clients concurrents")
+    parser.add_argument('--duration', type=float, default=20.0, help="Durée de la mesure (s)")
+    parser.add_argument('--warmup', type=float, default=3.0, help="Durée de chauffe (s)")
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--cached', action='store_true', help="Requêtes identiques (cache de réponses actif)")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    return parser.parse_args()
+
+
+def build_payload(args, sequence):
+    variables = {'first': args.page_size}
+    if not args.cached:
+        # Variable non déclarée, ignorée à l'exécution mais présente dans la
+        # clé du cache de réponses : chaque requête est réellement exécutée
+        variables['nonce'] = sequence
+    return json.dumps({'query': QUERY, 'variables': variables}).encode('utf-8')
+
+
+def post(url, body, timeout):
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        payload = json.loads(response.read())
+    if payload.get('errors'):
+        raise RuntimeError(payload['errors'][0].get('message'))
+
+
+def run(url, args, duration):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    counter = iter(range(1 << 62))
+
+    def client():
+        while time.perf_counter() < deadline:
+            with lock:
+                sequence = next(counter)
+            body = build_payload(args, sequence)
+            start = time.perf_counter()
+            try:
+                post(url, body, args.timeout)
+            except (urllib.error.URLError, OSError, RuntimeError, ValueError) as error:
+                with lock:
+                    errors.append(str(error))
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    args = parse_args()
+    targets = [target.split('=', 1) for target in args.target]
+
+    print(f"{'cible':<10} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'erreurs':>8}")
+    for name, url in targets:
+        if args.warmup:
+            run(url, args, args.warmup)
+        latencies, errors, elapsed = run(url, args, args.duration)
+        print(
+            f"{name:<10} {len(latencies) / elapsed:>9.1f} "
+            f"{statistics.median(latencies) * 1000 if latencies else float('nan'):>9.1f} "
+            f"{percentile(latencies, 0.99) * 1000:>9.1f} {len(errors):>8}"
+        )
+        if errors:
+            print(f"           première erreur : {errors[0]}")
+
+
+if __name__ == '__main__':
+    main()
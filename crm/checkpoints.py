@@ -0,0 +1,23 @@
+# crm/checkpoints.py
+"""
+Positions de reprise des traitements par lots (JobCheckpoint) : un traitement
+enregistre sa position après chaque lot validé, et l'exécution suivante (ou
+la reprise d'une exécution interrompue) repart de là.
+"""
+from .models import JobCheckpoint
+
+
+def load(name, using=None):
+    """Position enregistrée du traitement, {} s'il n'a jamais tourné."""
+    position = (
+        JobCheckpoint.objects.using(using).filter(name=name).values_list("position", flat=True).first()
+    )
+    return position or {}
+
+
+def save(name, position, using=None):
+    JobCheckpoint.objects.using(using).update_or_create(name=name, defaults={"position": position})
+
+
+def reset(name, using=None):
+    JobCheckpoint.objects.using(using).filter(name=name).delete()
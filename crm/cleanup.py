@@ -0,0 +1,137 @@
+# crm/cleanup.py
+"""
+Suppression des clients inactifs, par lots.
+
+Un client est inactif s'il n'a passé aucune commande (Order.order_date)
+depuis la date limite et a été créé avant elle. Les clients sont parcourus
+par lots d'ids croissants ; chaque lot est traité dans une transaction
+courte qui supprime ses lignes de commande, ses commandes puis ses clients
+en trois DELETE, sans charger les objets ni verrouiller la base pour tout
+le traitement.
+
+Après chaque lot, la position (date limite, dernier id parcouru) est
+enregistrée dans la même transaction (crm/checkpoints.py) : après un arrêt,
+l'exécution suivante reprend au lot suivant avec la même date limite.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import checkpoints, rollup
+from .models import Customer, Order, OrderItem
+from .response_cache import response_cache
+from .search import get_search_backend
+from .sqlite import write_atomic
+
+CHECKPOINT = "inactive_customer_cleanup"
+DEFAULT_CUSTOMER_CLEANUP = {
+    "INACTIVE_DAYS": 365,
+    "CHUNK_SIZE": 500,
+    # Pause entre deux lots (secondes), pour laisser passer les autres écritures
+    "SLEEP": 0.1,
+}
+
+
+def _config():
+    return {**DEFAULT_CUSTOMER_CLEANUP, **getattr(settings, "CRM_CUSTOMER_CLEANUP", {})}
+
+
+def inactive_customers(cutoff, using=None):
+    """Clients créés avant `cutoff` sans commande depuis (index crm_order_cust_date_idx)."""
+    recent_orders = Order.objects.using(using).filter(customer=OuterRef("pk"), order_date__gte=cutoff)
+    return Customer.objects.using(using).filter(created_at__lt=cutoff).exclude(Exists(recent_orders))
+
+
+def _raw_delete(queryset):
+    """
+    Un seul DELETE ... WHERE, sans Collector : ni objets chargés ni signaux.
+
+    QuerySet.delete() enverrait post_delete pour chaque commande et ligne :
+    refresh_customer_stats et refresh_sales_rollup (crm/signals.py) lanceraient
+    alors leurs requêtes commande par commande, pour des clients supprimés
+    dans la foulée. delete_customers fait ces mises à jour une fois par lot.
+
+    QuerySet._raw_delete est une API privée de Django : son comportement (un
+    seul DELETE, nombre de lignes retourné, aucun signal) est vérifié par
+    InactiveCustomerCleanupTests.test_raw_delete_contract.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def delete_customers(ids, using=None):
+    """
+    Supprime les clients donnés avec leurs commandes et lignes de commande.
+    DELETE directs, du plus dépendant au moins dépendant : pas de collecte des
+    objets en cascade ni de signaux par instance ; index de recherche, ventes
+    journalières et cache des réponses sont mis à jour ici.
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    using = using or DEFAULT_DB_ALIAS
+    orders = Order.objects.using(using).filter(customer_id__in=ids)
+    days = rollup.order_days(orders)
+    _raw_delete(OrderItem.objects.using(using).filter(order__customer_id__in=ids))
+    _raw_delete(orders)
+    deleted = _raw_delete(Customer.objects.using(using).filter(pk__in=ids))
+    rollup.refresh_days(days, using)
+    get_search_backend(using).remove_many(Customer, ids)
+    response_cache.invalidate_on_commit(
+        Customer._meta.label, Order._meta.label, OrderItem._meta.label, using=using
+    )
+    return deleted
+
+
+def iter_cleanup(inactive_days=None, chunk_size=None, sleep=None, using=None, restart=False):
+    """
+    Supprime les clients inactifs lot par lot. Génère (dernier id parcouru,
+    clients parcourus, clients supprimés) après chaque lot. Reprend
+    l'exécution interrompue enregistrée, sauf avec restart=True.
+    """
+    config = _config()
+    chunk_size = config["CHUNK_SIZE"] if chunk_size is None else chunk_size
+    if chunk_size < 1:
+        raise ValueError("chunk_size doit être au moins 1")
+    sleep = config["SLEEP"] if sleep is None else sleep
+
+    position = {} if restart else checkpoints.load(CHECKPOINT, using=using)
+    if position:
+        cutoff = parse_datetime(position["cutoff"])
+        after_id = position["after_id"]
+    else:
+        days = inactive_days or config["INACTIVE_DAYS"]
+        cutoff = timezone.now() - timedelta(days=days)
+        after_id = 0
+
+    first = True
+    while True:
+        if not first and sleep:
+            time.sleep(sleep)
+        first = False
+        with write_atomic(using=using):
+            ids = list(
+                Customer.objects.using(using)
+                .filter(pk__gt=after_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:chunk_size]
+            )
+            if not ids:
+                checkpoints.reset(CHECKPOINT, using=using)
+                return
+            # Verrouille le lot (PostgreSQL...) : pas de nouvelle commande entre
+            # la vérification et la suppression
+            doomed = list(
+                inactive_customers(cutoff, using)
+                .filter(pk__in=ids)
+                .select_for_update()
+                .values_list("pk", flat=True)
+            )
+            deleted = delete_customers(doomed, using)
+            after_id = ids[-1]
+            checkpoints.save(CHECKPOINT, {"cutoff": cutoff.isoformat(), "after_id": after_id}, using=using)
+        yield after_id, len(ids), deleted
@@ -0,0 +1,232 @@
+# crm/complexity.py
+"""
+Coût et profondeur des opérations GraphQL, calculés avant l'exécution.
+
+Coût d'un champ = coût propre + multiplicateur × coût de sa sélection, où le
+multiplicateur d'une connexion est son argument first / last (ou la taille de
+page maximale), et celui d'une liste sa taille estimée. Les scalaires et la
+plomberie relay (edges, node, pageInfo) ne coûtent rien par défaut :
+
+    allOrders(first: 50) { edges { node { customer { email } items { product { name } } } } }
+    = 1 + 50 × (1 + 1 + 10 × 1) = 601
+
+QueryCostAnalyzer.validate() applique la règle de validation QueryCostRule avec
+les variables de la requête : une opération hors budget est rejetée sans
+qu'aucun résolveur (ni aucune requête SQL) ne s'exécute.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from graphene.relay import Connection
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLInt,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+    ValidationRule,
+    get_named_type,
+    is_composite_type,
+    is_list_type,
+    is_non_null_type,
+    validate,
+    value_from_ast,
+)
+from graphql.error import GraphQLError
+from graphql.pyutils import Undefined
+
+DEFAULT_QUERY_COST = {
+    "MAX_COST": 10000,
+    "MAX_DEPTH": 12,
+    # Taille supposée d'une liste (items, orderitemSet...)
+    "LIST_SIZE": 10,
+    # Coût propre des champs composites et scalaires
+    "OBJECT_COST": 1,
+    "SCALAR_COST": 0,
+    # Coûts propres spécifiques : {"Query.allOrders": 5, ...}
+    "FIELD_COSTS": {},
+}
+
+QueryCost = namedtuple("QueryCost", ["cost", "depth"])
+
+
+class QueryTooComplex(GraphQLError):
+    def __init__(self, message, cost):
+        super().__init__(
+            message,
+            extensions={"code": "QUERY_TOO_COMPLEX", "cost": cost.cost, "depth": cost.depth},
+        )
+
+
+def _is_connection(named_type):
+    graphene_type = getattr(named_type, "graphene_type", None)
+    return isinstance(graphene_type, type) and issubclass(graphene_type, Connection)
+
+
+def _is_relay_plumbing(parent_type):
+    # Champs d'une connexion ou d'un edge : déjà comptés par le multiplicateur
+    fields = getattr(parent_type, "fields", {})
+    return _is_connection(parent_type) or ("node" in fields and "cursor" in fields)
+
+
+def _unwrap_non_null(type_):
+    return type_.of_type if is_non_null_type(type_) else type_
+
+
+class _CostWalker:
+    """Parcours d'une opération : coût et profondeur de chaque sélection."""
+
+    def __init__(self, analyzer, schema, fragments, variables):
+        self.analyzer = analyzer
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables or {}
+
+    def selection_set(self, selection_set, parent_type, visited=frozenset()):
+        cost = depth = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                child = self.field(selection, parent_type, visited)
+            elif isinstance(selection, InlineFragmentNode):
+                child = self.fragment(selection, parent_type, visited)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                if name in visited or name not in self.fragments:
+                    continue
+                child = self.fragment(self.fragments[name], parent_type, visited | {name})
+            else:
+                continue
+            cost += child.cost
+            depth = max(depth, child.depth)
+        return QueryCost(cost, depth)
+
+    def fragment(self, fragment, parent_type, visited):
+        if fragment.type_condition is not None:
+            parent_type = self.schema.get_type(fragment.type_condition.name.value) or parent_type
+        return self.selection_set(fragment.selection_set, parent_type, visited)
+
+    def field(self, node, parent_type, visited):
+        name = node.name.value
+        field = getattr(parent_type, "fields", {}).get(name)
+        if field is None:
+            # __typename, ou champ inconnu déjà signalé par la validation
+            return QueryCost(0, 0)
+
+        analyzer = self.analyzer
+        named_type = get_named_type(field.type)
+        plumbing = _is_relay_plumbing(parent_type)
+        if plumbing:
+            own_cost = 0
+        elif is_composite_type(named_type):
+            own_cost = analyzer.object_cost
+        else:
+            own_cost = analyzer.scalar_cost
+        own_cost = analyzer.field_costs.get(f"{parent_type.name}.{name}", own_cost)
+        if node.selection_set is None:
+            return QueryCost(own_cost, 1)
+
+        children = self.selection_set(node.selection_set, named_type, visited)
+        multiplier = 1 if plumbing else self.multiplier(node, field, named_type)
+        return QueryCost(own_cost + multiplier * children.cost, children.depth + 1)
+
+    def multiplier(self, node, field, named_type):
+        if _is_connection(named_type):
+            arguments = {argument.name.value: argument.value for argument in node.arguments}
+            for name in ("first", "last"):
+                if name in arguments:
+                    value = value_from_ast(arguments[name], GraphQLInt, self.variables)
+                    if value is not Undefined and value is not None:
+                        return max(value, 0)
+            return self.analyzer.default_page_size
+        if is_list_type(_unwrap_non_null(field.type)):
+            return self.analyzer.list_size
+        return 1
+
+
+class QueryCostAnalyzer:
+    def __init__(self, max_cost=None, max_depth=None, list_size=10, page_size=None,
+                 object_cost=1, scalar_cost=0, field_costs=None):
+        self.max_cost = max_cost
+        self.max_depth = max_depth
+        self.list_size = list_size
+        self.page_size = page_size
+        self.object_cost = object_cost
+        self.scalar_cost = scalar_cost
+        self.field_costs = dict(field_costs or {})
+
+    @property
+    def default_page_size(self):
+        # Sans first / last, graphene-django lit au plus RELAY_CONNECTION_MAX_LIMIT noeuds
+        return self.page_size or graphene_settings.RELAY_CONNECTION_MAX_LIMIT or self.list_size
+
+    def operation_cost(self, schema, operation, fragments, variables=None):
+        root_type = schema.get_root_type(operation.operation)
+        if root_type is None:
+            return QueryCost(0, 0)
+        return _CostWalker(self, schema, fragments, variables).selection_set(operation.selection_set, root_type)
+
+    def check(self, cost):
+        """Lève QueryTooComplex si le coût ou la profondeur dépasse le budget."""
+        if self.max_depth is not None and cost.depth > self.max_depth:
+            raise QueryTooComplex(
+                f"Query depth {cost.depth} exceeds the maximum depth of {self.max_depth}.", cost
+            )
+        if self.max_cost is not None and cost.cost > self.max_cost:
+            raise QueryTooComplex(
+                f"Query cost {cost.cost} exceeds the maximum cost of {self.max_cost}.", cost
+            )
+
+    def rule(self, variables=None, operation_name=None, costs=None):
+        """
+        Règle de validation graphql-core pour les variables données ; le coût
+        de chaque opération analysée est ajouté à la liste `costs`.
+        """
+        analyzer = self
+
+        class QueryCostRule(ValidationRule):
+            def enter_document(self, node, *args):
+                fragments = {
+                    definition.name.value: definition
+                    for definition in node.definitions
+                    if isinstance(definition, FragmentDefinitionNode)
+                }
+                operations = [d for d in node.definitions if isinstance(d, OperationDefinitionNode)]
+                if operation_name is not None:
+                    operations = [d for d in operations if d.name and d.name.value == operation_name]
+                elif len(operations) > 1:
+                    # Opération ambiguë : l'exécution la rejettera
+                    return
+                for operation in operations:
+                    cost = analyzer.operation_cost(self.context.schema, operation, fragments, variables)
+                    if costs is not None:
+                        costs.append(cost)
+                    try:
+                        analyzer.check(cost)
+                    except QueryTooComplex as error:
+                        self.report_error(error)
+
+        return QueryCostRule
+
+    def validate(self, schema, document, variables=None, operation_name=None):
+        """Retourne (QueryCost de l'opération ou None, erreurs)."""
+        costs = []
+        errors = validate(schema, document, [self.rule(variables, operation_name, costs)])
+        return (costs[0] if costs else None), errors
+
+
+def _build_analyzer():
+    config = {**DEFAULT_QUERY_COST, **getattr(settings, "GRAPHQL_QUERY_COST", {})}
+    return QueryCostAnalyzer(
+        max_cost=config["MAX_COST"],
+        max_depth=config["MAX_DEPTH"],
+        list_size=config["LIST_SIZE"],
+        page_size=config.get("PAGE_SIZE"),
+        object_cost=config["OBJECT_COST"],
+        scalar_cost=config["SCALAR_COST"],
+        field_costs=config["FIELD_COSTS"],
+    )
+
+
+query_cost = _build_analyzer()
@@ -1,10 +1,9 @@
 
-import os
 import logging
 from datetime import datetime
 from django.utils import timezone
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+
+from .cleanup import iter_cleanup
 
 # Configuration du logging
 logger = logging.getLogger(__name__)
@@ -52,27 +51,15 @@ def log_crm_heartbeat():
 def clean_inactive_customers():
     """
     une autre fonction cron pour nettoyer les clients inactifs
+    (sans commande depuis un an), par lots et avec reprise : crm/cleanup.py
     """
     try:
-        from django.contrib.auth import get_user_model
-        from django.utils import timezone
-        from datetime import timedelta
-
-        User = get_user_model()
-
-        # Clients inactifs depuis plus d'un an
-        one_year_ago = timezone.now() - timedelta(days=365)
-        inactive_customers = User.objects.filter(
-            last_login__lt=one_year_ago,
-            is_active=True
-        )
+        scanned = deleted = 0
+        for _, count, removed in iter_cleanup():
+            scanned += count
+            deleted += removed
 
-        count = inactive_customers.count()
-
-        # Désactiver les clients inactifs
-        inactive_customers.update(is_active=False)
-
-        message = f"{count} clients inactifs désactivés"
+        message = f"{deleted} clients inactifs supprimés ({scanned} parcourus)"
         logger.info(message)
 
         # Écrire dans le fichier log
@@ -90,29 +77,23 @@ def clean_inactive_customers():
 def update_low_stock():
     """
     Fonction cron pour mettre à jour les produits avec stock faible
-    en utilisant la mutation GraphQL
+    en utilisant la mutation GraphQL : le réapprovisionnement est réparti en
+    tâches Celery (startRestock), le cron n'attend pas leur fin
     """
+    # gql et le schéma ne sont chargés que par ce job (pas par le heartbeat)
+    from .transport import document, local_client
+
     try:
-        # Configuration du transport GraphQL
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",  # Votre endpoint GraphQL
-            verify=True,
-            retries=3,
-        )
-
-        # Création du client GraphQL
-        client = Client(
-            transport=transport,
-            fetch_schema_from_transport=True,
-        )
+        # Client GraphQL exécutant la mutation dans le processus (schéma local)
+        client = local_client()
 
         # Mutation GraphQL pour mettre à jour les produits avec stock faible
-        mutation = gql("""
-        mutation UpdateLowStock {
-            updateLowStockProducts(minStock: 10, incrementBy: 50) {
+        mutation = document("""
+        mutation StartRestock {
+            startRestock(minStock: 10, incrementBy: 50) {
                 success
                 message
-                updatedCount
+                jobId
             }
         }
         """)
@@ -121,10 +102,10 @@ def update_low_stock():
         result = client.execute(mutation)
 
         # Log des résultats
-        response = result.get('updateLowStockProducts', {})
+        response = result.get('startRestock', {})
 
         if response.get('success'):
-            message = f"Stock mis à jour: {response.get('message')}"
+            message = f"Stock : {response.get('message')} (job {response.get('jobId')})"
             logger.info(message)
         else:
             message = f"Échec de la mise à jour: {response.get('message')}"
@@ -0,0 +1,128 @@
+# crm/customer_stats.py
+"""
+Agrégats dénormalisés des commandes sur Customer : order_count,
+lifetime_revenue et last_order_date.
+
+- create_orders les incrémente dans sa transaction (add_orders) : un
+  UPDATE par paquet de ADD_CHUNK_SIZE clients, sans relire les commandes ;
+- les écritures unitaires sur Order (admin, shell, suppressions en
+  cascade...) recalculent les agrégats des clients concernés, une fois au
+  commit de la transaction (refresh, via crm/signals.py) ;
+- `manage.py rebuild_customer_stats` recalcule tout, par lots d'ids.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DateTimeField, DecimalField, F, IntegerField, Max, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Customer, Order
+from .response_cache import response_cache
+
+REBUILD_CHUNK_SIZE = 1000
+# Clients par UPDATE de add_orders : le coût d'un CASE croît avec le carré de
+# son nombre de branches
+ADD_CHUNK_SIZE = 250
+
+
+def _invalidate(using=None):
+    # update() et bulk_update() n'émettent pas de signaux
+    response_cache.invalidate_on_commit(Customer._meta.label, using=using)
+
+
+def add_orders(orders, chunk_size=ADD_CHUNK_SIZE):
+    """
+    Ajoute des commandes nouvellement créées aux agrégats de leurs clients,
+    en un UPDATE par paquet de `chunk_size` clients :
+
+        UPDATE crm_customer
+           SET order_count = order_count + CASE id WHEN ... END,
+               lifetime_revenue = lifetime_revenue + CASE id WHEN ... END,
+               last_order_date = COALESCE(MAX(last_order_date, CASE ...), CASE ...)
+         WHERE id IN (...)
+
+    À appeler dans la transaction qui crée les commandes.
+    """
+    counts = defaultdict(int)
+    revenues = defaultdict(Decimal)
+    last_dates = {}
+    for order in orders:
+        counts[order.customer_id] += 1
+        revenues[order.customer_id] += order.total_amount
+        if order.order_date is not None:
+            previous = last_dates.get(order.customer_id)
+            if previous is None or order.order_date > previous:
+                last_dates[order.customer_id] = order.order_date
+    if not counts:
+        return 0
+
+    def per_customer(values, customer_ids, output_field):
+        return Case(
+            *[When(pk=customer_id, then=Value(values[customer_id])) for customer_id in customer_ids],
+            output_field=output_field,
+        )
+
+    customer_ids = list(counts)
+    updated = 0
+    for start in range(0, len(customer_ids), chunk_size):
+        chunk = customer_ids[start:start + chunk_size]
+        changes = {
+            "order_count": F("order_count") + per_customer(counts, chunk, IntegerField()),
+            "lifetime_revenue": F("lifetime_revenue") + per_customer(
+                revenues, chunk, DecimalField(max_digits=12, decimal_places=2)
+            ),
+        }
+        dated = [customer_id for customer_id in chunk if customer_id in last_dates]
+        if dated:
+            new_date = per_customer(last_dates, dated, DateTimeField())
+            # GREATEST(NULL, x) vaut NULL : premier achat du client
+            changes["last_order_date"] = Coalesce(Greatest("last_order_date", new_date), new_date)
+        updated += Customer.objects.filter(pk__in=chunk).update(**changes)
+    _invalidate()
+    return updated
+
+
+def refresh(customer_ids, using=None):
+    """Recalcule les agrégats des clients donnés à partir de leurs commandes."""
+    customer_ids = list(customer_ids)
+    stats = {
+        row["customer_id"]: row
+        for row in Order.objects.using(using)
+        .filter(customer_id__in=customer_ids)
+        .order_by()
+        .values("customer_id")
+        .annotate(count=Count("pk"), revenue=Sum("total_amount"), last=Max("order_date"))
+    }
+    customers = list(Customer.objects.using(using).filter(pk__in=customer_ids).only("pk"))
+    for customer in customers:
+        row = stats.get(customer.pk)
+        customer.order_count = row["count"] if row else 0
+        customer.lifetime_revenue = row["revenue"] if row else Decimal("0")
+        customer.last_order_date = row["last"] if row else None
+    Customer.objects.using(using).bulk_update(
+        customers, ["order_count", "lifetime_revenue", "last_order_date"]
+    )
+    _invalidate(using)
+    return len(customers)
+
+
+def iter_rebuild(chunk_size=REBUILD_CHUNK_SIZE, after_id=0, using=None):
+    """
+    Recalcule les agrégats de tous les clients par lots d'ids croissants,
+    une transaction courte par lot. Génère (dernier id, clients traités)
+    après chaque lot ; after_id permet de reprendre un rebuild interrompu.
+    """
+    while True:
+        ids = list(
+            Customer.objects.using(using)
+            .filter(pk__gt=after_id)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:chunk_size]
+        )
+        if not ids:
+            return
+        with transaction.atomic(using=using):
+            refresh(ids, using=using)
+        after_id = ids[-1]
+        yield after_id, len(ids)
@@ -0,0 +1,143 @@
+# crm/documents.py
+"""
+Requêtes persistées et cache LRU des documents GraphQL analysés et validés.
+
+- PersistedQueryRegistry : hash sha256 -> texte de la requête. Les requêtes
+  des settings (GRAPHQL_PERSISTED_QUERIES) sont gardées en mémoire ; celles
+  enregistrées par les clients (protocole « automatic persisted queries »,
+  APQ) vont dans le seul cache Django, borné et partagé entre processus.
+- DocumentCache : hash -> (DocumentNode, erreurs de validation), borné en taille,
+  avec compteurs de hits / misses.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import parse, validate
+from graphql.error import GraphQLError
+
+PERSISTED_QUERY_CACHE_PREFIX = "crm:persisted-query:"
+# Expiration des requêtes APQ : un client dont la requête a expiré la renvoie
+# après PersistedQueryNotFound
+DEFAULT_PERSISTED_QUERY_TIMEOUT = 7 * 24 * 3600
+DEFAULT_DOCUMENT_CACHE_SIZE = 256
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class PersistedQueryNotFound(GraphQLError):
+    def __init__(self):
+        super().__init__("PersistedQueryNotFound", extensions={"code": "PERSISTED_QUERY_NOT_FOUND"})
+
+
+class PersistedQueryRegistry:
+    """
+    Registre hash -> requête : requêtes connues d'avance en mémoire, requêtes
+    des clients dans le cache Django (taille bornée par le backend, expiration
+    après `timeout` secondes).
+    """
+
+    def __init__(self, queries=None, timeout=DEFAULT_PERSISTED_QUERY_TIMEOUT):
+        self.timeout = timeout
+        # Seules les requêtes des settings : un client ne doit pas faire grossir ce dict
+        self._static = {query_hash(query): query for query in queries or ()}
+
+    def register(self, query, sha256_hash=None):
+        sha256_hash = sha256_hash or query_hash(query)
+        if query_hash(query) != sha256_hash:
+            raise GraphQLError("provided sha does not match query", extensions={"code": "INVALID_HASH"})
+        if sha256_hash not in self._static:
+            cache.set(PERSISTED_QUERY_CACHE_PREFIX + sha256_hash, query, timeout=self.timeout)
+        return sha256_hash
+
+    def get(self, sha256_hash):
+        query = self._static.get(sha256_hash)
+        if query is None:
+            query = cache.get(PERSISTED_QUERY_CACHE_PREFIX + sha256_hash)
+        return query
+
+    def resolve(self, query, extensions):
+        """
+        Applique le protocole APQ : avec seulement un hash, retourne la requête
+        enregistrée ; avec requête + hash, vérifie et enregistre la requête.
+        """
+        persisted = (extensions or {}).get("persistedQuery")
+        if not persisted:
+            return query
+        if persisted.get("version", 1) != 1:
+            raise GraphQLError("Unsupported persisted query version",
+                               extensions={"code": "PERSISTED_QUERY_NOT_SUPPORTED"})
+        sha256_hash = persisted.get("sha256Hash")
+        if not sha256_hash:
+            raise GraphQLError("Missing sha256Hash", extensions={"code": "INVALID_HASH"})
+        if query:
+            self.register(query, sha256_hash)
+            return query
+        query = self.get(sha256_hash)
+        if query is None:
+            raise PersistedQueryNotFound()
+        return query
+
+
+class DocumentCache:
+    """Cache LRU des documents analysés et validés, indexé par hash de la requête."""
+
+    def __init__(self, maxsize=DEFAULT_DOCUMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, schema, query):
+        """
+        Retourne (document, erreurs) ; les erreurs de syntaxe ou de validation
+        sont mises en cache comme les documents valides.
+        """
+        key = query_hash(query)
+        with self._lock:
+            entry = self._documents.get(key)
+            if entry is not None:
+                self._documents.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            entry = (None, [error])
+        else:
+            entry = (document, validate(schema, document))
+
+        with self._lock:
+            self._documents[key] = entry
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._documents),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+persisted_queries = PersistedQueryRegistry(
+    getattr(settings, "GRAPHQL_PERSISTED_QUERIES", ()),
+    getattr(settings, "GRAPHQL_PERSISTED_QUERY_TIMEOUT", DEFAULT_PERSISTED_QUERY_TIMEOUT),
+)
+document_cache = DocumentCache(getattr(settings, "GRAPHQL_DOCUMENT_CACHE_SIZE", DEFAULT_DOCUMENT_CACHE_SIZE))
@@ -0,0 +1,182 @@
+# crm/exports.py
+"""
+Export en flux des commandes et des clients (CSV ou NDJSON), pour les
+extractions complètes que la pagination de allOrders rend coûteuses
+(chaque page y est matérialisée, filtrée et comptée).
+
+- la sélection reprend OrderFilter / CustomerFilter, avec les mêmes
+  paramètres en query string (?status=paid&order_date_min=...) ;
+- les objets sont lus par paquets de CHUNK_SIZE avec .iterator() (curseur
+  côté serveur sur PostgreSQL) : commandes jointes à leur client, lignes et
+  produits chargés en une requête par paquet ;
+- les lignes sont écrites au fil de l'eau (StreamingHttpResponse) : mémoire
+  constante quel que soit le nombre de lignes exportées.
+
+En CSV, une ligne par ligne de commande (les colonnes de la commande sont
+répétées), les textes qui commencent comme une formule (=, +, -, @) préfixés
+d'une apostrophe ; en NDJSON, un objet par commande avec ses lignes.
+
+La vue (crm/views.py) demande les permissions view_* de l'export.
+"""
+import csv
+import json
+import re
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+from .filters import CustomerFilter, OrderFilter
+from .models import Customer, Order, OrderItem
+
+DEFAULT_EXPORT = {
+    # Objets lus par requête
+    "CHUNK_SIZE": 2000,
+    # Lignes écrites par morceau de la réponse
+    "LINES_PER_WRITE": 500,
+}
+
+
+def _config():
+    return {**DEFAULT_EXPORT, **getattr(settings, "CRM_EXPORT", {})}
+
+
+def _value(value):
+    # Dates en ISO 8601, montants en texte exact ; None : vide en CSV, null en NDJSON
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class CustomerExport:
+    filterset_class = CustomerFilter
+    permissions = ["crm.view_customer"]
+    columns = [
+        "id", "first_name", "last_name", "email", "phone", "address", "created_at",
+        "order_count", "lifetime_revenue", "last_order_date",
+    ]
+
+    def queryset(self):
+        return Customer.objects.all()
+
+    def record(self, customer):
+        return {column: _value(getattr(customer, column)) for column in self.columns}
+
+    def rows(self, customer):
+        yield list(self.record(customer).values())
+
+
+class OrderExport:
+    filterset_class = OrderFilter
+    # Les lignes reprennent l'email et le nom du client
+    permissions = ["crm.view_order", "crm.view_customer"]
+    order_columns = ["id", "order_date", "status", "total_amount", "customer_id", "customer_email", "customer_name"]
+    item_columns = ["product_id", "product_name", "quantity", "unit_price"]
+    columns = order_columns + item_columns
+
+    def queryset(self):
+        # Client joint ; lignes et produits : une requête par paquet de commandes
+        items = OrderItem.objects.select_related("product").order_by("pk")
+        return Order.objects.select_related("customer").prefetch_related(Prefetch("items", queryset=items))
+
+    def order_record(self, order):
+        customer = order.customer
+        return {
+            "id": order.pk,
+            "order_date": _value(order.order_date),
+            "status": order.status,
+            "total_amount": _value(order.total_amount),
+            "customer_id": customer.pk,
+            "customer_email": customer.email,
+            "customer_name": f"{customer.first_name} {customer.last_name}",
+        }
+
+    def item_record(self, item):
+        return {
+            "product_id": item.product_id,
+            "product_name": item.product.name,
+            "quantity": item.quantity,
+            "unit_price": _value(item.unit_price),
+        }
+
+    def record(self, order):
+        return {**self.order_record(order), "items": [self.item_record(item) for item in order.items.all()]}
+
+    def rows(self, order):
+        head = list(self.order_record(order).values())
+        items = order.items.all()
+        if not items:
+            yield head + [None] * len(self.item_columns)
+        for item in items:
+            yield head + list(self.item_record(item).values())
+
+
+EXPORTS = {"customers": CustomerExport(), "orders": OrderExport()}
+
+
+def select(export, params):
+    """Queryset filtré par le FilterSet de l'export, ou erreurs de validation."""
+    filterset = export.filterset_class(params, queryset=export.queryset())
+    if not filterset.is_valid():
+        return None, filterset.errors
+    queryset = filterset.qs
+    if not queryset.query.order_by:
+        # Ordre stable d'un export à l'autre
+        queryset = queryset.order_by("pk")
+    return queryset, None
+
+
+class _Echo:
+    # Pseudo-fichier : csv.writer retourne la ligne écrite au lieu de la garder
+    def write(self, value):
+        return value
+
+
+# Début de cellule interprété comme une formule par les tableurs
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+NUMBER = re.compile(r"[+-]?\d+(\.\d+)?")
+
+
+def _csv_cell(value):
+    # Texte saisi par les clients (noms, adresses...) : préfixé d'une apostrophe,
+    # sauf les nombres (montants, numéros de téléphone) qui ne sont pas des formules
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) and not NUMBER.fullmatch(value):
+        return "'" + value
+    return value
+
+
+def csv_lines(export, objects):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(export.columns)
+    for obj in objects:
+        for row in export.rows(obj):
+            yield writer.writerow([_csv_cell(value) for value in row])
+
+
+def ndjson_lines(export, objects):
+    for obj in objects:
+        yield json.dumps(export.record(obj), ensure_ascii=False) + "\n"
+
+
+FORMATS = {
+    "csv": (csv_lines, "text/csv; charset=utf-8"),
+    "ndjson": (ndjson_lines, "application/x-ndjson; charset=utf-8"),
+}
+
+
+def stream(export, queryset, format, chunk_size=None, lines_per_write=None):
+    """Morceaux de la réponse : lignes regroupées par LINES_PER_WRITE."""
+    config = _config()
+    chunk_size = chunk_size or config["CHUNK_SIZE"]
+    lines_per_write = lines_per_write or config["LINES_PER_WRITE"]
+    lines, _ = FORMATS[format]
+    pending = []
+    for line in lines(export, queryset.iterator(chunk_size=chunk_size)):
+        pending.append(line)
+        if len(pending) >= lines_per_write:
+            yield "".join(pending)
+            pending = []
+    if pending:
+        yield "".join(pending)
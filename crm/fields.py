@@ -0,0 +1,348 @@
+# crm/fields.py
+import base64
+import inspect
+import json
+from functools import partial
+
+import graphene
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q, QuerySet
+from graphene.relay import PageInfo
+from graphene_django.fields import DjangoConnectionField
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+
+from .loaders import get_loaders, is_async_execution
+
+KEYSET_CURSOR_PREFIX = "keyset:"
+
+
+class CountableConnection(graphene.relay.Connection):
+    """Connexion avec un totalCount calculé uniquement s'il est demandé."""
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(root, info):
+        iterable = getattr(root, "iterable", None)
+        if iterable is None:
+            return None
+        if isinstance(iterable, QuerySet):
+            if is_async_execution(info):
+                return iterable.acount()
+            return iterable.count()
+        return len(iterable)
+
+
+def check_connection_args(args, info, max_limit, enforce_first_or_last):
+    """Mêmes contrôles que DjangoConnectionField.connection_resolver (chemin asynchrone)."""
+    first, last = args.get("first"), args.get("last")
+
+    if enforce_first_or_last:
+        assert first or last, (
+            "You must provide a `first` or `last` value to properly paginate the `{}` connection."
+        ).format(info.field_name)
+
+    if max_limit:
+        if first:
+            assert first <= max_limit, (
+                "Requesting {} records on the `{}` connection exceeds the `first` limit of {} records."
+            ).format(first, info.field_name, max_limit)
+            args["first"] = min(first, max_limit)
+
+        if last:
+            assert last <= max_limit, (
+                "Requesting {} records on the `{}` connection exceeds the `last` limit of {} records."
+            ).format(last, info.field_name, max_limit)
+            args["last"] = min(last, max_limit)
+
+    if args.get("offset") is not None:
+        assert args.get("before") is None, (
+            "You can't provide a `before` value at the same time as an `offset` value to properly paginate the `{}` connection."
+        ).format(info.field_name)
+
+
+def _register_page(info, result):
+    edges = getattr(result, "edges", None)
+    if edges is not None:
+        get_loaders(info).register(edge.node for edge in edges)
+
+
+class BatchedConnectionMixin:
+    """
+    Annonce les noeuds de la page aux DataLoaders, pour que chaque niveau de
+    relation coûte une seule requête. Sous la vue asynchrone, la page est lue
+    avec l'ORM asynchrone.
+    """
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection, default_manager, queryset_resolver,
+                            max_limit, enforce_first_or_last, root, info, **args):
+        if is_async_execution(info):
+            return cls.aconnection_resolver(
+                resolver, connection, default_manager, queryset_resolver,
+                max_limit, enforce_first_or_last, root, info, **args
+            )
+        result = super().connection_resolver(
+            resolver, connection, default_manager, queryset_resolver,
+            max_limit, enforce_first_or_last, root, info, **args
+        )
+        _register_page(info, result)
+        return result
+
+    @classmethod
+    async def aconnection_resolver(cls, resolver, connection, default_manager, queryset_resolver,
+                                   max_limit, enforce_first_or_last, root, info, **args):
+        check_connection_args(args, info, max_limit, enforce_first_or_last)
+        iterable = resolver(root, info, **args)
+        if inspect.isawaitable(iterable):
+            iterable = await iterable
+        if iterable is None:
+            iterable = default_manager
+        if not isinstance(iterable, list):
+            # Le FilterSet peut interroger la base (ModelChoiceFilter)
+            iterable = await sync_to_async(queryset_resolver)(connection, iterable, info, args)
+        result = await cls.aresolve_connection(connection, args, iterable, max_limit)
+        _register_page(info, result)
+        return result
+
+    @classmethod
+    async def aresolve_connection(cls, connection, args, iterable, max_limit=None):
+        iterable = maybe_queryset(iterable)
+        if isinstance(iterable, QuerySet):
+            iterable = [obj async for obj in iterable]
+        return cls.resolve_connection(connection, args, iterable, max_limit)
+
+
+class BatchedConnectionField(BatchedConnectionMixin, DjangoConnectionField):
+    """DjangoConnectionField des relations imbriquées (customer.orders, ...)."""
+
+
+class BatchedFilterConnectionField(BatchedConnectionMixin, DjangoFilterConnectionField):
+    """DjangoFilterConnectionField avec batching des relations."""
+
+
+class KeysetConnectionField(BatchedFilterConnectionField):
+    """
+    Connexion paginée par clé (keyset) au lieu d'OFFSET : le curseur encode
+    les valeurs de la clé de tri du dernier noeud, et la page suivante est
+    lue avec WHERE (clé) > (curseur) ORDER BY clé LIMIT n. Aucun COUNT(*)
+    n'est exécuté sauf si le client demande totalCount.
+
+    sort_keys : champs de tri, le dernier doit être unique ("-" = décroissant).
+    Avec `offset` ou un tri imposé par le filtre (recherche classée), on
+    retombe sur la pagination par offset de DjangoConnectionField.
+    """
+
+    def __init__(self, type_, *args, sort_keys=("id",), **kwargs):
+        self.sort_keys = tuple(sort_keys)
+        super().__init__(type_, *args, **kwargs)
+
+    def wrap_resolve(self, parent_resolver):
+        resolver = super().wrap_resolve(parent_resolver)
+        # Le type de connexion (2e argument) est enveloppé pour transmettre
+        # les clés de tri du champ jusqu'à resolve_connection
+        parent, connection, *rest = resolver.args
+        return partial(resolver.func, parent, _KeysetConnection(connection, self.sort_keys), *rest,
+                       **resolver.keywords)
+
+    @staticmethod
+    def _keyset_applies(sort_keys, args, iterable):
+        return (
+            sort_keys is not None
+            and not args.get("offset")
+            and not getattr(iterable.query, "extra_order_by", None)
+        )
+
+    @classmethod
+    def offset_connection(cls, connection, args, iterable, max_limit=None):
+        return super().resolve_connection(connection, args, iterable, max_limit)
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        sort_keys = effective_sort_keys(getattr(connection, "sort_keys", None), iterable)
+        connection = getattr(connection, "connection", connection)
+        if not cls._keyset_applies(sort_keys, args, iterable):
+            return cls.offset_connection(connection, args, iterable, max_limit)
+        return keyset_paginate(connection, args, iterable, sort_keys, max_limit)
+
+    @classmethod
+    async def aresolve_connection(cls, connection, args, iterable, max_limit=None):
+        sort_keys = effective_sort_keys(getattr(connection, "sort_keys", None), iterable)
+        connection = getattr(connection, "connection", connection)
+        if not cls._keyset_applies(sort_keys, args, iterable):
+            return await sync_to_async(cls.offset_connection)(connection, args, iterable, max_limit)
+        return await akeyset_paginate(connection, args, iterable, sort_keys, max_limit)
+
+
+class _KeysetConnection:
+    """Enveloppe le type de connexion pour transmettre les clés de tri."""
+
+    def __init__(self, connection, sort_keys):
+        self.connection = connection
+        self.sort_keys = sort_keys
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+def _split_key(key):
+    return (key[1:], True) if key.startswith("-") else (key, False)
+
+
+def effective_sort_keys(sort_keys, queryset):
+    """
+    Clés de tri de la page : le tri demandé par le filtre (OrderingFilter),
+    complété par la clé primaire pour être unique, sinon celles du champ.
+    None si ce tri ne se prête pas au keyset (expression, relation ou
+    colonne NULL) : la connexion retombe alors sur l'offset.
+    """
+    ordering = getattr(getattr(queryset, "query", None), "order_by", None)
+    if sort_keys is None or not ordering:
+        return sort_keys
+    opts = queryset.model._meta
+    keys = []
+    descending = False
+    for key in ordering:
+        if not isinstance(key, str) or key == "?":
+            return None
+        name, descending = _split_key(key)
+        if name == "pk":
+            name = opts.pk.name
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.null or field.is_relation:
+            return None
+        keys.append(f"-{name}" if descending else name)
+        if field.unique:
+            return tuple(keys)
+    return (*keys, f"-{opts.pk.name}" if descending else opts.pk.name)
+
+
+def encode_cursor(obj, sort_keys):
+    values = []
+    for key in sort_keys:
+        name, _ = _split_key(key)
+        values.append(obj._meta.get_field(name).value_to_string(obj))
+    payload = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode((KEYSET_CURSOR_PREFIX + payload).encode()).decode()
+
+
+def decode_cursor(cursor, model, sort_keys):
+    try:
+        payload = base64.urlsafe_b64decode(cursor.encode()).decode()
+        if not payload.startswith(KEYSET_CURSOR_PREFIX):
+            raise ValueError
+        values = json.loads(payload[len(KEYSET_CURSOR_PREFIX):])
+        if len(values) != len(sort_keys):
+            raise ValueError
+        # Curseur bien formé mais valeurs du mauvais type : ValidationError
+        return [
+            model._meta.get_field(_split_key(key)[0]).to_python(value)
+            for key, value in zip(sort_keys, values)
+        ]
+    except (ValueError, TypeError, ValidationError):
+        raise ValueError(f"Curseur invalide : {cursor}")
+
+
+def keyset_filter(sort_keys, values, forward=True):
+    """
+    Condition « (clé) après (valeurs) » dans l'ordre lexicographique :
+    k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...
+    """
+    condition = Q()
+    for i, key in enumerate(sort_keys):
+        name, descending = _split_key(key)
+        lookup = "gt" if descending != forward else "lt"
+        term = Q(**{f"{name}__{lookup}": values[i]})
+        for previous_key, previous_value in zip(sort_keys[:i], values[:i]):
+            term &= Q(**{_split_key(previous_key)[0]: previous_value})
+        condition |= term
+    return condition
+
+
+def _ensure_loaded(queryset, sort_keys):
+    # Les clés de tri servent aux curseurs : elles ne doivent pas être différées
+    names = {_split_key(key)[0] for key in sort_keys}
+    field_names, defer = queryset.query.deferred_loading
+    if defer:
+        if field_names & names:
+            remaining = field_names - names
+            queryset = queryset.all()
+            queryset.query.clear_deferred_loading()
+            queryset = queryset.defer(*remaining) if remaining else queryset
+    elif field_names and not names <= field_names:
+        queryset = queryset.only(*field_names, *names)
+    return queryset
+
+
+def keyset_page(args, queryset, sort_keys, max_limit=None):
+    """
+    Prépare la lecture d'une page : retourne (queryset de la page, finalize,
+    queryset filtré complet) ; finalize(noeuds lus) donne
+    (noeuds, has_previous_page, has_next_page).
+    """
+    first, last = args.get("first"), args.get("last")
+    after, before = args.get("after"), args.get("before")
+    if first is None and last is None:
+        first = max_limit
+
+    model = queryset.model
+    queryset = _ensure_loaded(queryset, sort_keys)
+    page = queryset
+    if after:
+        page = page.filter(keyset_filter(sort_keys, decode_cursor(after, model, sort_keys)))
+    if before:
+        page = page.filter(keyset_filter(sort_keys, decode_cursor(before, model, sort_keys), forward=False))
+
+    if last is not None and first is None:
+        # Page en arrière : tri inversé puis remise dans l'ordre
+        reverse_keys = [key[1:] if key.startswith("-") else f"-{key}" for key in sort_keys]
+
+        def finalize(nodes):
+            return nodes[:last][::-1], len(nodes) > last, bool(before)
+
+        return page.order_by(*reverse_keys)[:last + 1], finalize, queryset
+
+    def finalize(nodes):
+        has_next_page = False
+        if first is not None:
+            has_next_page = len(nodes) > first
+            nodes = nodes[:first]
+        if last is not None:
+            nodes = nodes[-last:] if last else []
+        return nodes, bool(after), has_next_page
+
+    page = page.order_by(*sort_keys)
+    return (page[:first + 1] if first is not None else page), finalize, queryset
+
+
+def keyset_connection(connection, queryset, sort_keys, nodes, has_previous_page, has_next_page):
+    edges = [connection.Edge(node=node, cursor=encode_cursor(node, sort_keys)) for node in nodes]
+    result = connection(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=has_previous_page,
+            has_next_page=has_next_page,
+        ),
+    )
+    result.iterable = queryset
+    return result
+
+
+def keyset_paginate(connection, args, queryset, sort_keys, max_limit=None):
+    page, finalize, queryset = keyset_page(args, queryset, sort_keys, max_limit)
+    return keyset_connection(connection, queryset, sort_keys, *finalize(list(page)))
+
+
+async def akeyset_paginate(connection, args, queryset, sort_keys, max_limit=None):
+    page, finalize, queryset = keyset_page(args, queryset, sort_keys, max_limit)
+    nodes = [node async for node in page]
+    return keyset_connection(connection, queryset, sort_keys, *finalize(nodes))
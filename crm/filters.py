@@ -1,26 +1,74 @@
 # crm/filters.py
 import django_filters
 from .models import Customer, Product, Order
+from .search import get_search_backend
 
 
-class CustomerFilter(django_filters.FilterSet):
-    # Filtre texte pour le prénom (recherche insensible à la casse)
-    first_name = django_filters.CharFilter(lookup_expr='icontains', label='Prénom contient')
+class SearchFilterMixin:
+    """
+    Délègue les filtres texte et l'argument `search` au backend de recherche.
+    Sous SQLite (FTS5), les termes sont cherchés comme débuts de mots : "ade"
+    trouve « Adèle », "dele" ne trouve rien (crm/search.py).
+    """
 
-    # Filtre texte pour le nom (recherche insensible à la casse)
-    last_name = django_filters.CharFilter(lookup_expr='icontains', label='Nom contient')
+    def filter_text(self, queryset, name, value):
+        return get_search_backend(queryset.db).filter_field(queryset, name, value)
+
+    def filter_search(self, queryset, name, value):
+        return get_search_backend(queryset.db).search(queryset, value)
+
+
+class CustomerFilter(SearchFilterMixin, django_filters.FilterSet):
+    # Filtre texte pour le prénom (recherche indexée, par préfixe de mot)
+    first_name = django_filters.CharFilter(method='filter_text', label='Prénom : mots commençant par')
+
+    # Filtre texte pour le nom (recherche indexée, par préfixe de mot)
+    last_name = django_filters.CharFilter(method='filter_text', label='Nom : mots commençant par')
+
+    # Recherche classée sur prénom, nom et email
+    search = django_filters.CharFilter(method='filter_search', label='Recherche')
 
     # Filtre exact pour l'email
     email = django_filters.CharFilter(lookup_expr='exact', label='Email exact')
 
+    # Filtres sur les agrégats des commandes (crm/customer_stats.py)
+    order_count_min = django_filters.NumberFilter(
+        field_name='order_count', lookup_expr='gte', label='Nombre de commandes minimum'
+    )
+    lifetime_revenue_min = django_filters.NumberFilter(
+        field_name='lifetime_revenue', lookup_expr='gte', label="Chiffre d'affaires minimum"
+    )
+    lifetime_revenue_max = django_filters.NumberFilter(
+        field_name='lifetime_revenue', lookup_expr='lte', label="Chiffre d'affaires maximum"
+    )
+    last_order_after = django_filters.DateFilter(
+        field_name='last_order_date', lookup_expr='gte', label='Dernière commande après'
+    )
+    last_order_before = django_filters.DateFilter(
+        field_name='last_order_date', lookup_expr='lte', label='Dernière commande avant'
+    )
+
+    # Tri, ex. orderBy: "-lifetime_revenue" pour les meilleurs clients
+    order_by = django_filters.OrderingFilter(
+        fields=(
+            ('order_count', 'order_count'),
+            ('lifetime_revenue', 'lifetime_revenue'),
+            ('last_order_date', 'last_order_date'),
+            ('created_at', 'created_at'),
+        )
+    )
+
     class Meta:
         model = Customer
         fields = ['first_name', 'last_name', 'email']
 
 
-class ProductFilter(django_filters.FilterSet):
-    # Filtre texte pour le nom du produit
-    name = django_filters.CharFilter(lookup_expr='icontains', label='Nom du produit contient')
+class ProductFilter(SearchFilterMixin, django_filters.FilterSet):
+    # Filtre texte pour le nom du produit (recherche indexée, par préfixe de mot)
+    name = django_filters.CharFilter(method='filter_text', label='Nom du produit : mots commençant par')
+
+    # Recherche classée sur le nom et la description
+    search = django_filters.CharFilter(method='filter_search', label='Recherche')
 
     # Filtre pour les prix minimum et maximum
     price_min = django_filters.NumberFilter(field_name='price', lookup_expr='gte', label='Prix minimum')
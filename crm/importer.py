@@ -0,0 +1,268 @@
+# crm/importer.py
+"""
+Import en masse de clients et de produits depuis des fichiers CSV ou NDJSON
+(`manage.py import_crm`), sans passer par les mutations unitaires.
+
+- les fichiers sont lus en flux, ligne par ligne : taille quelconque ;
+- les lignes sont validées par lots (champs requis, longueurs, email, prix...),
+  sans full_clean() ni requête par ligne ;
+- les emails de clients sont dédoublonnés dans le lot, puis contre
+  Customer.email en une seule requête IN par lot ;
+- chaque lot est écrit dans sa propre transaction par bulk_create (INSERT
+  multi-lignes), en ignorant les clients existants (ignore_conflicts) ou en
+  les mettant à jour (update_conflicts, ON CONFLICT ... DO UPDATE).
+
+Ces écritures n'émettent pas de signaux : le cache des réponses est invalidé et
+les lignes écrites sont indexées pour la recherche dans la transaction de
+chaque lot.
+"""
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connections
+
+from .models import Customer, Product
+from .response_cache import response_cache
+from .search import get_search_backend
+from .sqlite import write_atomic
+
+IMPORT_BATCH_SIZE = 5000
+# Lignes par INSERT (bornées aussi par le nombre de paramètres du backend)
+INSERT_BATCH_SIZE = 1000
+# Erreurs de validation conservées pour le rapport (les suivantes sont seulement comptées)
+MAX_REPORTED_ERRORS = 20
+
+
+class ImportStats:
+    __slots__ = ("read", "created", "updated", "skipped", "invalid", "errors", "started")
+
+    def __init__(self):
+        self.read = 0
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.errors = []
+        self.started = time.monotonic()
+
+    def add_error(self, line, error):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, "; ".join(error.messages)))
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+# Lecture en flux : (numéro de ligne, ligne décodée)
+
+def iter_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_ndjson(stream):
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError as e:
+            # Signalée à la validation du lot, comme les autres lignes invalides
+            yield line, ValidationError(f"JSON invalide : {e}")
+
+
+READERS = {"csv": iter_csv, "ndjson": iter_ndjson}
+
+
+def detect_format(path):
+    return "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+
+
+# Validation d'une ligne : dict de valeurs du modèle, ou ValidationError
+
+def _max_lengths(model):
+    return {field.name: field.max_length for field in model._meta.concrete_fields}
+
+
+CUSTOMER_MAX_LENGTHS = _max_lengths(Customer)
+PRODUCT_MAX_LENGTHS = _max_lengths(Product)
+
+
+def _text(row, max_lengths, field, required=False):
+    value = row.get(field)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise ValidationError(f"{field} : champ requis")
+    max_length = max_lengths[field]
+    if max_length and len(value) > max_length:
+        raise ValidationError(f"{field} : {max_length} caractères au plus")
+    return value
+
+
+def clean_customer(row):
+    email = _text(row, CUSTOMER_MAX_LENGTHS, "email", required=True)
+    validate_email(email)
+    return {
+        "first_name": _text(row, CUSTOMER_MAX_LENGTHS, "first_name", required=True),
+        "last_name": _text(row, CUSTOMER_MAX_LENGTHS, "last_name", required=True),
+        "email": email,
+        "phone": _text(row, CUSTOMER_MAX_LENGTHS, "phone"),
+        "address": _text(row, CUSTOMER_MAX_LENGTHS, "address"),
+    }
+
+
+_TRUE = {"1", "true", "yes", "oui", "vrai"}
+_FALSE = {"0", "false", "no", "non", "faux"}
+
+
+def _boolean(row, field, default):
+    value = row.get(field)
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValidationError(f"{field} : booléen attendu")
+
+
+def clean_product(row):
+    try:
+        price = Decimal(str(row.get("price", "")).strip())
+    except InvalidOperation:
+        raise ValidationError("price : nombre attendu")
+    if not price.is_finite() or price < 0 or price.as_tuple().exponent < -2 or price >= Decimal("1e8"):
+        raise ValidationError("price : montant positif, deux décimales au plus")
+    stock = row.get("stock_quantity")
+    try:
+        stock = int(stock) if stock not in (None, "") else 0
+    except (TypeError, ValueError):
+        raise ValidationError("stock_quantity : entier attendu")
+    return {
+        "name": _text(row, PRODUCT_MAX_LENGTHS, "name", required=True),
+        "description": _text(row, PRODUCT_MAX_LENGTHS, "description"),
+        "price": price,
+        "stock_quantity": stock,
+        "is_available": _boolean(row, "is_available", True),
+    }
+
+
+def _clean_batch(rows, clean, stats):
+    cleaned = []
+    for line, row in rows:
+        try:
+            if isinstance(row, ValidationError):
+                raise row
+            if not isinstance(row, dict):
+                raise ValidationError("objet attendu")
+            cleaned.append(clean(row))
+        except ValidationError as e:
+            stats.add_error(line, e)
+    return cleaned
+
+
+# Écriture d'un lot : chaque fonction renvoie les clés primaires écrites (à
+# indexer), ou None si le backend ne les renvoie pas
+
+def _write_batch_size(model, using):
+    return min(INSERT_BATCH_SIZE, max(connections[using].ops.bulk_batch_size(model._meta.concrete_fields, [model()]), 1))
+
+
+CUSTOMER_UPDATE_FIELDS = ["first_name", "last_name", "phone", "address"]
+
+
+def write_customers(values, on_conflict, using, stats):
+    # Doublons du lot : le premier l'emporte (ignore) ou le dernier (update)
+    by_email = {}
+    for value in values:
+        if on_conflict == "update" or value["email"] not in by_email:
+            by_email[value["email"]] = value
+    stats.skipped += len(values) - len(by_email)
+
+    customers = Customer.objects.using(using)
+    existing = set(customers.filter(email__in=list(by_email)).values_list("email", flat=True))
+    if on_conflict == "update":
+        written = list(by_email)
+        customers.bulk_create(
+            [Customer(**value) for value in by_email.values()],
+            batch_size=_write_batch_size(Customer, using),
+            update_conflicts=True,
+            unique_fields=["email"],
+            update_fields=CUSTOMER_UPDATE_FIELDS,
+        )
+        stats.updated += len(existing)
+        stats.created += len(by_email) - len(existing)
+    else:
+        written = [email for email in by_email if email not in existing]
+        # ignore_conflicts : clients insérés par ailleurs entre la requête IN et l'écriture
+        customers.bulk_create(
+            [Customer(**by_email[email]) for email in written],
+            batch_size=_write_batch_size(Customer, using),
+            ignore_conflicts=True,
+        )
+        stats.skipped += len(existing)
+        stats.created += len(written)
+    # Clés non renvoyées en cas de conflit : relues par email
+    return list(customers.filter(email__in=written).values_list("pk", flat=True))
+
+
+def write_products(values, on_conflict, using, stats):
+    # Pas de clé naturelle : chaque ligne crée un produit
+    products = Product.objects.using(using).bulk_create(
+        [Product(**value) for value in values],
+        batch_size=_write_batch_size(Product, using),
+    )
+    stats.created += len(values)
+    pks = [product.pk for product in products]
+    return None if None in pks else pks
+
+
+KINDS = {
+    "customers": (Customer, clean_customer, write_customers),
+    "products": (Product, clean_product, write_products),
+}
+
+
+def iter_import(kind, rows, batch_size=IMPORT_BATCH_SIZE, on_conflict="ignore", using="default"):
+    """
+    Importe les lignes (numéro, valeurs) par lots, une transaction par lot.
+    Génère les statistiques cumulées après chaque lot.
+    """
+    model, clean, write = KINDS[kind]
+    search = get_search_backend(using)
+    stats = ImportStats()
+    rebuild = False
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        stats.read += len(batch)
+        values = _clean_batch(batch, clean, stats)
+        if values:
+            with write_atomic(using=using):
+                pks = write(values, on_conflict, using, stats)
+                if pks is None:
+                    rebuild = True
+                else:
+                    search.index_many(model, pks)
+                response_cache.invalidate_on_commit(model._meta.label, using=using)
+        yield stats
+    if rebuild:
+        # Clés primaires inconnues (bulk_create sans RETURNING, ex. MySQL)
+        search.rebuild(model)
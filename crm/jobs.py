@@ -0,0 +1,69 @@
+# crm/jobs.py
+"""
+Traitements de fond répartis en tâches Celery (crm/tasks.py).
+
+Un Job découpe l'espace des ids concernés en tranches [début, fin) traitées
+chacune par sa propre tâche ; un chord agrège leurs résultats. Les tâches
+font avancer le Job en base (UPDATE ... SET processed = processed + n),
+ce que la requête GraphQL jobStatus permet de suivre.
+"""
+from django.conf import settings
+from django.db.models import Case, F, Max, Min, Value, When
+from django.utils import timezone
+
+from .models import Job
+from .response_cache import response_cache
+
+DEFAULT_JOBS = {
+    # Largeur d'une tranche, en ids
+    "SHARD_SIZE": 10000,
+}
+
+
+def _config():
+    return {**DEFAULT_JOBS, **getattr(settings, "CRM_JOBS", {})}
+
+
+def _invalidate():
+    # update() n'émet pas de signaux : jobStatus ne doit pas rester en cache.
+    # Appelé dans les workers Celery : la version de l'étiquette est lue par le
+    # web dans le cache partagé (settings.CACHES)
+    response_cache.invalidate_on_commit(Job._meta.label)
+
+
+def id_shards(queryset, shard_size=None):
+    """Tranches [début, fin) couvrant les ids du queryset, calculées en une requête."""
+    shard_size = shard_size or _config()["SHARD_SIZE"]
+    bounds = queryset.order_by().aggregate(low=Min("pk"), high=Max("pk"))
+    if bounds["low"] is None:
+        return []
+    return [
+        (start, min(start + shard_size, bounds["high"] + 1))
+        for start in range(bounds["low"], bounds["high"] + 1, shard_size)
+    ]
+
+
+def create_job(kind, params, shards_total):
+    return Job.objects.create(kind=kind, params=params, shards_total=shards_total)
+
+
+def add_progress(job_id, processed=0, shards_done=0):
+    Job.objects.filter(pk=job_id).update(
+        processed=F("processed") + processed,
+        shards_done=F("shards_done") + shards_done,
+        status=Case(When(status="pending", then=Value("running")), default=F("status")),
+    )
+    _invalidate()
+
+
+def finish_job(job_id, result):
+    # Un Job en échec le reste, même si le chord se termine
+    Job.objects.filter(pk=job_id).exclude(status="failure").update(
+        status="success", result=result, finished_at=timezone.now()
+    )
+    _invalidate()
+
+
+def fail_job(job_id, error):
+    Job.objects.filter(pk=job_id).update(status="failure", error=error, finished_at=timezone.now())
+    _invalidate()
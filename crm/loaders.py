@@ -0,0 +1,198 @@
+# crm/loaders.py
+"""
+DataLoaders par requête pour les relations Order / OrderItem / Customer / Product.
+
+L'exécuteur graphql-core est synchrone sous GraphQLView : il résout chaque
+noeud entièrement (en profondeur) avant de passer au suivant, on ne peut donc
+pas différer les chargements comme avec un DataLoader asynchrone. À la place,
+chaque niveau « annonce » les clés de ses frères (prime) dès qu'il est chargé ;
+le premier load() d'un niveau charge alors toutes les clés annoncées en une
+seule requête SQL.
+
+Sous la vue asynchrone, aload() fait de même avec l'ORM asynchrone ; les
+résolutions concurrentes d'un même niveau attendent le lot déjà en cours.
+"""
+import asyncio
+from collections import defaultdict
+
+from .models import Customer, Product, Order, OrderItem
+
+
+class DataLoader:
+    """
+    Chargeur par lot, synchrone (load) ou asynchrone (aload).
+
+    batch_load_fn / abatch_load_fn reçoivent une liste de clés et retournent
+    un dict clé -> valeur ; les clés absentes du dict prennent la valeur `default`.
+    """
+
+    def __init__(self, batch_load_fn, abatch_load_fn=None, default=None, on_load=None):
+        self.batch_load_fn = batch_load_fn
+        self.abatch_load_fn = abatch_load_fn
+        self.default = default
+        self.on_load = on_load
+        self._cache = {}
+        self._pending = {}  # dict utilisé comme ensemble ordonné
+        self._loading = {}  # clé -> future du lot asynchrone en cours
+
+    def prime(self, keys):
+        # Annonce des clés qui seront probablement demandées
+        for key in keys:
+            if key is not None and key not in self._cache and key not in self._loading:
+                self._pending[key] = None
+
+    def load(self, key):
+        if key not in self._cache:
+            self._pending[key] = None
+            self._dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        self.prime(keys)
+        return [self.load(key) for key in keys]
+
+    async def aload(self, key):
+        if key in self._cache:
+            return self._cache[key]
+        if key not in self._loading:
+            self._pending[key] = None
+            await self._adispatch()
+        return await self._loading[key] if key in self._loading else self._cache[key]
+
+    def _store(self, keys, results):
+        for key in keys:
+            value = results.get(key, self.default)
+            # Une valeur par défaut mutable ne doit pas être partagée entre clés
+            self._cache[key] = list(value) if isinstance(value, list) else value
+        if self.on_load is not None:
+            self.on_load([self._cache[key] for key in keys])
+
+    def _dispatch(self):
+        keys = list(self._pending)
+        self._pending.clear()
+        self._store(keys, self.batch_load_fn(keys))
+
+    async def _adispatch(self):
+        keys = list(self._pending)
+        self._pending.clear()
+        loop = asyncio.get_running_loop()
+        futures = {key: loop.create_future() for key in keys}
+        self._loading.update(futures)
+        try:
+            self._store(keys, await self.abatch_load_fn(keys))
+        except Exception as error:
+            for future in futures.values():
+                future.set_exception(error)
+            raise
+        else:
+            for key, future in futures.items():
+                future.set_result(self._cache[key])
+        finally:
+            for key in keys:
+                self._loading.pop(key, None)
+
+
+def _by_id(model):
+    def batch_load(keys):
+        return model.objects.in_bulk(keys)
+
+    async def abatch_load(keys):
+        return await model.objects.ain_bulk(keys)
+
+    return batch_load, abatch_load
+
+
+def _grouped_by(model, field_name):
+    def queryset(keys):
+        return model.objects.filter(**{f"{field_name}__in": keys}).order_by("pk")
+
+    def batch_load(keys):
+        grouped = defaultdict(list)
+        for obj in queryset(keys):
+            grouped[getattr(obj, field_name)].append(obj)
+        return grouped
+
+    async def abatch_load(keys):
+        grouped = defaultdict(list)
+        async for obj in queryset(keys):
+            grouped[getattr(obj, field_name)].append(obj)
+        return grouped
+
+    return batch_load, abatch_load
+
+
+def _loaded_values(instances, attname):
+    # Les colonnes différées (only()) ne sont pas lues : une requête par instance
+    return (obj.__dict__[attname] for obj in instances if attname in obj.__dict__)
+
+
+def _flatten(values):
+    for value in values:
+        if isinstance(value, list):
+            yield from value
+        elif value is not None:
+            yield value
+
+
+class Loaders:
+    """Ensemble des loaders d'une requête GraphQL."""
+
+    def __init__(self):
+        self.customer_by_id = DataLoader(*_by_id(Customer), on_load=self._register_loaded)
+        self.product_by_id = DataLoader(*_by_id(Product), on_load=self._register_loaded)
+        self.order_by_id = DataLoader(*_by_id(Order), on_load=self._register_loaded)
+        self.items_by_order_id = DataLoader(
+            *_grouped_by(OrderItem, "order_id"), default=[], on_load=self._register_loaded
+        )
+        self.orders_by_customer_id = DataLoader(
+            *_grouped_by(Order, "customer_id"), default=[], on_load=self._register_loaded
+        )
+
+    def register(self, instances):
+        """
+        Annonce aux loaders les clés des relations d'une liste d'instances
+        (une page de connexion, le résultat d'un autre loader, ...).
+        """
+        instances = list(instances)
+        orders = [obj for obj in instances if isinstance(obj, Order)]
+        customers = [obj for obj in instances if isinstance(obj, Customer)]
+        items = [obj for obj in instances if isinstance(obj, OrderItem)]
+
+        if orders:
+            self.customer_by_id.prime(_loaded_values(orders, "customer_id"))
+            self.items_by_order_id.prime(order.pk for order in orders)
+        if customers:
+            self.orders_by_customer_id.prime(customer.pk for customer in customers)
+        if items:
+            self.product_by_id.prime(_loaded_values(items, "product_id"))
+            self.order_by_id.prime(_loaded_values(items, "order_id"))
+
+    def _register_loaded(self, values):
+        self.register(_flatten(values))
+
+
+def get_loaders(info):
+    """
+    Retourne les loaders attachés au contexte de la requête (créés à la demande).
+    Sans contexte, on retourne des loaders neufs : correct, mais sans batching.
+    """
+    context = info.context
+    loaders = getattr(context, "crm_loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        if context is not None:
+            setattr(context, "crm_loaders", loaders)
+    return loaders
+
+
+def is_async_execution(info):
+    """Vrai si la requête est exécutée par la vue asynchrone (crm.views.AsyncGraphQLView)."""
+    return getattr(info.context, "graphql_async", False)
+
+
+def load(info, loader_name, key):
+    """load() ou aload() selon le mode d'exécution de la requête."""
+    loader = getattr(get_loaders(info), loader_name)
+    if is_async_execution(info):
+        return loader.aload(key)
+    return loader.load(key)
@@ -0,0 +1,40 @@
+# crm/management/commands/clean_inactive_customers.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import cleanup
+from crm.cleanup import iter_cleanup
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les clients sans commande depuis --days jours, avec leurs "
+        "commandes, par lots d'ids (une transaction courte par lot). "
+        "Reprend là où une exécution interrompue s'est arrêtée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Inactivité minimale, en jours")
+        parser.add_argument('--chunk-size', type=int, default=cleanup._config()["CHUNK_SIZE"],
+                            help="Clients parcourus par lot (défaut : CRM_CUSTOMER_CLEANUP)")
+        parser.add_argument('--sleep', type=float,
+                            help="Pause entre deux lots (secondes), pour limiter la charge")
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignorer l'exécution interrompue et repartir du début")
+
+    def handle(self, *args, days, chunk_size, sleep, database, restart, **options):
+        if chunk_size < 1:
+            raise CommandError("--chunk-size doit être au moins 1")
+        started = time.monotonic()
+        scanned = deleted = 0
+        for last_id, count, removed in iter_cleanup(days, chunk_size, sleep, using=database, restart=restart):
+            scanned += count
+            deleted += removed
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{scanned} clients parcourus, {deleted} supprimés (dernier id : {last_id})")
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Nombre de clients inactifs supprimés : {deleted} ({scanned} parcourus en {elapsed:.1f} s)"
+        ))
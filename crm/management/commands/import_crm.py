@@ -0,0 +1,49 @@
+# crm/management/commands/import_crm.py
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.importer import IMPORT_BATCH_SIZE, KINDS, READERS, ImportStats, detect_format, iter_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe des clients ou des produits depuis un fichier CSV ou NDJSON "
+        "(lu en flux, validé et écrit par lots d'INSERT multi-lignes)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(KINDS))
+        parser.add_argument('path', help="Fichier à importer ('-' : entrée standard)")
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help="Format du fichier (par défaut : d'après l'extension, sinon csv)")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help="Lignes validées et écrites par transaction")
+        parser.add_argument('--on-conflict', choices=['ignore', 'update'], default='ignore',
+                            help="Clients dont l'email existe déjà : ignorés ou mis à jour")
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, kind, path, format, batch_size, on_conflict, database, **options):
+        if batch_size < 1:
+            raise CommandError("--batch-size doit être au moins 1")
+        format = format or detect_format(path)
+        try:
+            stream = nullcontext(sys.stdin) if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as e:
+            raise CommandError(f"Impossible d'ouvrir {path} : {e}")
+
+        stats = ImportStats()
+        with stream as lines:
+            rows = READERS[format](lines)
+            for stats in iter_import(kind, rows, batch_size, on_conflict, using=database):
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{stats.read} lignes lues ({stats.rows_per_second:.0f} lignes/s)")
+
+        for line, message in stats.errors:
+            self.stderr.write(f"Ligne {line} : {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats.read} lignes en {stats.elapsed:.1f} s ({stats.rows_per_second:.0f} lignes/s) : "
+            f"{stats.created} créées, {stats.updated} mises à jour, {stats.skipped} ignorées, "
+            f"{stats.invalid} invalides"
+        ))
@@ -0,0 +1,34 @@
+# crm/management/commands/rebuild_customer_stats.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm.customer_stats import REBUILD_CHUNK_SIZE, iter_rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les agrégats order_count / lifetime_revenue / last_order_date "
+        "de tous les clients, par lots d'ids (une transaction courte par lot)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE,
+                            help="Clients recalculés par lot")
+        parser.add_argument('--after-id', type=int, default=0,
+                            help="Reprendre après cet id de client")
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help="Pause entre deux lots (secondes), pour limiter la charge")
+
+    def handle(self, *args, chunk_size, after_id, database, sleep, **options):
+        started = time.monotonic()
+        total = 0
+        for last_id, count in iter_rebuild(chunk_size, after_id, using=database):
+            total += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{total} clients recalculés (dernier id : {last_id})")
+            if sleep:
+                time.sleep(sleep)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"{total} clients recalculés en {elapsed:.1f} s"))
@@ -0,0 +1,32 @@
+# crm/management/commands/rebuild_sales_rollup.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm.rollup import REBUILD_CHUNK_DAYS, iter_rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les ventes journalières (jour × produit, jour × statut) lues "
+        "par revenueByPeriod, par tranches de jours (une transaction courte par tranche)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-days', type=int, default=REBUILD_CHUNK_DAYS,
+                            help="Jours recalculés par tranche")
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help="Pause entre deux tranches (secondes), pour limiter la charge")
+
+    def handle(self, *args, chunk_days, database, sleep, **options):
+        started = time.monotonic()
+        total = 0
+        for last_day, count in iter_rebuild(chunk_days, using=database):
+            total += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{total} commandes agrégées (jusqu'au {last_day})")
+            if sleep:
+                time.sleep(sleep)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"{total} commandes agrégées en {elapsed:.1f} s"))
@@ -0,0 +1,279 @@
+# crm/metrics.py
+"""
+Mesures par chemin de résolveur GraphQL, identifié par la coordonnée du champ
+dans le schéma (Query.allOrders, OrderType.items) et non par les alias de la
+requête, pour un nombre de séries borné par le schéma : durée, nombre de
+requêtes SQL et nombre d'objets retournés.
+
+- ResolverProfile : mesures d'une requête HTTP, alimentées par
+  crm.middleware.ResolverMetricsMiddleware et par un execute_wrapper installé
+  sur chaque connexion (les requêtes SQL sont attribuées au résolveur actif) ;
+- sinks : agrégation des profils entre requêtes. InMemorySink tient des
+  histogrammes par chemin et les expose au format texte Prometheus
+  (vue crm.views.graphql_metrics).
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_METRICS = {
+    "ENABLED": True,
+    # En-tête HTTP demandant le profil dans `extensions` (X-GraphQL-Debug: 1)
+    "DEBUG_HEADER": "X-GraphQL-Debug",
+    "SINK": "crm.metrics.InMemorySink",
+}
+
+# Bornes des histogrammes (secondes / requêtes SQL par chemin et par requête HTTP)
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+# Chemin des requêtes SQL hors de tout résolveur mesuré (champ par défaut
+# lisant une colonne différée, ...)
+UNATTRIBUTED = "(unattributed)"
+
+_active_profile = ContextVar("crm_graphql_profile", default=None)
+_active_path = ContextVar("crm_graphql_resolver_path", default=None)
+
+
+class PathStats:
+    __slots__ = ("calls", "duration", "queries", "rows")
+
+    def __init__(self):
+        self.calls = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.rows = 0
+
+
+class ResolverProfile:
+    """Mesures d'une exécution GraphQL, par chemin de résolveur."""
+
+    def __init__(self, operation_name=None):
+        self.operation_name = operation_name
+        self.paths = {}
+        self.queries = 0
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self._lock = threading.Lock()
+
+    def _stats(self, path):
+        stats = self.paths.get(path)
+        if stats is None:
+            stats = self.paths[path] = PathStats()
+        return stats
+
+    def add_call(self, path, duration, rows):
+        with self._lock:
+            stats = self._stats(path)
+            stats.calls += 1
+            stats.duration += duration
+            stats.rows += rows
+
+    def add_query(self, path):
+        with self._lock:
+            self.queries += 1
+            self._stats(path or UNATTRIBUTED).queries += 1
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def summary(self):
+        """Résumé pour `extensions`, chemins les plus lents d'abord."""
+        with self._lock:
+            resolvers = [
+                {
+                    "path": path,
+                    "calls": stats.calls,
+                    "durationMs": round(stats.duration * 1000, 3),
+                    "queries": stats.queries,
+                    "rows": stats.rows,
+                }
+                for path, stats in self.paths.items()
+            ]
+        resolvers.sort(key=lambda entry: entry["durationMs"], reverse=True)
+        return {
+            "durationMs": round(self.duration * 1000, 3),
+            "queries": self.queries,
+            "resolvers": resolvers,
+        }
+
+
+def count_query(execute, sql, params, many, context):
+    """execute_wrapper : attribue chaque requête SQL au profil et au résolveur actifs."""
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.add_query(_active_path.get())
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+@contextmanager
+def resolver_path(path):
+    token = _active_path.set(path)
+    try:
+        yield
+    finally:
+        _active_path.reset(token)
+
+
+def active_profile():
+    return _active_profile.get()
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class MetricsSink(ABC):
+    """Interface des sinks : reçoit le profil de chaque exécution terminée."""
+
+    @abstractmethod
+    def record(self, profile):
+        """Enregistre le profil d'une exécution terminée."""
+
+    def render_prometheus(self):
+        return None
+
+
+class NullSink(MetricsSink):
+    def record(self, profile):
+        pass
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class InMemorySink(MetricsSink):
+    """
+    Histogrammes par chemin, en mémoire du processus : durée cumulée du chemin
+    et nombre de requêtes SQL par exécution, compteurs d'appels et d'objets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.durations = {}
+            self.query_counts = {}
+            self.calls = {}
+            self.rows = {}
+            self.operations = _Histogram(DURATION_BUCKETS)
+
+    def record(self, profile):
+        with self._lock:
+            self.operations.observe(profile.duration)
+            for path, stats in profile.paths.items():
+                if path not in self.durations:
+                    self.durations[path] = _Histogram(DURATION_BUCKETS)
+                    self.query_counts[path] = _Histogram(QUERY_BUCKETS)
+                    self.calls[path] = self.rows[path] = 0
+                self.durations[path].observe(stats.duration)
+                self.query_counts[path].observe(stats.queries)
+                self.calls[path] += stats.calls
+                self.rows[path] += stats.rows
+
+    def render_prometheus(self):
+        with self._lock:
+            lines = [
+                "# HELP crm_graphql_operation_duration_seconds Durée d'exécution des opérations GraphQL.",
+                "# TYPE crm_graphql_operation_duration_seconds histogram",
+                *self.operations.render("crm_graphql_operation_duration_seconds", 'schema="crm"'),
+                "# HELP crm_graphql_resolver_duration_seconds Durée cumulée d'un chemin de résolveur par opération.",
+                "# TYPE crm_graphql_resolver_duration_seconds histogram",
+            ]
+            for path, histogram in sorted(self.durations.items()):
+                lines += histogram.render("crm_graphql_resolver_duration_seconds", f'path="{_escape(path)}"')
+            lines += [
+                "# HELP crm_graphql_resolver_queries Requêtes SQL d'un chemin de résolveur par opération.",
+                "# TYPE crm_graphql_resolver_queries histogram",
+            ]
+            for path, histogram in sorted(self.query_counts.items()):
+                lines += histogram.render("crm_graphql_resolver_queries", f'path="{_escape(path)}"')
+            lines += [
+                "# HELP crm_graphql_resolver_calls_total Appels d'un chemin de résolveur.",
+                "# TYPE crm_graphql_resolver_calls_total counter",
+            ]
+            lines += [
+                f'crm_graphql_resolver_calls_total{{path="{_escape(path)}"}} {count}'
+                for path, count in sorted(self.calls.items())
+            ]
+            lines += [
+                "# HELP crm_graphql_resolver_rows_total Objets retournés par un chemin de résolveur.",
+                "# TYPE crm_graphql_resolver_rows_total counter",
+            ]
+            lines += [
+                f'crm_graphql_resolver_rows_total{{path="{_escape(path)}"}} {count}'
+                for path, count in sorted(self.rows.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+
+class ResolverMetrics:
+    def __init__(self, enabled=True, debug_header="X-GraphQL-Debug", sink=None):
+        self.enabled = enabled
+        self.debug_header = debug_header
+        self.sink = sink if sink is not None else NullSink()
+
+    def debug_requested(self, request):
+        if not self.debug_header:
+            return False
+        return request.headers.get(self.debug_header, "").lower() in ("1", "true", "yes")
+
+    @contextmanager
+    def profile(self, operation_name=None):
+        """Active un profil pour l'exécution en cours ; transmis au sink à la fin."""
+        if not self.enabled:
+            yield None
+            return
+        profile = ResolverProfile(operation_name)
+        token = _active_profile.set(profile)
+        try:
+            yield profile
+        finally:
+            _active_profile.reset(token)
+            profile.finish()
+            self.sink.record(profile)
+
+
+def _build_metrics():
+    config = {**DEFAULT_METRICS, **getattr(settings, "GRAPHQL_METRICS", {})}
+    sink = config["SINK"]
+    if isinstance(sink, str):
+        sink = import_string(sink)()
+    return ResolverMetrics(enabled=config["ENABLED"], debug_header=config["DEBUG_HEADER"], sink=sink)
+
+
+metrics = _build_metrics()
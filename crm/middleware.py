@@ -0,0 +1,102 @@
+# crm/middleware.py
+"""
+Middlewares graphene du CRM.
+"""
+import time
+from functools import partial
+from inspect import isawaitable
+
+from django.db.models import Manager, QuerySet
+from graphene.types.resolver import dict_or_attr_resolver
+from graphql import get_named_type, is_leaf_type
+
+from .loaders import is_async_execution
+from .metrics import active_profile, resolver_path
+
+
+async def _evaluate(queryset):
+    return [obj async for obj in queryset]
+
+
+class AsyncORMMiddleware:
+    """
+    Sous la vue asynchrone, évalue avec l'ORM asynchrone les Manager /
+    QuerySet retournés par les résolveurs par défaut (product.orderitemSet...),
+    que l'exécuteur parcourrait sinon de manière synchrone.
+    """
+
+    def resolve(self, next, root, info, **args):
+        result = next(root, info, **args)
+        if not is_async_execution(info):
+            return result
+        if isinstance(result, Manager):
+            result = result.all()
+        if isinstance(result, QuerySet):
+            return _evaluate(result)
+        return result
+
+
+# id(GraphQLField) -> champ trivial ; les champs vivent autant que le schéma
+_trivial_fields = {}
+
+
+def _is_trivial(field):
+    """Champ lu par le résolveur par défaut (attribut, edges, node) ou scalaire généré."""
+    trivial = _trivial_fields.get(id(field))
+    if trivial is None:
+        resolve = field.resolve
+        trivial = resolve is None or (
+            isinstance(resolve, partial)
+            and (resolve.func is dict_or_attr_resolver or is_leaf_type(get_named_type(field.type)))
+        )
+        _trivial_fields[id(field)] = trivial
+    return trivial
+
+
+def _count_rows(result):
+    if result is None:
+        return 0
+    edges = getattr(result, "edges", None)
+    if edges is not None:
+        return len(edges)
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, (str, bytes, int, float, bool)):
+        return 0
+    return 1
+
+
+def _path(info):
+    # Coordonnée du champ dans le schéma (OrderType.items) : les alias choisis
+    # par le client ne créent ni nouvelles séries ni nouveaux libellés Prometheus
+    return f"{info.parent_type.name}.{info.field_name}"
+
+
+class ResolverMetricsMiddleware:
+    """
+    Mesure durée, requêtes SQL et objets retournés par champ du schéma
+    (Type.champ), dans le profil actif (crm.metrics). Les champs triviaux (attributs,
+    edges / node) ne sont pas mesurés ; le SQL qu'ils déclencheraient est
+    compté comme non attribué.
+    """
+
+    def resolve(self, next, root, info, **args):
+        profile = active_profile()
+        if profile is None or _is_trivial(info.parent_type.fields[info.field_name]):
+            return next(root, info, **args)
+
+        path = _path(info)
+        start = time.perf_counter()
+        with resolver_path(path):
+            result = next(root, info, **args)
+        if isawaitable(result):
+            return self._await(profile, path, start, result)
+        profile.add_call(path, time.perf_counter() - start, _count_rows(result))
+        return result
+
+    @staticmethod
+    async def _await(profile, path, start, awaitable):
+        with resolver_path(path):
+            result = await awaitable
+        profile.add_call(path, time.perf_counter() - start, _count_rows(result))
+        return result
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def setup_search(apps, schema_editor):
+    from crm.search import get_search_backend
+
+    get_search_backend(schema_editor.connection.alias).setup(apps)
+
+
+def teardown_search(apps, schema_editor):
+    from crm.search import get_search_backend
+
+    get_search_backend(schema_editor.connection.alias).teardown(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(setup_search, teardown_search),
+    ]
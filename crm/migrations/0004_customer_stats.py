@@ -0,0 +1,63 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:43
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_customer_stats(apps, schema_editor):
+    # Un seul UPDATE avec sous-requêtes corrélées ; pour une très grosse
+    # base, préférer `manage.py rebuild_customer_stats` (par lots)
+    Customer = apps.get_model('crm', 'Customer')
+    Order = apps.get_model('crm', 'Order')
+    db = schema_editor.connection.alias
+    orders = Order.objects.using(db).filter(customer=OuterRef('pk')).order_by().values('customer')
+    Customer.objects.using(db).update(
+        order_count=Coalesce(Subquery(orders.annotate(n=Count('pk')).values('n')), 0),
+        lifetime_revenue=Coalesce(
+            Subquery(orders.annotate(total=Sum('total_amount')).values('total')),
+            Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+        last_order_date=Subquery(orders.annotate(last=Max('order_date')).values('last')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_date',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='date de la dernière commande'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name="chiffre d'affaires cumulé"),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='order_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='nombre de commandes'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['lifetime_revenue', 'id'], name='crm_customer_revenue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['order_count', 'id'], name='crm_customer_order_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['last_order_date'], name='crm_customer_last_order_idx'),
+        ),
+        migrations.RunPython(backfill_customer_stats, migrations.RunPython.noop),
+    ]
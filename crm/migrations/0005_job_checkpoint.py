@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_customer_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='traitement')),
+                ('position', models.JSONField(default=dict, verbose_name='position')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='date de mise à jour')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:52
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_job_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=50, verbose_name='type')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('success', 'Terminé'), ('failure', 'Échec')], default='pending', max_length=20, verbose_name='statut')),
+                ('params', models.JSONField(default=dict, verbose_name='paramètres')),
+                ('shards_total', models.PositiveIntegerField(default=0, verbose_name='nombre de tranches')),
+                ('shards_done', models.PositiveIntegerField(default=0, verbose_name='tranches terminées')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='objets traités')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='résultat')),
+                ('error', models.TextField(blank=True, verbose_name='erreur')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='date de création')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='date de fin')),
+            ],
+        ),
+    ]
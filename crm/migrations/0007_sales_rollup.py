@@ -0,0 +1,88 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_sales_rollup(apps, schema_editor):
+    # Agrégats complets en deux requêtes ; pour une très grosse base, préférer
+    # `manage.py rebuild_sales_rollup` (par tranches de jours)
+    Order = apps.get_model('crm', 'Order')
+    OrderItem = apps.get_model('crm', 'OrderItem')
+    DailyStatusSales = apps.get_model('crm', 'DailyStatusSales')
+    DailyProductSales = apps.get_model('crm', 'DailyProductSales')
+    db = schema_editor.connection.alias
+    tzinfo = timezone.get_default_timezone()
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    statuses = (
+        Order.objects.using(db)
+        .annotate(day=TruncDate('order_date', tzinfo=tzinfo))
+        .order_by()
+        .values('day', 'status')
+        .annotate(order_count=Count('pk'), revenue=Sum('total_amount', output_field=amount))
+    )
+    products = (
+        OrderItem.objects.using(db)
+        .annotate(day=TruncDate('order__order_date', tzinfo=tzinfo))
+        .order_by()
+        .values('day', 'product_id')
+        .annotate(
+            order_count=Count('order_id', distinct=True),
+            # Noms distincts des champs de OrderItem lus par l'autre agrégat
+            units=Sum('quantity'),
+            sales=Sum(F('quantity') * F('unit_price'), output_field=amount),
+        )
+    )
+    DailyStatusSales.objects.using(db).bulk_create([DailyStatusSales(**row) for row in statuses])
+    DailyProductSales.objects.using(db).bulk_create(
+        [
+            DailyProductSales(
+                day=row['day'], product_id=row['product_id'], order_count=row['order_count'],
+                quantity=row['units'], revenue=row['sales'],
+            )
+            for row in products
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStatusSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='jour')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('paid', 'Payé'), ('shipped', 'Expédié'), ('delivered', 'Livré'), ('cancelled', 'Annulé')], max_length=20, verbose_name='statut')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='nombre de commandes')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="chiffre d'affaires")),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'status'), name='crm_dailystatussales_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='jour')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='nombre de commandes')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='quantité vendue')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="chiffre d'affaires")),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='crm.product', verbose_name='produit')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='crm_dailyproductsales_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='crm_dailyproductsales_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_sales_rollup, migrations.RunPython.noop),
+    ]
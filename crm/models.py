@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 
@@ -9,6 +11,22 @@ class Customer(models.Model):
     address = models.TextField(blank=True, verbose_name="adresse")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="date de création")
 
+    # Agrégats des commandes, maintenus par crm/customer_stats.py
+    # (recalcul complet : manage.py rebuild_customer_stats)
+    order_count = models.PositiveIntegerField(default=0, verbose_name="nombre de commandes")
+    lifetime_revenue = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, verbose_name="chiffre d'affaires cumulé"
+    )
+    last_order_date = models.DateTimeField(null=True, blank=True, verbose_name="date de la dernière commande")
+
+    class Meta:
+        indexes = [
+            # CustomerFilter : tri / filtre sur les agrégats (meilleurs clients)
+            models.Index(fields=['lifetime_revenue', 'id'], name='crm_customer_revenue_idx'),
+            models.Index(fields=['order_count', 'id'], name='crm_customer_order_count_idx'),
+            models.Index(fields=['last_order_date'], name='crm_customer_last_order_idx'),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
@@ -20,6 +38,13 @@ class Product(models.Model):
     stock_quantity = models.IntegerField(default=0, verbose_name="quantité en stock")
     is_available = models.BooleanField(default=True, verbose_name="disponible")
 
+    class Meta:
+        indexes = [
+            # ProductFilter : is_available + price_min/price_max
+            models.Index(fields=['is_available', 'price'], name='crm_product_avail_price_idx'),
+            models.Index(fields=['price'], name='crm_product_price_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -61,6 +86,15 @@ class Order(models.Model):
         verbose_name="montant total"
     )
 
+    class Meta:
+        indexes = [
+            # OrderFilter : client / statut combinés à une plage de dates
+            models.Index(fields=['customer', 'order_date'], name='crm_order_cust_date_idx'),
+            models.Index(fields=['status', 'order_date'], name='crm_order_status_date_idx'),
+            models.Index(fields=['order_date'], name='crm_order_date_idx'),
+            models.Index(fields=['total_amount'], name='crm_order_total_idx'),
+        ]
+
     def __str__(self):
         return f"Commande #{self.id} - {self.customer}"
 
@@ -82,5 +116,89 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1, verbose_name="quantité")
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="prix unitaire")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'product'], name='crm_orderitem_order_prod_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name}"
+
+class JobCheckpoint(models.Model):
+    # Position de reprise d'un traitement par lots (crm/checkpoints.py)
+    name = models.CharField(max_length=100, unique=True, verbose_name="traitement")
+    position = models.JSONField(default=dict, verbose_name="position")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="date de mise à jour")
+
+    def __str__(self):
+        return f"{self.name} : {self.position}"
+
+
+class Job(models.Model):
+    # Traitement de fond réparti en tâches Celery (crm/jobs.py, crm/tasks.py)
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('success', 'Terminé'),
+        ('failure', 'Échec'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50, verbose_name="type")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="statut")
+    params = models.JSONField(default=dict, verbose_name="paramètres")
+    shards_total = models.PositiveIntegerField(default=0, verbose_name="nombre de tranches")
+    shards_done = models.PositiveIntegerField(default=0, verbose_name="tranches terminées")
+    processed = models.PositiveIntegerField(default=0, verbose_name="objets traités")
+    result = models.JSONField(null=True, blank=True, verbose_name="résultat")
+    error = models.TextField(blank=True, verbose_name="erreur")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="date de création")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="date de fin")
+
+    @property
+    def progress(self):
+        if self.status == 'success':
+            return 1.0
+        if not self.shards_total:
+            return 0.0
+        return self.shards_done / self.shards_total
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.status})"
+
+
+# Ventes agrégées par jour (date locale de Order.order_date), maintenues par
+# crm/rollup.py : la requête revenueByPeriod ne lit que ces tables
+# (recalcul complet : manage.py rebuild_sales_rollup)
+class DailyProductSales(models.Model):
+    day = models.DateField(verbose_name="jour")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales', verbose_name="produit")
+    order_count = models.PositiveIntegerField(default=0, verbose_name="nombre de commandes")
+    quantity = models.PositiveIntegerField(default=0, verbose_name="quantité vendue")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="chiffre d'affaires")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='crm_dailyproductsales_uniq'),
+        ]
+        indexes = [
+            # Recalcul par plages de jours (crm/rollup.py)
+            models.Index(fields=['day'], name='crm_dailyproductsales_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.product_id} : {self.revenue}"
+
+
+class DailyStatusSales(models.Model):
+    day = models.DateField(verbose_name="jour")
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name="statut")
+    order_count = models.PositiveIntegerField(default=0, verbose_name="nombre de commandes")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="chiffre d'affaires")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status'], name='crm_dailystatussales_uniq'),
+        ]
+
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
\ No newline at end of file
+        return f"{self.day} - {self.status} : {self.revenue}"
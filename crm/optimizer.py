@@ -0,0 +1,191 @@
+# crm/optimizer.py
+"""
+Planification automatique de select_related / prefetch_related / only()
+à partir de l'ensemble de sélection GraphQL (info.field_nodes).
+
+Exemple : allOrders { edges { node { totalAmount customer { email } items { product { name } } } } }
+donne
+    Order.objects.select_related("customer")
+                 .prefetch_related(Prefetch("items", OrderItem.objects.select_related("product").only(...)))
+                 .only("id", "total_amount", "customer", "customer__id", "customer__email")
+
+Les connexions imbriquées paginées par `first` (customer { orders(first: 5) })
+sont préchargées par un Prefetch découpé (fonction de fenêtre, par parent) :
+les lignes de la page et la suivante (hasNextPage), pas toute la relation.
+"""
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql import Undefined, value_from_ast_untyped
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+from graphql_relay import cursor_to_offset
+
+# Attribut des relations préchargées par page (Prefetch découpé)
+PAGE_ATTR = "_prefetched_page_"
+
+
+def _collect_fields(selection_set, fragments, fields=None):
+    # Regroupe les FieldNode par nom (snake_case), fragments compris
+    if fields is None:
+        fields = {}
+    if selection_set is None:
+        return fields
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            fields.setdefault(to_snake_case(selection.name.value), []).append(selection)
+        elif isinstance(selection, InlineFragmentNode):
+            _collect_fields(selection.selection_set, fragments, fields)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            if fragment is not None:
+                _collect_fields(fragment.selection_set, fragments, fields)
+    return fields
+
+
+def _node_fields(field_nodes, fragments):
+    """
+    Champs demandés sur l'objet : pour une connexion, ceux de edges { node { ... } },
+    sinon ceux de la sélection directe.
+    """
+    fields = {}
+    for field_node in field_nodes:
+        selected = _collect_fields(field_node.selection_set, fragments)
+        if "edges" in selected:
+            for edges_node in selected["edges"]:
+                for node in _collect_fields(edges_node.selection_set, fragments).get("node", []):
+                    _collect_fields(node.selection_set, fragments, fields)
+        else:
+            for name, nodes in selected.items():
+                fields.setdefault(name, []).extend(nodes)
+    return fields
+
+
+def _prefetch_limit(field_nodes, fragments, variables):
+    """
+    Lignes à précharger par parent pour une connexion imbriquée : jusqu'à la
+    fin de la page demandée par first (après after / offset), plus une pour
+    hasNextPage. None : toute la relation (pas de first, last / before,
+    totalCount demandé ou curseur illisible).
+    """
+    limits = []
+    for field_node in field_nodes:
+        args = {arg.name.value: value_from_ast_untyped(arg.value, variables) for arg in field_node.arguments}
+        # Variables non fournies : Undefined
+        args = {name: value for name, value in args.items() if value is not Undefined}
+        first = args.get("first")
+        if first is None or args.get("last") is not None or args.get("before") is not None:
+            return None
+        if "total_count" in _collect_fields(field_node.selection_set, fragments):
+            return None
+        start = args.get("offset") or 0
+        if args.get("after") is not None:
+            after = cursor_to_offset(args["after"])
+            if after is None:
+                return None
+            start += after + 1
+        limits.append(start + first + 1)
+    # Même relation sous plusieurs alias : la plus longue des pages
+    return max(limits) if limits else None
+
+
+def _model_fields(model):
+    # Nom GraphQL (snake_case) -> champ Django, relations inverses comprises
+    fields = {}
+    for field in model._meta.get_fields():
+        if field.auto_created and not field.concrete:
+            fields[field.get_accessor_name()] = field
+        else:
+            fields[field.name] = field
+    fields["id"] = model._meta.pk
+    return fields
+
+
+def _plan(model, fields, fragments, variables, prefix, only, select_related, prefetches, required=()):
+    model_fields = _model_fields(model)
+    level_only = {model._meta.pk.name, *required}
+    complete = True
+
+    for name, nodes in fields.items():
+        if name.startswith("__"):
+            continue
+        field = model_fields.get(name)
+        if field is None:
+            # Champ calculé par un resolver : on ne sait pas quelles colonnes il lit
+            complete = False
+            continue
+
+        if field.many_to_many or field.one_to_many:
+            # Relation multiple : requête séparée, elle-même optimisée
+            related_model = field.related_model
+            child_required = ()
+            if field.one_to_many:
+                child_required = (field.field.name,)
+            queryset = _optimize(
+                related_model._default_manager.all(),
+                _node_fields(nodes, fragments),
+                fragments,
+                variables,
+                required=child_required,
+            )
+            limit = _prefetch_limit(nodes, fragments, variables)
+            if limit is None:
+                prefetches.append(Prefetch(prefix + name, queryset=queryset))
+            else:
+                if not queryset.ordered:
+                    queryset = queryset.order_by(related_model._meta.pk.name)
+                # Prefetch découpé : Django exige to_attr (liste, pas de cache du manager)
+                prefetches.append(Prefetch(prefix + name, queryset=queryset[:limit], to_attr=PAGE_ATTR + name))
+        elif field.is_relation:
+            # FK / OneToOne : jointure
+            level_only.add(field.name)
+            if field.concrete:
+                select_related.append(prefix + name)
+                _plan(
+                    field.related_model,
+                    _node_fields(nodes, fragments),
+                    fragments,
+                    variables,
+                    prefix + name + "__",
+                    only,
+                    select_related,
+                    prefetches,
+                )
+            else:
+                complete = False
+        else:
+            level_only.add(field.name)
+
+    if not complete:
+        level_only.update(f.name for f in model._meta.concrete_fields)
+    only.extend(prefix + name for name in sorted(level_only))
+
+
+def _optimize(queryset, fields, fragments, variables, required=()):
+    only, select_related, prefetches = [], [], []
+    _plan(queryset.model, fields, fragments, variables, "", only, select_related, prefetches, required)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset.only(*only)
+
+
+def optimize_queryset(queryset, info):
+    """
+    Applique au queryset les jointures, prefetch et restrictions de colonnes
+    correspondant aux champs demandés par la requête GraphQL.
+    """
+    fields = _node_fields(info.field_nodes, info.fragments)
+    if not fields:
+        return queryset
+    return _optimize(queryset, fields, info.fragments, info.variable_values)
+
+
+def get_prefetched(instance, name):
+    """Retourne la relation préchargée par optimize_queryset, ou None."""
+    page = getattr(instance, PAGE_ATTR + name, None)
+    if page is not None:
+        return page
+    cache = getattr(instance, "_prefetched_objects_cache", {})
+    if name in cache:
+        return list(cache[name])
+    return None
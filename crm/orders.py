@@ -0,0 +1,159 @@
+# crm/orders.py
+"""
+Création de commandes en nombre constant de requêtes, partagée par les
+mutations createOrder et createOrders.
+"""
+from collections import Counter, namedtuple
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from . import customer_stats, rollup
+from .models import Customer, Product, Order, OrderItem
+from .response_cache import response_cache
+from .sqlite import write_atomic
+
+# Taille des lots pour les INSERT groupés
+BULK_BATCH_SIZE = 500
+# Produits par UPDATE de réservation : le coût d'un CASE croît avec le carré
+# de son nombre de branches (compilation et évaluation ligne par ligne)
+RESERVE_CHUNK_SIZE = 250
+
+# Commande à créer : client, produits et quantités (une quantité par produit)
+OrderSpec = namedtuple("OrderSpec", ["customer_id", "product_ids", "quantities"])
+
+
+def build_order(customer, products_by_id, spec):
+    """
+    Construit la commande et ses lignes en mémoire, sans requête.
+    Lève ValidationError si la commande est invalide.
+    """
+    if customer is None:
+        raise ValidationError("Client introuvable")
+    if not spec.product_ids:
+        raise ValidationError("La commande doit contenir au moins un produit")
+    if any(product_id not in products_by_id for product_id in spec.product_ids):
+        raise ValidationError("Un ou plusieurs produits n'existent pas")
+
+    quantities = spec.quantities or []
+    order = Order(customer=customer, status='pending')
+    items = []
+    total_amount = Decimal("0")
+    for i, product_id in enumerate(spec.product_ids):
+        product = products_by_id[product_id]
+        quantity = quantities[i] if i < len(quantities) else 1
+        if quantity is None or quantity < 1:
+            raise ValidationError(f"Quantité invalide pour le produit {product_id}")
+
+        items.append(OrderItem(order=order, product=product, quantity=quantity, unit_price=product.price))
+        total_amount += product.price * quantity
+
+    order.total_amount = total_amount
+    return order, items
+
+
+def required_stock(items):
+    """Quantités à réserver par produit pour une liste de lignes."""
+    quantities = Counter()
+    for item in items:
+        quantities[item.product_id] += item.quantity
+    return quantities
+
+
+def reserve_stock(quantities, chunk_size=RESERVE_CHUNK_SIZE):
+    """
+    Décrémente le stock de plusieurs produits par UPDATE conditionnels, un
+    par paquet de `chunk_size` produits :
+
+        UPDATE crm_product
+           SET stock_quantity = stock_quantity - CASE id WHEN ... END
+         WHERE id IN (...) AND stock_quantity >= CASE id WHEN ... END
+
+    La condition est évaluée par la base au moment de l'écriture : pas de
+    verrou applicatif ni de mise à jour perdue entre requêtes concurrentes.
+    Retourne False (sans rien modifier) si un produit manque de stock ;
+    doit être appelé dans une transaction.
+    """
+    if not quantities:
+        return True
+    product_ids = list(quantities)
+    with transaction.atomic():
+        for start in range(0, len(product_ids), chunk_size):
+            chunk = product_ids[start:start + chunk_size]
+            needed = Case(
+                *[When(pk=product_id, then=Value(quantities[product_id])) for product_id in chunk],
+                output_field=IntegerField(),
+            )
+            updated = Product.objects.filter(pk__in=chunk, stock_quantity__gte=needed).update(
+                stock_quantity=F('stock_quantity') - needed
+            )
+            if updated != len(chunk):
+                # Annule les décréments partiels (paquets précédents compris) via le savepoint
+                transaction.set_rollback(True)
+                return False
+    return True
+
+
+def insufficient_stock_error(quantities):
+    short = Product.objects.filter(pk__in=list(quantities)).values_list('pk', 'name', 'stock_quantity')
+    names = [name for pk, name, stock in short if stock < quantities[pk]]
+    return f"Stock insuffisant pour : {', '.join(names)}"
+
+
+def create_orders(specs):
+    """
+    Crée un lot de commandes dans une seule transaction.
+
+    Retourne une liste alignée sur `specs` de couples (order, error) :
+    les commandes invalides ou en rupture de stock sont ignorées et leur
+    erreur rapportée, les autres sont créées et leur stock réservé.
+    """
+    specs = list(specs)
+    customers = Customer.objects.in_bulk({spec.customer_id for spec in specs})
+    products = Product.objects.in_bulk(
+        {product_id for spec in specs for product_id in spec.product_ids or []}
+    )
+
+    results = []
+    pending = []
+    for spec in specs:
+        try:
+            order, order_items = build_order(customers.get(spec.customer_id), products, spec)
+        except ValidationError as e:
+            results.append((None, "; ".join(e.messages)))
+            continue
+        pending.append((len(results), order, order_items))
+        results.append((order, None))
+
+    if not pending:
+        return results
+
+    with write_atomic():
+        # Cas courant : tout le lot est servi, une seule réservation suffit
+        if not reserve_stock(required_stock(item for _, _, items in pending for item in items)):
+            # Sinon, réservation commande par commande pour isoler les ruptures
+            reserved = []
+            for index, order, order_items in pending:
+                quantities = required_stock(order_items)
+                if reserve_stock(quantities):
+                    reserved.append((index, order, order_items))
+                else:
+                    results[index] = (None, insufficient_stock_error(quantities))
+            pending = reserved
+
+        orders = [order for _, order, _ in pending]
+        items = [item for _, _, order_items in pending for item in order_items]
+        Order.objects.bulk_create(orders, batch_size=BULK_BATCH_SIZE)
+        # Les lignes reprennent l'id des commandes qui vient d'être attribué
+        OrderItem.objects.bulk_create(items, batch_size=BULK_BATCH_SIZE)
+        # Agrégats des clients et ventes journalières, dans la même transaction
+        customer_stats.add_orders(orders)
+        rollup.add_orders(orders, items)
+        # bulk_create et update() n'émettent pas de signaux
+        response_cache.invalidate_on_commit(
+            Order._meta.label, OrderItem._meta.label, Product._meta.label
+        )
+
+    return results
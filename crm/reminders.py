@@ -0,0 +1,160 @@
+# crm/reminders.py
+"""
+Rappels des commandes récentes, traités de manière incrémentale
+(crm/cron_jobs/send_order_reminders.py) :
+
+- les commandes sont lues page par page avec recentOrders (pagination par
+  clé, (order_date, id) croissants) : un générateur, jamais tout le jour en
+  mémoire ;
+- les rappels d'une page sont envoyés par un pool de threads borné ;
+- après chaque page, la position de la dernière commande (curseur,
+  order_date, id) est enregistrée (crm/checkpoints.py) : l'exécution
+  suivante ne traite que les commandes arrivées depuis, et une exécution
+  interrompue ne renvoie au pire que la page en cours.
+
+order_date est fixée avant le commit de la transaction qui crée la commande :
+une commande validée après une commande plus récente déjà parcourue aurait sa
+place avant la position enregistrée. L'exécution suivante reprend donc
+OVERLAP_SECONDS avant cette position (durée maximale d'une transaction de
+création), et les commandes de ce recouvrement déjà traitées, dont les ids
+sont enregistrés avec la position, ne sont pas rappelées deux fois. Une
+commande validée plus de OVERLAP_SECONDS après sa date n'est jamais rappelée.
+
+Les commandes plus anciennes que la fenêtre HOURS ne sont jamais rappelées,
+même après une longue interruption.
+
+gql (via crm/transport.py) est importé à l'exécution, pas à l'import du module.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from . import checkpoints
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = "order_reminders"
+DEFAULT_ORDER_REMINDERS = {
+    "HOURS": 24,
+    "PAGE_SIZE": 100,
+    # Rappels envoyés en parallèle (au plus une page en cours)
+    "WORKERS": 4,
+    # Fonction (commande) -> None appelée pour chaque rappel
+    "SENDER": "crm.reminders.log_reminder",
+    # Recouvrement à la reprise : durée maximale entre order_date et le commit
+    "OVERLAP_SECONDS": 300,
+}
+
+RECENT_ORDERS_QUERY = """
+    query RecentOrders($hours: Int!, $first: Int!, $after: String) {
+        recentOrders(hours: $hours, first: $first, after: $after) {
+            pageInfo { hasNextPage endCursor }
+            edges {
+                cursor
+                node {
+                    id
+                    orderDate
+                    status
+                    totalAmount
+                    customer { id firstName lastName email }
+                    items { quantity unitPrice product { name } }
+                }
+            }
+        }
+    }
+"""
+
+
+def _config():
+    return {**DEFAULT_ORDER_REMINDERS, **getattr(settings, "CRM_ORDER_REMINDERS", {})}
+
+
+def iter_recent_order_pages(client, hours, page_size, after=None):
+    """Génère les pages (listes d'edges) de recentOrders à partir du curseur `after`."""
+    from .transport import document
+
+    while True:
+        result = client.execute(
+            document(RECENT_ORDERS_QUERY),
+            variable_values={"hours": hours, "first": page_size, "after": after},
+        )
+        connection = result["recentOrders"]
+        if connection["edges"]:
+            yield connection["edges"]
+        if not connection["pageInfo"]["hasNextPage"]:
+            return
+        after = connection["pageInfo"]["endCursor"]
+
+
+def log_reminder(order):
+    customer = order["customer"]
+    logger.info(
+        "Rappel commande %s - Client: %s %s <%s> - Total: %s € - Statut: %s",
+        order["id"], customer["firstName"], customer["lastName"], customer["email"],
+        order["totalAmount"], order["status"],
+    )
+
+
+def _send(send, order):
+    try:
+        send(order)
+        return True
+    except Exception:
+        logger.exception("Échec du rappel de la commande %s", order["id"])
+        return False
+
+
+def _resume_cursor(position, overlap):
+    """Curseur de reprise : OVERLAP_SECONDS avant la dernière commande traitée."""
+    from .fields import encode_cursor
+    from .models import Order
+
+    order_date = parse_datetime(position["order_date"]) - overlap
+    return encode_cursor(Order(pk=0, order_date=order_date), ("order_date", "id"))
+
+
+def send_order_reminders(client=None, hours=None, page_size=None, workers=None, send=None):
+    """
+    Envoie les rappels des commandes arrivées depuis la dernière exécution.
+    Retourne (rappels envoyés, échecs) ; un échec est journalisé et n'est
+    pas retenté.
+    """
+    config = _config()
+    hours = hours or config["HOURS"]
+    page_size = page_size or config["PAGE_SIZE"]
+    workers = workers or config["WORKERS"]
+    overlap = timedelta(seconds=config["OVERLAP_SECONDS"])
+    send = send or config["SENDER"]
+    if isinstance(send, str):
+        send = import_string(send)
+    if client is None:
+        from .transport import local_client
+
+        client = local_client()
+
+    position = checkpoints.load(CHECKPOINT)
+    after = _resume_cursor(position, overlap) if position else None
+    # Commandes du recouvrement déjà traitées : id -> orderDate
+    recent = dict(position.get("recent", {}))
+    sent = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for edges in iter_recent_order_pages(client, hours, page_size, after):
+            orders = [edge["node"] for edge in edges if edge["node"]["id"] not in recent]
+            for ok in pool.map(lambda order: _send(send, order), orders):
+                sent += ok
+                failed += not ok
+            last = edges[-1]
+            horizon = parse_datetime(last["node"]["orderDate"]) - overlap
+            recent.update((order["id"], order["orderDate"]) for order in orders)
+            recent = {id: date for id, date in recent.items() if parse_datetime(date) >= horizon}
+            checkpoints.save(CHECKPOINT, {
+                "cursor": last["cursor"],
+                "order_date": last["node"]["orderDate"],
+                "id": last["node"]["id"],
+                "recent": recent,
+            })
+    return sent, failed
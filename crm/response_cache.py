@@ -0,0 +1,206 @@
+# crm/response_cache.py
+"""
+Cache des réponses des opérations `query`, invalidé par étiquettes (tags).
+
+Clé d'une réponse : hash(requête normalisée, variables, opération, utilisateur,
+versions des étiquettes). Les étiquettes d'une requête sont les modèles Django
+qu'elle lit (crm.Order, crm.Product, ...), déduits des types GraphQL
+sélectionnés. Écrire un modèle incrémente la version de son étiquette : les
+réponses qui en dépendent ne sont plus jamais lues et expirent d'elles-mêmes
+(TTL et MAX_ENTRIES du cache Django dédié), sans toucher aux autres.
+
+Les versions des étiquettes vivent dans ce cache Django : il doit être partagé
+par tous les processus (fichiers ou Redis, voir settings.CACHES) pour qu'une
+écriture d'un worker Celery ou d'un job cron invalide les réponses servies par
+le web. Un cache locmem (tests) ne voit que les écritures de son propre processus.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphql import (
+    ExecutionResult,
+    TypeInfo,
+    TypeInfoVisitor,
+    Visitor,
+    get_named_type,
+    is_abstract_type,
+    print_ast,
+    visit,
+)
+
+TAG_PREFIX = "crm:response-cache:tag:"
+RESPONSE_PREFIX = "crm:response-cache:response:"
+# Modèles dont les écritures invalident le cache (voir crm/signals.py)
+TRACKED_MODELS = ("crm.Customer", "crm.Product", "crm.Order", "crm.OrderItem")
+
+DEFAULT_RESPONSE_CACHE = {
+    "ENABLED": True,
+    "ALIAS": "default",
+    "TIMEOUT": 60,
+}
+
+
+class _ModelCollector(Visitor):
+    """
+    Collecte les modèles Django derrière les types des champs sélectionnés,
+    et les étiquettes déclarées pour les champs calculés (register_field).
+    """
+
+    def __init__(self, type_info, field_tags=None):
+        super().__init__()
+        self.type_info = type_info
+        self.field_tags = field_tags or {}
+        self.labels = set()
+
+    def enter_field(self, node, *args):
+        parent_type = self.type_info.get_parent_type()
+        if parent_type is not None:
+            self.labels.update(self.field_tags.get((parent_type.name, node.name.value), ()))
+        field_type = self.type_info.get_type()
+        if field_type is None:
+            return
+        named_type = get_named_type(field_type)
+        if is_abstract_type(named_type):
+            # Interface Node, union... : peut lire n'importe quel modèle
+            self.labels.update(TRACKED_MODELS)
+            return
+        meta = getattr(getattr(named_type, "graphene_type", None), "_meta", None)
+        model = getattr(meta, "model", None)
+        if model is not None:
+            self.labels.add(model._meta.label)
+
+
+class ResponseCache:
+    def __init__(self, alias="default", timeout=60, enabled=True, plan_cache_size=256):
+        self.alias = alias
+        self.timeout = timeout
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+        self._plan_cache_size = plan_cache_size
+        self._lock = threading.Lock()
+        self.field_tags = {}
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def register_field(self, type_name, field_name, *labels):
+        """
+        Déclare les modèles lus par un champ sans type modèle (agrégats...),
+        ex. register_field("Query", "crmStats", "crm.Order", "crm.Customer").
+        """
+        self.field_tags.setdefault((type_name, field_name), set()).update(labels)
+
+    def plan(self, schema, query, document):
+        """(hash de la requête normalisée, étiquettes), mémorisé par texte de requête."""
+        query_key = hashlib.sha256(query.encode("utf-8")).hexdigest()
+        with self._lock:
+            plan = self._plans.get(query_key)
+            if plan is not None:
+                self._plans.move_to_end(query_key)
+                return plan
+
+        type_info = TypeInfo(schema)
+        collector = _ModelCollector(type_info, self.field_tags)
+        visit(document, TypeInfoVisitor(type_info, collector))
+        normalized = hashlib.sha256(print_ast(document).encode("utf-8")).hexdigest()
+        plan = (normalized, frozenset(collector.labels))
+
+        with self._lock:
+            self._plans[query_key] = plan
+            while len(self._plans) > self._plan_cache_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    def tag_versions(self, labels):
+        keys = [TAG_PREFIX + label for label in sorted(labels)]
+        versions = self.cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # Version initiale imprévisible : une étiquette évincée du cache
+                # ne doit pas réactiver d'anciennes réponses
+                self.cache.add(key, time.time_ns(), timeout=None)
+                versions[key] = self.cache.get(key)
+        return [versions[key] for key in keys]
+
+    @staticmethod
+    def user_key(request):
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+        return "anonymous"
+
+    def response_key(self, normalized, labels, variables, operation_name, user_key):
+        payload = json.dumps(
+            [normalized, variables or {}, operation_name, user_key, self.tag_versions(labels)],
+            sort_keys=True,
+            default=str,
+        )
+        return RESPONSE_PREFIX + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, request, schema, query, document, variables, operation_name):
+        """Retourne (clé, données en cache ou None)."""
+        normalized, labels = self.plan(schema, query, document)
+        key = self.response_key(normalized, labels, variables, operation_name, self.user_key(request))
+        data = self.cache.get(key)
+        with self._lock:
+            if data is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return key, data
+
+    def store(self, key, result):
+        if not result.errors and result.data is not None:
+            self.cache.set(key, result.data, timeout=self.timeout)
+        return result
+
+    def fetch(self, request, schema, query, document, variables, operation_name, execute):
+        """Retourne la réponse en cache, ou exécute `execute()` et met en cache son résultat."""
+        key, data = self.lookup(request, schema, query, document, variables, operation_name)
+        if data is not None:
+            return ExecutionResult(data=data)
+        return self.store(key, execute())
+
+    async def afetch(self, request, schema, query, document, variables, operation_name, aexecute):
+        """Comme fetch(), avec une exécution asynchrone `await aexecute()`."""
+        key, data = self.lookup(request, schema, query, document, variables, operation_name)
+        if data is not None:
+            return ExecutionResult(data=data)
+        return self.store(key, await aexecute())
+
+    def invalidate(self, *labels):
+        for label in labels:
+            key = TAG_PREFIX + label
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.add(key, time.time_ns(), timeout=None)
+
+    def invalidate_on_commit(self, *labels, using=None):
+        """
+        Invalide tout de suite (lectures dans la même transaction) et à nouveau
+        au commit (réponses mises en cache par d'autres requêtes entre-temps).
+        """
+        self.invalidate(*labels)
+        transaction.on_commit(lambda: self.invalidate(*labels), using=using)
+
+    def stats(self):
+        with self._lock:
+            return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses}
+
+
+def _build_response_cache():
+    config = {**DEFAULT_RESPONSE_CACHE, **getattr(settings, "GRAPHQL_RESPONSE_CACHE", {})}
+    return ResponseCache(alias=config["ALIAS"], timeout=config["TIMEOUT"], enabled=config["ENABLED"])
+
+
+response_cache = _build_response_cache()
@@ -0,0 +1,287 @@
+# crm/rollup.py
+"""
+Ventes agrégées par jour, lues par la requête revenueByPeriod à la place
+de Order / OrderItem :
+
+- DailyProductSales : jour × produit (commandes, quantité, montant des lignes) ;
+- DailyStatusSales : jour × statut (commandes, montant total).
+
+Le jour est la date locale (TIME_ZONE) de Order.order_date.
+
+- create_orders les incrémente dans sa transaction (add_orders) : un
+  INSERT et un UPDATE par paquet de INCREMENT_CHUNK_SIZE clés ;
+- les écritures unitaires sur Order / OrderItem (admin, shell, suppressions
+  en cascade...) recalculent les jours concernés une fois au commit de la
+  transaction (crm/signals.py), les suppressions directes (crm/cleanup.py)
+  aussitôt (refresh_days) ;
+- `manage.py rebuild_sales_rollup` recalcule tout, par tranches de jours.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import DailyProductSales, DailyStatusSales, Order, OrderItem
+from .response_cache import response_cache
+
+ROLLUP_TAGS = (DailyProductSales._meta.label, DailyStatusSales._meta.label)
+REBUILD_CHUNK_DAYS = 31
+GRANULARITIES = {"DAY": None, "WEEK": TruncWeek, "MONTH": TruncMonth}
+
+# Clés (jour, produit ou statut) par UPDATE incrémental : le coût d'un CASE
+# croît avec le carré de son nombre de branches
+INCREMENT_CHUNK_SIZE = 250
+
+_COUNT = IntegerField()
+_AMOUNT = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _invalidate(using=None):
+    # bulk_create et update() n'émettent pas de signaux
+    response_cache.invalidate_on_commit(*ROLLUP_TAGS, using=using)
+
+
+def _tz():
+    return timezone.get_default_timezone() if settings.USE_TZ else None
+
+
+def local_day(value):
+    """Jour de rattachement d'une date de commande."""
+    return timezone.localdate(value, _tz()) if settings.USE_TZ else value.date()
+
+
+def _day_start(day):
+    value = datetime.combine(day, time.min)
+    return timezone.make_aware(value, _tz()) if settings.USE_TZ else value
+
+
+def _day_range(start, stop, prefix=""):
+    # Jours [start, stop) en bornes datetime : reste indexable (crm_order_date_idx)
+    return Q(**{f"{prefix}order_date__gte": _day_start(start), f"{prefix}order_date__lt": _day_start(stop)})
+
+
+# Mise à jour incrémentale
+
+def _increment(model, keys, rows, using=None, chunk_size=INCREMENT_CHUNK_SIZE):
+    """
+    Ajoute `rows` ({clé: {champ: valeur}}) aux lignes de `model` : crée les
+    lignes manquantes à zéro (INSERT ... ON CONFLICT DO NOTHING), puis les
+    incrémente en un UPDATE par paquet de `chunk_size` clés :
+
+        UPDATE ... SET revenue = revenue + CASE WHEN day = ... AND ... THEN ... ELSE 0 END, ...
+         WHERE day IN (...) AND ... IN (...)
+
+    Sans lecture préalable ni mise à jour perdue entre transactions concurrentes.
+    """
+    if not rows:
+        return
+    manager = model.objects.using(using)
+    fields = next(iter(rows.values()))
+    # Clés triées : les paquets couvrent peu de jours, sur-ensembles serrés
+    ordered = sorted(rows)
+    for start in range(0, len(ordered), chunk_size):
+        chunk = ordered[start:start + chunk_size]
+        manager.bulk_create([model(**dict(zip(keys, key))) for key in chunk], ignore_conflicts=True)
+
+        conditions = [(Q(**dict(zip(keys, key))), rows[key]) for key in chunk]
+        changes = {}
+        for field in fields:
+            output_field = _AMOUNT if field == "revenue" else _COUNT
+            changes[field] = F(field) + Case(
+                *[When(condition, then=Value(values[field])) for condition, values in conditions],
+                default=Value(0),
+                output_field=output_field,
+            )
+        # Sur-ensemble des clés du paquet : les autres lignes reçoivent + 0
+        lookups = {f"{name}__in": {key[i] for key in chunk} for i, name in enumerate(keys)}
+        manager.filter(**lookups).update(**changes)
+
+
+def add_orders(orders, items, using=None):
+    """
+    Ajoute des commandes nouvellement créées (et leurs lignes, déjà
+    enregistrées) aux agrégats journaliers. À appeler dans la transaction
+    qui crée les commandes.
+    """
+    days = {}
+    by_status = defaultdict(lambda: {"order_count": 0, "revenue": Decimal("0")})
+    for order in orders:
+        day = days[order.pk] = local_day(order.order_date)
+        row = by_status[(day, order.status)]
+        row["order_count"] += 1
+        row["revenue"] += order.total_amount
+
+    order_ids = defaultdict(set)
+    by_product = defaultdict(lambda: {"quantity": 0, "revenue": Decimal("0")})
+    for item in items:
+        key = (days[item.order_id], item.product_id)
+        order_ids[key].add(item.order_id)
+        row = by_product[key]
+        row["quantity"] += item.quantity
+        row["revenue"] += item.unit_price * item.quantity
+    for key, row in by_product.items():
+        row["order_count"] = len(order_ids[key])
+
+    _increment(DailyStatusSales, ("day", "status"), by_status, using)
+    _increment(DailyProductSales, ("day", "product_id"), by_product, using)
+    _invalidate(using)
+
+
+# Recalcul à partir des commandes
+
+# Intervalles de jours par requête (profondeur des expressions SQL bornée)
+RANGES_PER_QUERY = 100
+
+
+def order_days(orders):
+    """Jours distincts d'un queryset de commandes, à recalculer avant de les supprimer."""
+    return set(
+        orders.annotate(day=TruncDate("order_date", tzinfo=_tz()))
+        .order_by()
+        .values_list("day", flat=True)
+        .distinct()
+    )
+
+
+def _ranges(days):
+    """Jours regroupés en intervalles contigus [début, fin)."""
+    ranges = []
+    for day in sorted(set(days)):
+        if ranges and ranges[-1][1] == day:
+            ranges[-1][1] = day + timedelta(days=1)
+        else:
+            ranges.append([day, day + timedelta(days=1)])
+    return ranges
+
+
+def _recompute(ranges, using=None):
+    """Remplace les agrégats des intervalles de jours [début, fin) donnés."""
+    orders_filter, items_filter, rollup_filter = Q(), Q(), Q()
+    for start, stop in ranges:
+        orders_filter |= _day_range(start, stop)
+        items_filter |= _day_range(start, stop, prefix="order__")
+        rollup_filter |= Q(day__gte=start, day__lt=stop)
+
+    tzinfo = _tz()
+    statuses = (
+        Order.objects.using(using)
+        .filter(orders_filter)
+        .annotate(day=TruncDate("order_date", tzinfo=tzinfo))
+        .order_by()
+        .values("day", "status")
+        .annotate(order_count=Count("pk"), revenue=Sum("total_amount", output_field=_AMOUNT))
+    )
+    products = (
+        OrderItem.objects.using(using)
+        .filter(items_filter)
+        .annotate(day=TruncDate("order__order_date", tzinfo=tzinfo))
+        .order_by()
+        .values("day", "product_id")
+        .annotate(
+            order_count=Count("order_id", distinct=True),
+            # Noms distincts des champs de OrderItem lus par l'autre agrégat
+            units=Sum("quantity"),
+            sales=Sum(F("quantity") * F("unit_price"), output_field=_AMOUNT),
+        )
+    )
+    DailyStatusSales.objects.using(using).filter(rollup_filter).delete()
+    DailyProductSales.objects.using(using).filter(rollup_filter).delete()
+    DailyStatusSales.objects.using(using).bulk_create([DailyStatusSales(**row) for row in statuses])
+    DailyProductSales.objects.using(using).bulk_create(
+        [
+            DailyProductSales(
+                day=row["day"], product_id=row["product_id"], order_count=row["order_count"],
+                quantity=row["units"], revenue=row["sales"],
+            )
+            for row in products
+        ],
+        batch_size=1000,
+    )
+    _invalidate(using)
+
+
+def refresh_days(days, using=None):
+    """Recalcule les agrégats des jours donnés à partir des commandes."""
+    ranges = _ranges(days)
+    if not ranges:
+        return 0
+    with transaction.atomic(using=using):
+        for start in range(0, len(ranges), RANGES_PER_QUERY):
+            _recompute(ranges[start:start + RANGES_PER_QUERY], using)
+    return len(ranges)
+
+
+def iter_rebuild(chunk_days=REBUILD_CHUNK_DAYS, using=None):
+    """
+    Recalcule tous les agrégats par tranches de `chunk_days` jours, une
+    transaction courte par tranche, de la première à la dernière commande.
+    Génère (dernier jour recalculé, commandes de la tranche) après chaque
+    tranche. Les agrégats hors de cette période sont supprimés d'abord.
+    """
+    bounds = Order.objects.using(using).order_by().aggregate(first=Min("order_date"), last=Max("order_date"))
+    with transaction.atomic(using=using):
+        if bounds["first"] is None:
+            DailyStatusSales.objects.using(using).all().delete()
+            DailyProductSales.objects.using(using).all().delete()
+            _invalidate(using)
+            return
+        first, last = local_day(bounds["first"]), local_day(bounds["last"])
+        outside = Q(day__lt=first) | Q(day__gt=last)
+        DailyStatusSales.objects.using(using).filter(outside).delete()
+        DailyProductSales.objects.using(using).filter(outside).delete()
+        _invalidate(using)
+
+    start = first
+    while start <= last:
+        stop = min(start + timedelta(days=chunk_days), last + timedelta(days=1))
+        with transaction.atomic(using=using):
+            _recompute([(start, stop)], using)
+        orders = DailyStatusSales.objects.using(using).filter(day__gte=start, day__lt=stop).aggregate(
+            n=Sum("order_count")
+        )["n"] or 0
+        yield stop - timedelta(days=1), orders
+        start = stop
+
+
+# Lecture
+
+def revenue_by_period(granularity="DAY", date_from=None, date_to=None, product_id=None, status=None):
+    """
+    Commandes et chiffre d'affaires par période (jour, semaine ISO commençant
+    le lundi, mois), lus dans les seuls agrégats journaliers : par produit
+    (montant des lignes) si product_id est donné, sinon par statut (montant
+    des commandes). Les périodes sans vente sont omises.
+    """
+    if product_id is not None:
+        rows = DailyProductSales.objects.filter(product_id=product_id)
+        quantity = Sum("quantity")
+    else:
+        rows = DailyStatusSales.objects.all()
+        if status:
+            rows = rows.filter(status=status)
+        quantity = Value(None, output_field=_COUNT)
+    if date_from is not None:
+        rows = rows.filter(day__gte=date_from)
+    if date_to is not None:
+        rows = rows.filter(day__lte=date_to)
+
+    trunc = GRANULARITIES[granularity]
+    period = F("day") if trunc is None else trunc("day")
+    return [
+        {
+            "period": row["period"],
+            "order_count": row["order_count"],
+            "quantity": row["quantity"],
+            "revenue": (row["revenue"] or Decimal("0")).quantize(Decimal("0.01")),
+        }
+        for row in rows.annotate(period=period)
+        .order_by()
+        .values("period")
+        .annotate(order_count=Sum("order_count"), quantity=quantity, revenue=Sum("revenue"))
+        .order_by("period")
+    ]
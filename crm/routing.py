@@ -0,0 +1,223 @@
+# crm/routing.py
+"""
+Répartition des lectures sur des réplicas (DATABASE_ROUTERS).
+
+- les opérations GraphQL `query` (vues, transport local) et les exports
+  lisent sur un réplica choisi à tour de rôle ; un réplica injoignable est
+  écarté EJECT_SECONDS, et sans réplica disponible tout va au primaire ;
+- les mutations, et tout ce qu'elles lisent, passent par le primaire ;
+- toute écriture passe par le primaire et y épingle la suite de la requête
+  HTTP (lecture de ses propres écritures) ; primary_pinning_middleware prolonge
+  l'épinglage PIN_SECONDS par un cookie, le temps que la réplication rattrape.
+
+Hors opération GraphQL (admin, commandes, tâches Celery), tout va au primaire.
+Les réponses mises en cache (crm/response_cache.py) sont partagées quelle
+que soit la base lue : une réponse lue sur un réplica en retard peut être
+servie jusqu'à son TIMEOUT.
+
+    DATABASE_ROUTERS = ["crm.routing.ReplicaRouter"]
+    CRM_DATABASE_ROUTING = {"REPLICAS": ["replica"]}
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.utils.decorators import sync_and_async_middleware
+from graphql import OperationType
+
+DEFAULT_DATABASE_ROUTING = {
+    "PRIMARY": "default",
+    "REPLICAS": [],
+    # Durée d'éviction d'un réplica injoignable (secondes)
+    "EJECT_SECONDS": 30,
+    # Épinglage au primaire après une écriture (secondes, 0 : requête seule)
+    "PIN_SECONDS": 5,
+    "PIN_COOKIE": "crm_primary",
+}
+
+
+def _config():
+    return {**DEFAULT_DATABASE_ROUTING, **getattr(settings, "CRM_DATABASE_ROUTING", {})}
+
+
+class ReplicaPool:
+    """Réplicas utilisés à tour de rôle, sauf ceux écartés après un échec de connexion."""
+
+    def __init__(self, aliases, eject_seconds=30):
+        self.aliases = list(aliases)
+        self.eject_seconds = eject_seconds
+        self._ejected = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _candidates(self):
+        now = time.monotonic()
+        with self._lock:
+            start = self._next
+            self._next += 1
+            available = [alias for alias in self.aliases if self._ejected.get(alias, 0) <= now]
+        if not available:
+            return []
+        start %= len(available)
+        return available[start:] + available[:start]
+
+    def eject(self, alias):
+        with self._lock:
+            self._ejected[alias] = time.monotonic() + self.eject_seconds
+
+    def ejected(self):
+        now = time.monotonic()
+        with self._lock:
+            return sorted(alias for alias, until in self._ejected.items() if until > now)
+
+    @staticmethod
+    def is_healthy(alias):
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            return False
+        return True
+
+    def choose(self):
+        """Prochain réplica joignable, ou None (primaire)."""
+        for alias in self._candidates():
+            if self.is_healthy(alias):
+                return alias
+            self.eject(alias)
+        return None
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool():
+    config = _config()
+    key = (tuple(config["REPLICAS"]), config["EJECT_SECONDS"])
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ReplicaPool(*key)
+    return pool
+
+
+class RoutingState:
+    """Routage d'une requête HTTP (ou d'une opération hors requête)."""
+
+    __slots__ = ("read_alias", "pinned", "wrote")
+
+    def __init__(self, pinned=False):
+        self.read_alias = None
+        self.pinned = pinned
+        self.wrote = False
+
+    @property
+    def on_primary(self):
+        return self.pinned or self.wrote
+
+
+_state = ContextVar("crm_db_routing", default=None)
+
+
+@contextmanager
+def request_routing(pinned=False):
+    state = RoutingState(pinned)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def _current_state():
+    state = _state.get()
+    if state is not None:
+        yield state
+        return
+    with request_routing() as state:
+        yield state
+
+
+@contextmanager
+def read_replica():
+    """Lectures du bloc sur un réplica, sauf si la requête est épinglée au primaire."""
+    with _current_state() as state:
+        previous = state.read_alias
+        if not state.on_primary:
+            state.read_alias = get_pool().choose()
+        try:
+            yield state.read_alias
+        finally:
+            state.read_alias = previous
+
+
+@contextmanager
+def primary():
+    """Lectures et écritures du bloc, et de la suite de la requête, sur le primaire."""
+    with _current_state() as state:
+        state.pinned = True
+        yield
+
+
+def operation(operation_type):
+    """Routage d'une opération GraphQL : `query` sur un réplica, le reste au primaire."""
+    return read_replica() if operation_type == OperationType.QUERY else primary()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.on_primary:
+            return None
+        return state.read_alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return _config()["PRIMARY"]
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primaire et réplicas portent les mêmes données
+        config = _config()
+        aliases = {config["PRIMARY"], *config["REPLICAS"]}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+@sync_and_async_middleware
+def primary_pinning_middleware(get_response):
+    """
+    État de routage par requête ; une requête qui a écrit pose un cookie qui
+    épingle les requêtes suivantes du client au primaire PIN_SECONDS.
+    """
+
+    def pin(state, response):
+        config = _config()
+        if state.wrote and config["PIN_SECONDS"]:
+            response.set_cookie(
+                config["PIN_COOKIE"], "1", max_age=config["PIN_SECONDS"], httponly=True, samesite="Lax"
+            )
+        return response
+
+    def pinned(request):
+        return bool(request.COOKIES.get(_config()["PIN_COOKIE"]))
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with request_routing(pinned(request)) as state:
+                response = await get_response(request)
+            return pin(state, response)
+    else:
+        def middleware(request):
+            with request_routing(pinned(request)) as state:
+                response = get_response(request)
+            return pin(state, response)
+
+    return middleware
@@ -1,10 +1,20 @@
+from datetime import timedelta
+
 import graphene
-from django.db import transaction
 from graphene_django import DjangoObjectType
+from django.utils import timezone
 from django.core.exceptions import ValidationError
-from graphene_django.filter import DjangoFilterConnectionField
+from graphql import GraphQLError
+from .fields import BatchedConnectionField, CountableConnection, KeysetConnectionField
 from .filters import CustomerFilter, ProductFilter, OrderFilter
-from .models import Customer, Product, Order, OrderItem
+from .loaders import load
+from .orders import OrderSpec, create_orders
+from .optimizer import get_prefetched, optimize_queryset
+from .response_cache import response_cache
+from .rollup import ROLLUP_TAGS, revenue_by_period
+from .stats import STATS_TAGS, crm_stats
+from .stock import RESTOCK_CHUNK_SIZE, restock_chunk, restock_low_stock
+from .models import Customer, Job, Product, Order, OrderItem
 from crm.models import Product
 
 # Type pour le modèle Customer
@@ -12,18 +22,64 @@ class CustomerType(DjangoObjectType):
     class Meta:
         model = Customer
         fields = "__all__"  # Inclut tous les champs du modèle
+        interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
+
+    orders = BatchedConnectionField(lambda: OrderType, required=True)
+
+    # Commandes du client, chargées par lot
+    def resolve_orders(root, info, **kwargs):
+        prefetched = get_prefetched(root, "orders")
+        if prefetched is not None:
+            return prefetched
+        return load(info, "orders_by_customer_id", root.pk)
 
 # Type pour le modèle Product
 class ProductType(DjangoObjectType):
     class Meta:
         model = Product
         fields = "__all__"
+        interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
+
+    order_set = BatchedConnectionField(lambda: OrderType, required=True)
+
+    # Page préchargée par optimize_queryset, sinon le manager (résolveur par défaut)
+    def resolve_order_set(root, info, **kwargs):
+        prefetched = get_prefetched(root, "order_set")
+        if prefetched is not None:
+            return prefetched
+        return root.order_set
 
 # Type pour le modèle Order
 class OrderType(DjangoObjectType):
     class Meta:
         model = Order
         fields = "__all__"
+        interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
+
+    products = BatchedConnectionField(lambda: ProductType, required=True)
+
+    # Page préchargée par optimize_queryset, sinon le manager (résolveur par défaut)
+    def resolve_products(root, info, **kwargs):
+        prefetched = get_prefetched(root, "products")
+        if prefetched is not None:
+            return prefetched
+        return root.products
+
+    # Client de la commande, chargé par lot
+    def resolve_customer(root, info):
+        if Order.customer.is_cached(root):
+            return root.customer
+        return load(info, "customer_by_id", root.customer_id)
+
+    # Lignes de la commande, chargées par lot
+    def resolve_items(root, info):
+        prefetched = get_prefetched(root, "items")
+        if prefetched is not None:
+            return prefetched
+        return load(info, "items_by_order_id", root.pk)
 
 # Type pour le modèle OrderItem (optionnel mais utile)
 class OrderItemType(DjangoObjectType):
@@ -31,37 +87,174 @@ class OrderItemType(DjangoObjectType):
         model = OrderItem
         fields = "__all__"
 
+    # Commande de la ligne, chargée par lot
+    def resolve_order(root, info):
+        if OrderItem.order.is_cached(root):
+            return root.order
+        return load(info, "order_by_id", root.order_id)
+
+    # Produit de la ligne, chargé par lot
+    def resolve_product(root, info):
+        if OrderItem.product.is_cached(root):
+            return root.product
+        return load(info, "product_by_id", root.product_id)
+
+
+# Traitement de fond (crm/jobs.py), suivi avec jobStatus
+class JobType(DjangoObjectType):
+    class Meta:
+        model = Job
+        fields = "__all__"
+
+    progress = graphene.Float(description="Avancement, de 0 à 1 (tranches terminées)")
+
+
+# Indicateurs du CRM, calculés en une seule requête SQL (crm/stats.py)
+class CrmStatsType(graphene.ObjectType):
+    total_customers = graphene.Int(description="Clients (créés dans la période si elle est donnée)")
+    active_customers = graphene.Int(description="Clients ayant au moins une commande retenue")
+    total_orders = graphene.Int(description="Commandes de la période et du statut donnés")
+    total_revenue = graphene.Decimal(description="Montant total de ces commandes")
+
+
+class RevenueGranularity(graphene.Enum):
+    DAY = "DAY"
+    WEEK = "WEEK"
+    MONTH = "MONTH"
+
+
+# Ventes d'une période, lues dans les agrégats journaliers (crm/rollup.py)
+class RevenuePeriodType(graphene.ObjectType):
+    period = graphene.Date(description="Premier jour de la période (lundi pour WEEK)")
+    order_count = graphene.Int(description="Commandes de la période")
+    quantity = graphene.Int(description="Quantité vendue (avec productId seulement)")
+    revenue = graphene.Decimal(description="Montant des commandes, ou des lignes du produit")
+
+
+def get_crm_stats(info, date_from=None, date_to=None, status=None):
+    if status and status not in dict(Order.STATUS_CHOICES):
+        raise GraphQLError(f"Statut inconnu : {status}")
+    # Mémorisé par requête : crmStats et les champs total* partagent le calcul
+    memo = getattr(info.context, "crm_stats", None)
+    if memo is None:
+        memo = {}
+        if info.context is not None:
+            info.context.crm_stats = memo
+    key = (date_from, date_to, status)
+    if key not in memo:
+        memo[key] = crm_stats(date_from, date_to, status)
+    return memo[key]
+
 
 class Query(graphene.ObjectType):
+    # Indicateurs du CRM, en un aller-retour
+    crm_stats = graphene.Field(
+        CrmStatsType,
+        date_from=graphene.Date(name="from", description="Début de période (inclus)"),
+        date_to=graphene.Date(name="to", description="Fin de période (incluse)"),
+        status=graphene.String(description="Statut des commandes retenues"),
+    )
+
+    # Chiffre d'affaires par jour / semaine / mois, sans lire les commandes
+    revenue_by_period = graphene.List(
+        graphene.NonNull(RevenuePeriodType),
+        required=True,
+        granularity=RevenueGranularity(default_value=RevenueGranularity.DAY.value),
+        date_from=graphene.Date(name="from", description="Début de période (inclus)"),
+        date_to=graphene.Date(name="to", description="Fin de période (incluse)"),
+        product_id=graphene.Int(description="Ventes de ce produit seulement"),
+        status=graphene.String(description="Statut des commandes retenues (sans productId)"),
+    )
+
+    # Indicateurs globaux utilisés par le rapport hebdomadaire
+    total_customers = graphene.Int()
+    total_orders = graphene.Int()
+    total_revenue = graphene.Decimal()
+
+    # Avancement d'un traitement de fond (startRestock...)
+    job_status = graphene.Field(JobType, id=graphene.UUID(required=True))
+
     # Query pour récupérer tous les clients
-    all_customers = DjangoFilterConnectionField(
+    all_customers = KeysetConnectionField(
         CustomerType,
-        filterset_class=CustomerFilter
+        filterset_class=CustomerFilter,
+        sort_keys=("id",)
     )
 
     # Query pour récupérer tous les produits
-    all_products = DjangoFilterConnectionField(
+    all_products = KeysetConnectionField(
         ProductType,
-        filterset_class=ProductFilter
+        filterset_class=ProductFilter,
+        sort_keys=("id",)
     )
 
     # Query pour récupérer toutes les commandes
-    all_orders = DjangoFilterConnectionField(
+    # Les plus récentes d'abord, curseur (order_date, id)
+    all_orders = KeysetConnectionField(
+        OrderType,
+        filterset_class=OrderFilter,
+        sort_keys=("-order_date", "-id")
+    )
+
+    # Commandes des dernières heures, des plus anciennes aux plus récentes :
+    # le curseur (order_date, id) sert de point de reprise aux traitements
+    # incrémentaux (crm/reminders.py)
+    recent_orders = KeysetConnectionField(
         OrderType,
-        filterset_class=OrderFilter
+        filterset_class=OrderFilter,
+        sort_keys=("order_date", "id"),
+        hours=graphene.Int(default_value=24, description="Fenêtre, en heures avant maintenant"),
     )
 
     # Méthode pour résoudre la query des clients
-    def resolve_all_customers(root, info):
-        return Customer.objects.all()
+    def resolve_all_customers(root, info, **kwargs):
+        return optimize_queryset(Customer.objects.all(), info)
 
     # Méthode pour résoudre la query des produits
-    def resolve_all_products(root, info):
-        return Product.objects.all()
+    def resolve_all_products(root, info, **kwargs):
+        return optimize_queryset(Product.objects.all(), info)
 
     # Méthode pour résoudre la query des commandes
-    def resolve_all_orders(root, info):
-        return Order.objects.all()
+    def resolve_all_orders(root, info, **kwargs):
+        return optimize_queryset(Order.objects.all(), info)
+
+    def resolve_recent_orders(root, info, hours=24, **kwargs):
+        if hours <= 0:
+            raise GraphQLError("hours doit être positif")
+        since = timezone.now() - timedelta(hours=hours)
+        return optimize_queryset(Order.objects.filter(order_date__gte=since), info)
+
+    def resolve_job_status(root, info, id):
+        return Job.objects.filter(pk=id).first()
+
+    def resolve_crm_stats(root, info, date_from=None, date_to=None, status=None):
+        return CrmStatsType(**get_crm_stats(info, date_from, date_to, status))
+
+    def resolve_revenue_by_period(root, info, granularity="DAY", date_from=None, date_to=None,
+                                  product_id=None, status=None):
+        if status and status not in dict(Order.STATUS_CHOICES):
+            raise GraphQLError(f"Statut inconnu : {status}")
+        if status and product_id is not None:
+            raise GraphQLError("status et productId ne peuvent pas être combinés")
+        if date_from and date_to and date_from > date_to:
+            raise GraphQLError("from doit précéder to")
+        rows = revenue_by_period(granularity, date_from, date_to, product_id, status)
+        return [RevenuePeriodType(**row) for row in rows]
+
+    def resolve_total_customers(root, info):
+        return get_crm_stats(info)["total_customers"]
+
+    def resolve_total_orders(root, info):
+        return get_crm_stats(info)["total_orders"]
+
+    def resolve_total_revenue(root, info):
+        return get_crm_stats(info)["total_revenue"]
+
+
+# Les indicateurs n'ont pas de type modèle : étiquettes déclarées pour le cache de réponses
+for _field in ("crmStats", "totalCustomers", "totalOrders", "totalRevenue"):
+    response_cache.register_field("Query", _field, *STATS_TAGS)
+response_cache.register_field("Query", "revenueByPeriod", *ROLLUP_TAGS)
 
 
 # Mutation pour créer un client
@@ -142,61 +335,87 @@ class CreateOrder(graphene.Mutation):
     errors = graphene.String()
 
     def mutate(self, info, customer_id, product_ids, quantities):
-        try:
-            # Vérifier que le client existe
-            customer = Customer.objects.get(id=customer_id)
-
-            # Vérifier que les produits existent
-            products = Product.objects.filter(id__in=product_ids)
-            if len(products) != len(product_ids):
-                raise ValidationError("Un ou plusieurs produits n'existent pas")
-
-            # Créer la commande
-            order = Order(customer=customer, status='pending')
-            order.save()
-
-            # Ajouter les produits à la commande via OrderItem
-            total_amount = 0
-            for i, product_id in enumerate(product_ids):
-                product = products.get(id=product_id)
-                quantity = quantities[i] if i < len(quantities) else 1
-
-                order_item = OrderItem(
-                    order=order,
-                    product=product,
-                    quantity=quantity,
-                    unit_price=product.price
-                )
-                order_item.save()
-                total_amount += product.price * quantity
+        [(order, error)] = create_orders([OrderSpec(customer_id, product_ids, quantities)])
+        if error:
+            return CreateOrder(order=None, success=False, errors=error)
+        return CreateOrder(order=order, success=True, errors=None)
+
+
+# Entrée d'une commande pour la création en lot
+class OrderInput(graphene.InputObjectType):
+    customer_id = graphene.Int(required=True)
+    product_ids = graphene.List(graphene.Int, required=True)
+    quantities = graphene.List(graphene.Int, required=True)
+
+
+# Résultat de la création d'une commande du lot
+class OrderResult(graphene.ObjectType):
+    index = graphene.Int()
+    order = graphene.Field(OrderType)
+    success = graphene.Boolean()
+    errors = graphene.String()
 
-            # Mettre à jour le montant total
-            order.total_amount = total_amount
-            order.save()
 
-            return CreateOrder(order=order, success=True, errors=None)
+# Mutation pour créer des commandes en lot (imports)
+class CreateOrders(graphene.Mutation):
+    class Arguments:
+        orders = graphene.List(graphene.NonNull(OrderInput), required=True)
+
+    results = graphene.List(OrderResult)
+    created_count = graphene.Int()
+    success = graphene.Boolean()
 
-        except (Customer.DoesNotExist, ValidationError) as e:
-            return CreateOrder(order=None, success=False, errors=str(e))
+    def mutate(self, info, orders):
+        specs = [OrderSpec(o.customer_id, o.product_ids, o.quantities) for o in orders]
+        results = [
+            OrderResult(index=index, order=order, success=error is None, errors=error)
+            for index, (order, error) in enumerate(create_orders(specs))
+        ]
+        created_count = sum(1 for result in results if result.success)
+        return CreateOrders(
+            results=results,
+            created_count=created_count,
+            success=created_count == len(results)
+        )
 
 
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
         min_stock = graphene.Int(description="Seuil de stock minimum", default_value=10)
         increment_by = graphene.Int(description="Quantité à ajouter", default_value=50)
+        returning = graphene.Boolean(
+            description="Traite un seul lot et retourne les ids mis à jour", default_value=False
+        )
+        after_id = graphene.Int(description="Reprendre après cet id (mode returning)", default_value=0)
+        chunk_size = graphene.Int(description="Taille du lot (mode returning)", default_value=RESTOCK_CHUNK_SIZE)
 
     success = graphene.Boolean()
     message = graphene.String()
     updated_count = graphene.Int()
-
-    @transaction.atomic
-    def mutate(self, info, min_stock=10, increment_by=50):
+    updated_ids = graphene.List(graphene.Int)
+    last_id = graphene.Int()
+    has_more = graphene.Boolean()
+
+    def mutate(self, info, min_stock=10, increment_by=50, returning=False, after_id=0,
+               chunk_size=RESTOCK_CHUNK_SIZE):
+        if returning and (chunk_size is None or chunk_size < 1):
+            # Un lot vide avec hasMore=true ferait boucler le client indéfiniment
+            raise GraphQLError("chunkSize doit être au moins 1")
         try:
-            # Trouver les produits avec stock faible
-            low_stock_products = Product.objects.filter(stock_quantity__lt=min_stock)
+            if returning:
+                # Un lot par appel : le client relance avec afterId=lastId tant que hasMore
+                ids = restock_chunk(min_stock, increment_by, after_id, chunk_size)
+                return UpdateLowStockProducts(
+                    success=True,
+                    message=f"{len(ids)} produits avec stock faible mis à jour",
+                    updated_count=len(ids),
+                    updated_ids=ids,
+                    last_id=ids[-1] if ids else after_id,
+                    has_more=len(ids) == chunk_size
+                )
 
-            # Compter le nombre de produits à mettre à jour
-            count = low_stock_products.count()
+            # Une seule requête UPDATE, qui retourne le nombre de lignes modifiées
+            count = restock_low_stock(min_stock, increment_by)
 
             if count == 0:
                 return UpdateLowStockProducts(
@@ -205,15 +424,6 @@ class UpdateLowStockProducts(graphene.Mutation):
                     updated_count=0
                 )
 
-            # Mettre à jour le stock
-            updated_products = []
-            for product in low_stock_products:
-                product.stock_quantity += increment_by
-                updated_products.append(product)
-
-            # Sauvegarder en bulk pour plus d'efficacité
-            Product.objects.bulk_update(updated_products, ['stock_quantity'])
-
             return UpdateLowStockProducts(
                 success=True,
                 message=f"{count} produits avec stock faible mis à jour",
@@ -227,11 +437,52 @@ class UpdateLowStockProducts(graphene.Mutation):
                 updated_count=0
             )
 
+class StartRestock(graphene.Mutation):
+    """
+    Réapprovisionnement en tâche de fond : une tâche Celery par tranche d'ids
+    de produits (crm/tasks.py). Retourne aussitôt l'id du Job, à suivre avec
+    jobStatus.
+    """
+
+    class Arguments:
+        min_stock = graphene.Int(description="Seuil de stock minimum", default_value=10)
+        increment_by = graphene.Int(description="Quantité à ajouter", default_value=50)
+
+    success = graphene.Boolean()
+    message = graphene.String()
+    job_id = graphene.UUID()
+    job = graphene.Field(JobType)
+
+    def mutate(self, info, min_stock=10, increment_by=50):
+        # Import tardif : le processus web n'a pas besoin des tâches au démarrage
+        from .tasks import start_restock
+
+        try:
+            job = start_restock(min_stock, increment_by)
+        except Exception as e:
+            return StartRestock(success=False, message=f"Erreur lors du lancement: {str(e)}")
+        return StartRestock(
+            success=True,
+            message=f"Réapprovisionnement lancé en {job.shards_total} tranche(s)",
+            job_id=job.pk,
+            job=job,
+        )
+
 # Regroupe toutes les mutations
 class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
+    create_orders = CreateOrders.Field()
     update_low_stock_products = UpdateLowStockProducts.Field()
+    start_restock = StartRestock.Field()
+
+
+def __getattr__(name):
+    # Un seul schéma par processus : celui du projet (alx_backend_graphql.schema),
+    # construit à son import et partagé par les vues et le transport local
+    if name == "schema":
+        from alx_backend_graphql.schema import schema
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+        return schema
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,256 @@
+# crm/search.py
+"""
+Recherche textuelle pour les filtres de CustomerFilter / ProductFilter.
+
+Le backend dépend du moteur de base de données :
+- SQLite : tables virtuelles FTS5 (recherche par préfixe de mot, classement bm25),
+  tenues à jour par les signaux de crm/signals.py ;
+- PostgreSQL : index trigrammes (pg_trgm) pour les icontains, classement par similarité ;
+- autres : icontains classique, sans index dédié.
+
+On peut forcer un backend avec le setting CRM_SEARCH_BACKEND (chemin pointé).
+"""
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# Champs indexés par modèle
+SEARCH_FIELDS = {
+    'crm.Customer': ('first_name', 'last_name', 'email'),
+    'crm.Product': ('name', 'description'),
+}
+
+
+def _search_fields(model):
+    return SEARCH_FIELDS.get(model._meta.label, ())
+
+
+class DatabaseSearchBackend:
+    """Backend générique : icontains, sans classement."""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def setup(self, apps):
+        pass
+
+    def teardown(self, apps):
+        pass
+
+    def index(self, instance):
+        pass
+
+    def remove(self, instance):
+        pass
+
+    def index_many(self, model, pks):
+        pass
+
+    def remove_many(self, model, pks):
+        pass
+
+    def rebuild(self, model):
+        pass
+
+    def filter_field(self, queryset, field, value):
+        # Filtre sur un seul champ (ex. first_name)
+        if not value:
+            return queryset
+        return queryset.filter(**{f"{field}__icontains": value})
+
+    def search(self, queryset, value):
+        # Recherche classée sur tous les champs indexés du modèle
+        if not value:
+            return queryset
+        condition = Q()
+        for field in _search_fields(queryset.model):
+            condition |= Q(**{f"{field}__icontains": value})
+        return queryset.filter(condition)
+
+
+class SQLiteFTSBackend(DatabaseSearchBackend):
+    """
+    Une table FTS5 <table>_fts par modèle, dont le rowid est la clé primaire.
+    Les termes saisis sont cherchés comme préfixes de mots ("ada"*), ce qui
+    s'appuie sur l'index de préfixes de FTS5 au lieu d'un parcours de table.
+    """
+
+    TOKENIZE = "unicode61 remove_diacritics 2"
+    PREFIX = "2 3"
+
+    @staticmethod
+    def table_name(model):
+        return f"{model._meta.db_table}_fts"
+
+    @staticmethod
+    def match_expression(value, fields=None):
+        terms = re.findall(r"\w+", value)
+        if not terms:
+            return None
+        expression = " ".join(f'"{term}"*' for term in terms)
+        if fields:
+            return f"{{{' '.join(fields)}}} : ({expression})"
+        return expression
+
+    def _execute(self, sql, params=()):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def setup(self, apps):
+        for label, fields in SEARCH_FIELDS.items():
+            model = apps.get_model(label)
+            table = self.table_name(model)
+            columns = ", ".join(fields)
+            self._execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                f"{columns}, tokenize='{self.TOKENIZE}', prefix='{self.PREFIX}')"
+            )
+            self._populate(model, fields)
+
+    def teardown(self, apps):
+        for label in SEARCH_FIELDS:
+            self._execute(f"DROP TABLE IF EXISTS {self.table_name(apps.get_model(label))}")
+
+    def _populate(self, model, fields):
+        table = self.table_name(model)
+        columns = ", ".join(fields)
+        self._execute(f"DELETE FROM {table}")
+        self._execute(
+            f"INSERT INTO {table} (rowid, {columns}) "
+            f"SELECT {model._meta.pk.column}, {columns} FROM {model._meta.db_table}"
+        )
+
+    def index(self, instance):
+        fields = _search_fields(type(instance))
+        table = self.table_name(type(instance))
+        self._execute(f"DELETE FROM {table} WHERE rowid = %s", [instance.pk])
+        self._execute(
+            f"INSERT INTO {table} (rowid, {', '.join(fields)}) VALUES (%s{', %s' * len(fields)})",
+            [instance.pk, *[getattr(instance, field) for field in fields]],
+        )
+
+    def remove(self, instance):
+        self._execute(f"DELETE FROM {self.table_name(type(instance))} WHERE rowid = %s", [instance.pk])
+
+    def index_many(self, model, pks):
+        # Écritures en masse (crm/importer.py), qui n'émettent pas post_save
+        pks = list(pks)
+        if pks:
+            fields = _search_fields(model)
+            table = self.table_name(model)
+            columns = ", ".join(fields)
+            placeholders = ", ".join(["%s"] * len(pks))
+            self._execute(f"DELETE FROM {table} WHERE rowid IN ({placeholders})", pks)
+            self._execute(
+                f"INSERT INTO {table} (rowid, {columns}) "
+                f"SELECT {model._meta.pk.column}, {columns} FROM {model._meta.db_table} "
+                f"WHERE {model._meta.pk.column} IN ({placeholders})",
+                pks,
+            )
+
+    def remove_many(self, model, pks):
+        # Suppressions en masse (crm/cleanup.py), qui n'émettent pas post_delete
+        pks = list(pks)
+        if pks:
+            placeholders = ", ".join(["%s"] * len(pks))
+            self._execute(f"DELETE FROM {self.table_name(model)} WHERE rowid IN ({placeholders})", pks)
+
+    def rebuild(self, model):
+        self._populate(model, _search_fields(model))
+
+    def filter_field(self, queryset, field, value):
+        match = self.match_expression(value or "", [field])
+        if match is None:
+            return queryset
+        table = self.table_name(queryset.model)
+        return queryset.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", (match,))
+        )
+
+    def search(self, queryset, value):
+        match = self.match_expression(value or "")
+        if match is None:
+            return queryset
+        model = queryset.model
+        table = self.table_name(model)
+        return queryset.extra(
+            select={'search_rank': f"bm25({table})"},
+            tables=[table],
+            where=[
+                f'{table}.rowid = "{model._meta.db_table}"."{model._meta.pk.column}"',
+                f"{table} MATCH %s",
+            ],
+            params=[match],
+            order_by=['search_rank'],
+        )
+
+
+class TrigramSearchBackend(DatabaseSearchBackend):
+    """
+    PostgreSQL : les icontains sont servis par des index GIN gin_trgm_ops,
+    la recherche est classée par similarité de mots (pg_trgm).
+    """
+
+    SIMILARITY_THRESHOLD = 0.3
+
+    def _execute(self, sql):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute(sql)
+
+    def setup(self, apps):
+        self._execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for label, fields in SEARCH_FIELDS.items():
+            model = apps.get_model(label)
+            for field in fields:
+                column = model._meta.get_field(field).column
+                self._execute(
+                    f"CREATE INDEX IF NOT EXISTS {model._meta.db_table}_{column}_trgm "
+                    f"ON {model._meta.db_table} USING gin (UPPER({column}) gin_trgm_ops)"
+                )
+
+    def teardown(self, apps):
+        for label, fields in SEARCH_FIELDS.items():
+            model = apps.get_model(label)
+            for field in fields:
+                column = model._meta.get_field(field).column
+                self._execute(f"DROP INDEX IF EXISTS {model._meta.db_table}_{column}_trgm")
+
+    def search(self, queryset, value):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        from django.db.models.functions import Greatest
+
+        if not value:
+            return queryset
+        fields = _search_fields(queryset.model)
+        similarities = [TrigramWordSimilarity(value, field) for field in fields]
+        rank = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        return (
+            queryset.annotate(search_rank=rank)
+            .filter(search_rank__gte=self.SIMILARITY_THRESHOLD)
+            .order_by('-search_rank')
+        )
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': TrigramSearchBackend,
+}
+
+_backends = {}
+
+
+def get_search_backend(alias='default'):
+    """Backend de recherche de la base `alias` (instancié une seule fois)."""
+    if alias not in _backends:
+        backend_path = getattr(settings, 'CRM_SEARCH_BACKEND', None)
+        if backend_path:
+            backend_class = import_string(backend_path)
+        else:
+            vendor = connections[alias].vendor
+            backend_class = VENDOR_BACKENDS.get(vendor, DatabaseSearchBackend)
+        _backends[alias] = backend_class(alias)
+    return _backends[alias]
@@ -0,0 +1,119 @@
+# crm/signals.py
+import threading
+from functools import partial
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import customer_stats, rollup
+from .metrics import install_query_counter
+from .models import Customer, Product, Order, OrderItem
+from .response_cache import response_cache
+from .search import get_search_backend
+from .sqlite import configure_connection
+
+
+# Synchronisation de l'index de recherche avec les clients et produits
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+def index_for_search(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        get_search_backend(using).index(instance)
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+def remove_from_search(sender, instance, using, **kwargs):
+    get_search_backend(using).remove(instance)
+
+
+# Invalidation du cache des réponses GraphQL, par modèle écrit
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=OrderItem)
+def invalidate_responses(sender, using, **kwargs):
+    response_cache.invalidate_on_commit(sender._meta.label, using=using)
+
+
+class OnCommitRefresh:
+    """
+    Clés à recalculer, regroupées par transaction : les signaux d'une
+    suppression en cascade (Customer.delete(), queryset.delete()...) ajoutent
+    leurs clés au lot du thread, recalculé une seule fois au commit. Chaque
+    ajout inscrit un rappel on_commit, le premier vide le lot : un lot laissé
+    par une transaction annulée est recalculé (sans effet) au commit suivant.
+    Hors transaction, on_commit appelle le recalcul tout de suite.
+    """
+
+    def __init__(self, refresh):
+        self.refresh = refresh
+        self._local = threading.local()
+
+    def add(self, keys, using):
+        self._local.__dict__.setdefault(using, set()).update(keys)
+        transaction.on_commit(partial(self.flush, using), using=using)
+
+    def flush(self, using):
+        keys = self._local.__dict__.pop(using, None)
+        if keys:
+            with transaction.atomic(using=using):
+                self.refresh(keys, using=using)
+
+
+def _refresh_rollup(keys, using=None):
+    # Clés ("day", jour) des commandes écrites, ("order", pk) des lignes écrites
+    days = {value for kind, value in keys if kind == "day"}
+    order_ids = [value for kind, value in keys if kind == "order"]
+    if order_ids:
+        # Commandes supprimées depuis : leur jour est déjà dans le lot (post_delete)
+        dates = Order.objects.using(using).filter(pk__in=order_ids).values_list("order_date", flat=True)
+        days.update(rollup.local_day(order_date) for order_date in dates if order_date is not None)
+    rollup.refresh_days(days, using=using)
+
+
+customer_stats_refresh = OnCommitRefresh(customer_stats.refresh)
+sales_rollup_refresh = OnCommitRefresh(_refresh_rollup)
+
+
+# Agrégats des clients pour les écritures unitaires sur Order (create_orders
+# les met à jour lui-même, bulk_create n'émettant pas de signaux)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def refresh_customer_stats(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        customer_stats_refresh.add([instance.customer_id], using)
+
+
+# Ventes journalières pour les écritures unitaires sur Order / OrderItem :
+# recalcul du jour de la commande
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def refresh_sales_rollup(sender, instance, using, raw=False, **kwargs):
+    if not raw and instance.order_date is not None:
+        sales_rollup_refresh.add([("day", rollup.local_day(instance.order_date))], using)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_sales_rollup_for_item(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        sales_rollup_refresh.add([("order", instance.order_id)], using)
+
+
+# Comptage des requêtes SQL par résolveur GraphQL (crm/metrics.py)
+@receiver(connection_created)
+def count_graphql_queries(sender, connection, **kwargs):
+    install_query_counter(connection)
+
+
+# Pragmas du profil SQLite de production (crm/sqlite.py)
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    configure_connection(connection)
@@ -0,0 +1,99 @@
+# crm/sqlite.py
+"""
+Profil de production du backend SQLite, appliqué à chaque nouvelle
+connexion (signal connection_created, crm/signals.py) :
+
+- journal_mode=WAL, sur activation explicite seulement (JOURNAL_MODE, variable
+  d'environnement CRM_SQLITE_JOURNAL_MODE=WAL en production) : les lectures
+  ne bloquent plus l'écriture ni l'inverse. Le mode est enregistré dans le
+  fichier de la base et crée à côté les fichiers -wal et -shm ;
+- synchronous=NORMAL : en WAL, fsync aux checkpoints seulement (une coupure
+  de courant peut perdre les dernières transactions, jamais la cohérence) ;
+- mmap_size / cache_size : pages lues par mmap, cache de pages de 64 Mio.
+
+Complété dans les settings par OPTIONS["timeout"] : busy_timeout de la
+connexion (le module sqlite3 le règle), un rédacteur attend le verrou au
+lieu d'échouer sur « database is locked » ; et par CONN_MAX_AGE :
+connexions persistantes, pragmas appliqués une fois.
+
+Les transactions restent DEFERRED : un bloc atomic() qui ne fait que lire ne
+prend pas le verrou d'écriture et n'attend pas les rédacteurs. Les chemins
+d'écriture (create_orders, réapprovisionnement, mutations, imports, purge)
+passent par write_atomic(), qui prend ce verrou dès l'ouverture du bloc, au
+lieu d'échouer en cours de transaction en passant de lecture à écriture
+(SQLITE_BUSY que busy_timeout ne rattrape pas).
+
+Mesure : crm/benchmarks/sqlite_concurrency.py.
+"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+DEFAULT_SQLITE = {
+    "ENABLED": True,
+    # Ex. "WAL" ; None : mode du fichier inchangé
+    "JOURNAL_MODE": None,
+    "PRAGMAS": {
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        # Négatif : en Kio
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def _config():
+    config = {**DEFAULT_SQLITE, **getattr(settings, "CRM_SQLITE", {})}
+    config["PRAGMAS"] = {**DEFAULT_SQLITE["PRAGMAS"], **config["PRAGMAS"]}
+    return config
+
+
+def configure_connection(connection):
+    """Applique les pragmas à une connexion SQLite qui vient d'être ouverte."""
+    if connection.vendor != "sqlite":
+        return
+    config = _config()
+    if not config["ENABLED"]:
+        return
+    pragmas = dict(config["PRAGMAS"])
+    if config["JOURNAL_MODE"]:
+        pragmas = {"journal_mode": config["JOURNAL_MODE"], **pragmas}
+    # Connexion sqlite3 brute : ni journal des requêtes ni execute_wrappers
+    for name, value in pragmas.items():
+        if value is not None:
+            connection.connection.execute(f"PRAGMA {name} = {value}")
+
+
+def current_pragmas(connection, names=None):
+    """Valeurs effectives des pragmas, ex. pour vérifier le profil en production."""
+    names = names or list(_config()["PRAGMAS"])
+    with connection.cursor() as cursor:
+        values = {}
+        for name in names:
+            cursor.execute(f"PRAGMA {name}")
+            row = cursor.fetchone()
+            values[name] = row[0] if row else None
+    return values
+
+
+@contextmanager
+def write_atomic(using=None):
+    """
+    transaction.atomic() d'un chemin d'écriture : sur SQLite, le verrou
+    d'écriture est pris dès l'entrée du bloc (comme BEGIN IMMEDIATE) par une
+    écriture qui ne touche aucune ligne, en attendant au besoin busy_timeout.
+    Bloc imbriqué : la transaction englobante décide, rien n'est ajouté.
+    """
+    using = using or DEFAULT_DB_ALIAS
+    connection = connections[using]
+    outermost = not connection.in_atomic_block
+    with transaction.atomic(using=using):
+        if outermost and connection.vendor == "sqlite" and _config()["ENABLED"]:
+            from .models import JobCheckpoint
+
+            table = connection.ops.quote_name(JobCheckpoint._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {table} WHERE 0")
+        yield
@@ -0,0 +1,109 @@
+# crm/stats.py
+"""
+Indicateurs du CRM (rapport hebdomadaire, tableaux de bord) calculés en une
+seule requête SQL :
+
+    SELECT COUNT(o.id), SUM(o.total_amount), COUNT(DISTINCT o.customer_id),
+           (SELECT COUNT(*) FROM crm_customer WHERE ...)
+      FROM crm_order o WHERE ...
+
+Le résultat est gardé TIMEOUT secondes (30 par défaut) dans le cache Django ;
+la clé inclut les versions des étiquettes crm.Order / crm.Customer du cache
+de réponses, si bien qu'une écriture signalée (signaux, invalidate_on_commit)
+le périme immédiatement, y compris depuis un worker Celery ou un job cron :
+les versions vivent dans le cache partagé (Redis, voir settings.CACHES). Une
+écriture qui contourne l'invalidation (SQL brut, autre application) reste
+invisible au plus TIMEOUT secondes.
+"""
+import hashlib
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, IntegerField, Subquery, Sum, Value
+from django.utils import timezone
+
+from .models import Customer, Order
+from .response_cache import response_cache
+
+STATS_CACHE_PREFIX = "crm:stats:"
+DEFAULT_STATS_CACHE = {
+    "ALIAS": "default",
+    "TIMEOUT": 30,
+}
+STATS_TAGS = (Customer._meta.label, Order._meta.label)
+
+
+class _ScalarSubquery(Subquery):
+    # Sous-requête scalaire, indépendante des lignes : admise dans aggregate()
+    contains_aggregate = True
+
+
+def _day_start(day):
+    value = datetime.combine(day, time.min)
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def _period_filter(field, date_from=None, date_to=None):
+    # Plage de dates inclusive, en bornes datetime pour rester indexable
+    lookups = {}
+    if date_from is not None:
+        lookups[f"{field}__gte"] = _day_start(date_from)
+    if date_to is not None:
+        lookups[f"{field}__lt"] = _day_start(date_to + timedelta(days=1))
+    return lookups
+
+
+def compute_stats(date_from=None, date_to=None, status=None):
+    """
+    totalCustomers : clients (créés dans la période si elle est donnée) ;
+    activeCustomers : clients ayant au moins une commande retenue ;
+    totalOrders / totalRevenue : commandes de la période et du statut donnés.
+    """
+    orders = Order.objects.filter(**_period_filter("order_date", date_from, date_to))
+    if status:
+        orders = orders.filter(status=status)
+    customers = (
+        Customer.objects.filter(**_period_filter("created_at", date_from, date_to))
+        .order_by()
+        .annotate(group=Value(1))
+        .values("group")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    row = orders.order_by().aggregate(
+        total_orders=Count("pk"),
+        total_revenue=Sum("total_amount"),
+        active_customers=Count("customer", distinct=True),
+        total_customers=_ScalarSubquery(customers, output_field=IntegerField()),
+    )
+    return {
+        "total_customers": row["total_customers"] or 0,
+        "active_customers": row["active_customers"],
+        "total_orders": row["total_orders"],
+        "total_revenue": (row["total_revenue"] or Decimal("0")).quantize(Decimal("0.01")),
+    }
+
+
+def _config():
+    return {**DEFAULT_STATS_CACHE, **getattr(settings, "CRM_STATS_CACHE", {})}
+
+
+def crm_stats(date_from=None, date_to=None, status=None):
+    """compute_stats() avec cache court, invalidé par les écritures."""
+    config = _config()
+    if not config["TIMEOUT"]:
+        return compute_stats(date_from, date_to, status)
+
+    cache = caches[config["ALIAS"]]
+    payload = json.dumps(
+        [str(date_from), str(date_to), status, response_cache.tag_versions(STATS_TAGS)], default=str
+    )
+    key = STATS_CACHE_PREFIX + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats(date_from, date_to, status)
+        cache.set(key, stats, timeout=config["TIMEOUT"])
+    return stats
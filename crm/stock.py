@@ -0,0 +1,61 @@
+# crm/stock.py
+"""
+Réapprovisionnement des produits à stock faible.
+"""
+from django.db.models import F
+
+from .models import Product
+from .response_cache import response_cache
+from .sqlite import write_atomic
+
+# Nombre de produits traités par lot en mode « returning »
+RESTOCK_CHUNK_SIZE = 1000
+
+
+def restock_low_stock(min_stock, increment_by, queryset=None):
+    """
+    Réapprovisionne en un seul UPDATE tous les produits sous le seuil :
+
+        UPDATE crm_product SET stock_quantity = stock_quantity + n WHERE stock_quantity < s
+
+    Retourne le nombre de produits mis à jour.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    updated = queryset.filter(stock_quantity__lt=min_stock).update(
+        stock_quantity=F('stock_quantity') + increment_by
+    )
+    if updated:
+        # update() n'émet pas de signaux
+        response_cache.invalidate_on_commit(Product._meta.label, using=queryset.db)
+    return updated
+
+
+def restock_chunk(min_stock, increment_by, after_id=0, chunk_size=RESTOCK_CHUNK_SIZE, before_id=None):
+    """
+    Réapprovisionne le prochain lot d'au plus `chunk_size` produits d'id > after_id
+    (et < before_id si donné) et retourne la liste de leurs ids (triés).
+    Mémoire et durée bornées par lot.
+    """
+    products = Product.objects.filter(pk__gt=after_id, stock_quantity__lt=min_stock)
+    if before_id is not None:
+        products = products.filter(pk__lt=before_id)
+    with write_atomic():
+        ids = list(
+            products
+            .order_by('pk')
+            .values_list('pk', flat=True)[:chunk_size]
+        )
+        if ids:
+            restock_low_stock(min_stock, increment_by, Product.objects.filter(pk__in=ids))
+    return ids
+
+
+def iter_restock_chunks(min_stock, increment_by, after_id=0, chunk_size=RESTOCK_CHUNK_SIZE, before_id=None):
+    """Générateur des ids réapprovisionnés, lot par lot, jusqu'à épuisement."""
+    while True:
+        ids = restock_chunk(min_stock, increment_by, after_id, chunk_size, before_id)
+        if not ids:
+            return
+        yield ids
+        after_id = ids[-1]
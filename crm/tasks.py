@@ -1,54 +1,126 @@
 # crm/tasks.py
-import os
+"""
+Tâches Celery, importées au démarrage du worker (autodiscover_tasks) : gql
+et le transport local ne sont importés qu'à l'exécution des tâches qui s'en
+servent, et la journalisation du rapport n'est configurée qu'à son premier
+appel (pas de logging.basicConfig à l'import, qui prendrait la main sur la
+configuration du worker). Mesure : crm/benchmarks/import_time.py.
+"""
 import logging
-from datetime import datetime
-import requests
-from celery import shared_task
-from gql import Client, gql
-from gql.transport.aiohttp import AIOHTTPTransport
+from decimal import Decimal
+
+from celery import chord, group, shared_task
+from django.db import transaction
+
+from . import jobs
+from .models import Product
+from .stock import RESTOCK_CHUNK_SIZE, iter_restock_chunks
+
+REPORT_LOG_FILE = '/tmp/crm_report_log.txt'
+
+CRM_REPORT_QUERY = """
+    query CrmReport {
+        crmStats {
+            totalCustomers
+            totalOrders
+            totalRevenue
+        }
+    }
+"""
+
+
+def report_logger():
+    """Logger du rapport CRM, écrivant dans REPORT_LOG_FILE (configuré une fois)."""
+    logger = logging.getLogger('crm.report')
+    if not logger.handlers:
+        handler = logging.FileHandler(REPORT_LOG_FILE)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    return logger
 
-# Configuration du logger pour écrire dans un fichier
-logging.basicConfig(filename='/tmp/crm_report_log.txt', level=logging.INFO,
-                    format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
 @shared_task
 def generate_crm_report():
     """
     Génère un rapport CRM hebdomadaire en utilisant une requête GraphQL.
     """
+    from .transport import document, local_client
+
+    logger = report_logger()
     try:
-        # Configuration du transport GraphQL
-        transport = AIOHTTPTransport(url="http://localhost:8000/graphql")
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-
-        # Requête GraphQL pour récupérer les données du rapport
-        query = gql("""
-            query CrmReport {
-                totalCustomers
-                totalOrders
-                totalRevenue
-            }
-        """)
-
-        # Exécution de la requête
-        result = client.execute(query)
+        # Exécution dans le worker, sur le schéma local (ni HTTP ni introspection)
+        client = local_client()
+
+        # Requête GraphQL pour récupérer les données du rapport (analysée une fois)
+        result = client.execute(document(CRM_REPORT_QUERY))
 
         # Extraction des données
-        customers = result.get('totalCustomers', 0)
-        orders = result.get('totalOrders', 0)
-        revenue = result.get('totalRevenue', 0.0)
+        stats = result.get('crmStats') or {}
+        customers = stats.get('totalCustomers', 0)
+        orders = stats.get('totalOrders', 0)
+        # Decimal sérialisé en chaîne par GraphQL
+        revenue = Decimal(stats.get('totalRevenue') or 0)
 
         # Création du message de rapport
         report_message = (f"Report: {customers} customers, {orders} orders, "
                           f"{revenue:.2f} revenue.")
 
         # Enregistrement dans le fichier de log
-        logging.info(report_message)
+        logger.info(report_message)
         print(report_message) # Pour le log du worker
 
     except Exception as e:
         # Log en cas d'erreur
-        logging.error(f"Error generating CRM report: {e}")
+        logger.error(f"Error generating CRM report: {e}")
         print(f"Error: {e}")
 
-    return "CRM report generated."
\ No newline at end of file
+    return "CRM report generated."
+
+
+@shared_task
+def restock_shard(job_id, min_stock, increment_by, start, stop, chunk_size=RESTOCK_CHUNK_SIZE):
+    """
+    Réapprovisionne les produits à stock faible d'ids dans [start, stop),
+    par lots (une transaction courte chacun). Retourne le nombre de produits
+    mis à jour.
+    """
+    updated = 0
+    try:
+        for ids in iter_restock_chunks(min_stock, increment_by, start - 1, chunk_size, before_id=stop):
+            updated += len(ids)
+            jobs.add_progress(job_id, processed=len(ids))
+    except Exception as e:
+        jobs.fail_job(job_id, f"Tranche [{start}, {stop}) : {e}")
+        raise
+    jobs.add_progress(job_id, shards_done=1)
+    return updated
+
+
+@shared_task
+def finish_restock(counts, job_id):
+    """Callback du chord : agrège les résultats des tranches."""
+    updated = sum(counts)
+    jobs.finish_job(job_id, {"updatedCount": updated})
+    return updated
+
+
+def start_restock(min_stock=10, increment_by=50, shard_size=None):
+    """
+    Crée un Job de réapprovisionnement et lance une tâche par tranche d'ids
+    (chord : finish_restock une fois toutes les tranches terminées).
+    Les tâches partent au commit, une fois le Job visible des workers.
+    """
+    shards = jobs.id_shards(Product.objects.filter(stock_quantity__lt=min_stock), shard_size)
+    job = jobs.create_job(
+        "restock", {"minStock": min_stock, "incrementBy": increment_by}, shards_total=len(shards)
+    )
+    job_id = str(job.pk)
+    if not shards:
+        jobs.finish_job(job_id, {"updatedCount": 0})
+        job.refresh_from_db()
+        return job
+
+    header = group(restock_shard.s(job_id, min_stock, increment_by, start, stop) for start, stop in shards)
+    transaction.on_commit(lambda: chord(header)(finish_restock.s(job_id)))
+    return job
@@ -1,3 +1,1772 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models.signals import post_delete, pre_delete
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from gql import gql
+from graphene_django.utils.testing import GraphQLTestCase
+from graphql import GraphQLError
+
+from . import checkpoints, cleanup, customer_stats, rollup, routing
+from .cleanup import CHECKPOINT as CLEANUP_CHECKPOINT, iter_cleanup
+from .cron import update_low_stock
+from . import jobs, tasks
+from .documents import PersistedQueryNotFound, PersistedQueryRegistry, document_cache, query_hash
+from .importer import iter_csv, iter_import
+from .loaders import DataLoader
+from .metrics import metrics
+from .models import Customer, DailyProductSales, DailyStatusSales, Job, JobCheckpoint, Product, Order, OrderItem
+from .orders import OrderSpec, create_orders, reserve_stock
+from .reminders import CHECKPOINT, send_order_reminders
+from .response_cache import ResponseCache, response_cache
+from .search import get_search_backend
+from .sqlite import current_pragmas, write_atomic
+from .tasks import generate_crm_report
+from .transport import document, local_client
+
+
+def seed_orders(count, items_per_order=3):
+    products = [
+        Product.objects.create(name=f"Produit {i}", price=Decimal("10.00"), stock_quantity=100)
+        for i in range(items_per_order)
+    ]
+    start = Customer.objects.count()
+    # Agrégats recalculés par les signaux au commit (transaction du TestCase)
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        for i in range(start, start + count):
+            customer = Customer.objects.create(
+                first_name="Client", last_name=str(i), email=f"client{i}@example.com"
+            )
+            order = Order.objects.create(customer=customer, total_amount=Decimal("30.00"))
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=product.price)
+
+
+def eager_celery(test):
+    """
+    Exécute les tâches Celery dans le processus de test, le temps du test.
+    Les chords ont besoin d'un backend de résultats : en mémoire pour les
+    tests (instancié une fois par processus).
+    """
+    override = override_settings(
+        CELERY_TASK_ALWAYS_EAGER=True,
+        CELERY_TASK_EAGER_PROPAGATES=True,
+        CELERY_RESULT_BACKEND="cache+memory://",
+    )
+    override.enable()
+    test.addCleanup(override.disable)
+
+
+class CrmGraphQLTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql"
+
+    def setUp(self):
+        # Les caches survivent au rollback de la base entre deux tests
+        caches[response_cache.alias].clear()
+        super().setUp()
+
+
+class OrderBatchingTests(CrmGraphQLTestCase):
+    ORDERS_QUERY = """
+        query {
+            allOrders {
+                edges {
+                    node {
+                        customer { email }
+                        items { quantity product { name } }
+                    }
+                }
+            }
+        }
+    """
+
+    def count_queries(self, query):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.query(query)
+        self.assertResponseNoErrors(response)
+        return len(ctx.captured_queries), response.json()["data"]
+
+    def test_query_count_is_constant_in_page_size(self):
+        seed_orders(2)
+        small, data = self.count_queries(self.ORDERS_QUERY)
+        self.assertEqual(len(data["allOrders"]["edges"]), 2)
+
+        seed_orders(20)
+        large, data = self.count_queries(self.ORDERS_QUERY)
+        self.assertEqual(len(data["allOrders"]["edges"]), 22)
+        self.assertEqual(small, large)
+
+    def test_customer_orders_are_batched(self):
+        seed_orders(2)
+        query = """
+            query {
+                allCustomers {
+                    edges { node { email orders { edges { node { totalAmount } } } } }
+                }
+            }
+        """
+        small, _ = self.count_queries(query)
+        seed_orders(10)
+        large, data = self.count_queries(query)
+        self.assertEqual(small, large)
+        for edge in data["allCustomers"]["edges"]:
+            self.assertEqual(len(edge["node"]["orders"]["edges"]), 1)
+
+
+class QueryOptimizerTests(CrmGraphQLTestCase):
+    def capture(self, query):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.query(query)
+        self.assertResponseNoErrors(response)
+        return [q["sql"] for q in ctx.captured_queries]
+
+    def test_unselected_columns_are_deferred(self):
+        seed_orders(1)
+        queries = self.capture("query { allProducts { edges { node { name price } } } }")
+        select = [sql for sql in queries if "LIMIT" in sql][0]
+        self.assertIn('"crm_product"."name"', select)
+        self.assertNotIn('"crm_product"."description"', select)
+
+    def test_relations_are_joined_and_prefetched(self):
+        seed_orders(5)
+        queries = self.capture("""
+            query {
+                allOrders {
+                    edges { node { customer { email } items { product { name } } } }
+                }
+            }
+        """)
+        # Page des commandes (JOIN client), lignes (JOIN produit)
+        self.assertEqual(len(queries), 2)
+        self.assertIn("JOIN", queries[0])
+        self.assertNotIn('"crm_customer"."address"', queries[0])
+        self.assertIn('"crm_orderitem"', queries[1])
+
+    def test_nested_connection_is_prefetched(self):
+        seed_orders(3)
+        queries = self.capture("""
+            query {
+                allCustomers {
+                    edges { node { email orders { edges { node { totalAmount } } } } }
+                }
+            }
+        """)
+        self.assertEqual(len(queries), 2)
+
+    def test_paginated_nested_connection_prefetches_one_page(self):
+        customer = Customer.objects.create(first_name="Ada", last_name="L", email="ada@example.com")
+        Order.objects.bulk_create(
+            Order(customer=customer, total_amount=Decimal(amount)) for amount in range(1, 6)
+        )
+        query = """
+            query($first: Int, $after: String, $last: Int) {
+                allCustomers {
+                    edges { node { orders(first: $first, after: $after, last: $last) {
+                        pageInfo { hasNextPage endCursor }
+                        edges { node { totalAmount } }
+                    } } }
+                }
+            }
+        """
+
+        def page(**variables):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.query(query, variables=variables)
+            self.assertResponseNoErrors(response)
+            [edge] = response.json()["data"]["allCustomers"]["edges"]
+            prefetch = [q["sql"] for q in ctx.captured_queries if 'FROM "crm_order"' in q["sql"]]
+            return edge["node"]["orders"], prefetch
+
+        orders, [prefetch] = page(first=2)
+        # Lignes de la page et la suivante, par client (ROW_NUMBER), pas toute la relation
+        self.assertIn("ROW_NUMBER", prefetch)
+        self.assertEqual([e["node"]["totalAmount"] for e in orders["edges"]], ["1.00", "2.00"])
+        self.assertTrue(orders["pageInfo"]["hasNextPage"])
+
+        orders, _ = page(first=2, after=orders["pageInfo"]["endCursor"])
+        self.assertEqual([e["node"]["totalAmount"] for e in orders["edges"]], ["3.00", "4.00"])
+        self.assertTrue(orders["pageInfo"]["hasNextPage"])
+        orders, _ = page(first=2, after=orders["pageInfo"]["endCursor"])
+        self.assertEqual([e["node"]["totalAmount"] for e in orders["edges"]], ["5.00"])
+        self.assertFalse(orders["pageInfo"]["hasNextPage"])
+
+        # last : relation entière
+        orders, [prefetch] = page(last=2)
+        self.assertNotIn("ROW_NUMBER", prefetch)
+        self.assertEqual([e["node"]["totalAmount"] for e in orders["edges"]], ["4.00", "5.00"])
+
+
+class CreateOrderTests(CrmGraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(first_name="Ada", last_name="L", email="ada@example.com")
+        self.products = [
+            Product.objects.create(name=f"P{i}", price=Decimal("2.50"), stock_quantity=100)
+            for i in range(10)
+        ]
+
+    def create_order(self, product_ids, quantities):
+        response = self.query(
+            """
+            mutation($customerId: Int!, $productIds: [Int]!, $quantities: [Int]!) {
+                createOrder(customerId: $customerId, productIds: $productIds, quantities: $quantities) {
+                    success errors order { totalAmount }
+                }
+            }
+            """,
+            variables={"customerId": self.customer.pk, "productIds": product_ids, "quantities": quantities},
+        )
+        self.assertResponseNoErrors(response)
+        return response.json()["data"]["createOrder"]
+
+    def test_query_count_is_constant_in_line_count(self):
+        ids = [p.pk for p in self.products]
+        with CaptureQueriesContext(connection) as small:
+            self.create_order(ids[:1], [1])
+        with CaptureQueriesContext(connection) as large:
+            result = self.create_order(ids, [2] * len(ids))
+        self.assertTrue(result["success"])
+        self.assertEqual(Decimal(result["order"]["totalAmount"]), Decimal("50.00"))
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_unknown_product_creates_nothing(self):
+        result = self.create_order([self.products[0].pk, 999999], [1, 1])
+        self.assertFalse(result["success"])
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_create_orders_reports_errors_per_order(self):
+        response = self.query(
+            """
+            mutation($orders: [OrderInput!]!) {
+                createOrders(orders: $orders) {
+                    createdCount success results { index success errors }
+                }
+            }
+            """,
+            variables={"orders": [
+                {"customerId": self.customer.pk, "productIds": [self.products[0].pk], "quantities": [1]},
+                {"customerId": 999999, "productIds": [self.products[0].pk], "quantities": [1]},
+                {"customerId": self.customer.pk, "productIds": [p.pk for p in self.products], "quantities": []},
+            ]},
+        )
+        self.assertResponseNoErrors(response)
+        data = response.json()["data"]["createOrders"]
+        self.assertEqual(data["createdCount"], 2)
+        self.assertFalse(data["success"])
+        self.assertEqual([r["success"] for r in data["results"]], [True, False, True])
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(OrderItem.objects.count(), 11)
+
+    def test_large_batch_is_chunked(self):
+        customers = Customer.objects.bulk_create(
+            Customer(first_name="Client", last_name=str(i), email=f"batch{i}@example.com") for i in range(600)
+        )
+        products = Product.objects.bulk_create(
+            Product(name=f"B{i}", price=Decimal("1.00"), stock_quantity=1000) for i in range(600)
+        )
+        specs = [
+            OrderSpec(customers[i % 600].pk, [products[i % 600].pk, products[(i * 7 + 1) % 600].pk], [1, 2])
+            for i in range(3000)
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            results = create_orders(specs)
+        self.assertTrue(all(error is None for _, error in results))
+
+        def updates(table):
+            return sum(q["sql"].startswith(f'UPDATE "{table}"') for q in ctx.captured_queries)
+
+        # Paquets de 250 clés : 600 produits, 600 clients, 600 (jour, produit)
+        self.assertEqual(updates("crm_product"), 3)
+        self.assertEqual(updates("crm_customer"), 3)
+        self.assertEqual(updates("crm_dailyproductsales"), 3)
+        self.assertEqual(Customer.objects.filter(order_count=5).count(), 600)
+        stock = Product.objects.filter(pk__in=[p.pk for p in products]).values_list("stock_quantity", flat=True)
+        self.assertEqual(sum(stock), 600 * 1000 - 3000 * 3)
+        self.assertEqual(sum(DailyProductSales.objects.values_list("quantity", flat=True)), 3000 * 3)
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(first_name="Ada", last_name="L", email="ada@example.com")
+        self.product = Product.objects.create(name="Rare", price=Decimal("5.00"), stock_quantity=3)
+        self.other = Product.objects.create(name="Commun", price=Decimal("1.00"), stock_quantity=100)
+
+    def test_stock_is_decremented(self):
+        [(order, error)] = create_orders([OrderSpec(self.customer.pk, [self.product.pk, self.other.pk], [2, 5])])
+        self.assertIsNone(error)
+        self.product.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.product.stock_quantity, self.other.stock_quantity), (1, 95))
+
+    def test_insufficient_stock_fails_cleanly(self):
+        [(order, error)] = create_orders([OrderSpec(self.customer.pk, [self.other.pk, self.product.pk], [5, 4])])
+        self.assertIsNone(order)
+        self.assertIn("Rare", error)
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.stock_quantity, 100)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_batch_isolates_out_of_stock_orders(self):
+        results = create_orders([
+            OrderSpec(self.customer.pk, [self.product.pk], [2]),
+            OrderSpec(self.customer.pk, [self.product.pk], [2]),
+            OrderSpec(self.customer.pk, [self.product.pk, self.other.pk], [1, 1]),
+        ])
+        self.assertEqual([error is None for _, error in results], [True, False, True])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 0)
+
+    def test_chunked_reservation_is_all_or_nothing(self):
+        products = [self.other, Product.objects.create(name="Autre", price=Decimal("1.00"), stock_quantity=100)]
+        # Premier paquet réservé, rupture dans le second : tout est annulé
+        with transaction.atomic():
+            reserved = reserve_stock({products[0].pk: 1, products[1].pk: 1, self.product.pk: 4}, chunk_size=2)
+        self.assertFalse(reserved)
+        self.assertEqual(
+            sorted(Product.objects.values_list("stock_quantity", flat=True)), [3, 100, 100]
+        )
+        with CaptureQueriesContext(connection) as ctx, transaction.atomic():
+            self.assertTrue(reserve_stock({products[0].pk: 1, products[1].pk: 1, self.product.pk: 3}, chunk_size=2))
+        self.assertEqual(sum(query["sql"].startswith("UPDATE") for query in ctx.captured_queries), 2)
+
+
+class ConcurrentStockReservationTests(TransactionTestCase):
+    THREADS = 8
+    RETRY_SECONDS = 30
+
+    def test_concurrent_orders_never_oversell(self):
+        customer = Customer.objects.create(first_name="Ada", last_name="L", email="ada@example.com")
+        product = Product.objects.create(name="Rare", price=Decimal("5.00"), stock_quantity=5)
+        outcomes = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def checkout():
+            barrier.wait()
+            try:
+                # Base de test SQLite en mémoire (cache partagé) : le verrou de table est
+                # refusé immédiatement, sans busy_timeout. Réessais espacés, jusqu'à l'échéance
+                deadline = time.monotonic() + self.RETRY_SECONDS
+                delay = 0.001
+                while True:
+                    try:
+                        [(order, error)] = create_orders([OrderSpec(customer.pk, [product.pk], [1])])
+                    except OperationalError as e:
+                        if time.monotonic() > deadline:
+                            outcomes.append(e)
+                            return
+                        time.sleep(delay * random.uniform(0.5, 1.5))
+                        delay = min(delay * 2, 0.05)
+                        continue
+                    outcomes.append(error is None)
+                    return
+            except Exception as e:
+                # Rapportée par l'assertion au lieu d'un résultat manquant
+                outcomes.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=checkout) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual([outcome for outcome in outcomes if not isinstance(outcome, bool)], [])
+        self.assertEqual(len(outcomes), self.THREADS)
+        self.assertEqual(outcomes.count(True), 5)
+        self.assertEqual(product.stock_quantity, 0)
+        self.assertEqual(Order.objects.count(), 5)
+
+
+class UpdateLowStockProductsTests(CrmGraphQLTestCase):
+    MUTATION = """
+        mutation($returning: Boolean, $afterId: Int, $chunkSize: Int) {
+            updateLowStockProducts(minStock: 10, incrementBy: 50, returning: $returning,
+                                   afterId: $afterId, chunkSize: $chunkSize) {
+                success updatedCount updatedIds lastId hasMore
+            }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.low = [
+            Product.objects.create(name=f"Bas {i}", price=Decimal("1.00"), stock_quantity=i)
+            for i in range(5)
+        ]
+        Product.objects.create(name="Plein", price=Decimal("1.00"), stock_quantity=500)
+
+    def restock(self, **variables):
+        response = self.query(self.MUTATION, variables=variables)
+        self.assertResponseNoErrors(response)
+        return response.json()["data"]["updateLowStockProducts"]
+
+    def test_restock_is_a_single_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = self.restock()
+        self.assertEqual(result["updatedCount"], 5)
+        self.assertEqual([q["sql"].split()[0] for q in ctx.captured_queries], ["UPDATE"])
+        self.assertEqual(
+            sorted(Product.objects.values_list("stock_quantity", flat=True)),
+            [50, 51, 52, 53, 54, 500],
+        )
+
+    def test_returning_mode_pages_through_ids(self):
+        first = self.restock(returning=True, chunkSize=3)
+        self.assertEqual(first["updatedIds"], [p.pk for p in self.low[:3]])
+        self.assertTrue(first["hasMore"])
+        second = self.restock(returning=True, chunkSize=3, afterId=first["lastId"])
+        self.assertEqual(second["updatedIds"], [p.pk for p in self.low[3:]])
+        self.assertFalse(second["hasMore"])
+
+    def test_returning_mode_rejects_empty_chunks(self):
+        for chunk_size in (0, -1):
+            response = self.query(self.MUTATION, variables={"returning": True, "chunkSize": chunk_size})
+            self.assertResponseHasErrors(response)
+            self.assertIn("chunkSize", response.json()["errors"][0]["message"])
+        self.assertEqual(Product.objects.filter(stock_quantity__lt=10).count(), 5)
+
+
+class SearchTests(CrmGraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        Customer.objects.create(first_name="Adèle", last_name="Martin", email="adele@example.com")
+        Customer.objects.create(first_name="Adam", last_name="Adamson", email="adam@example.com")
+        Customer.objects.create(first_name="Bruno", last_name="Durand", email="bruno@example.com")
+        Product.objects.create(name="Clavier mécanique", price=Decimal("80.00"))
+        Product.objects.create(name="Souris", description="Compatible clavier", price=Decimal("20.00"))
+
+    def emails(self, arguments):
+        response = self.query(f"query {{ allCustomers({arguments}) {{ edges {{ node {{ email }} }} }} }}")
+        self.assertResponseNoErrors(response)
+        return [edge["node"]["email"] for edge in response.json()["data"]["allCustomers"]["edges"]]
+
+    def test_name_filters_match_word_prefixes(self):
+        self.assertEqual(sorted(self.emails('firstName: "ade"')), ["adele@example.com"])
+        self.assertEqual(sorted(self.emails('lastName: "dur"')), ["bruno@example.com"])
+        # Début de mot, pas sous-chaîne : "dam" ne trouve pas « Adam »
+        self.assertEqual(self.emails('firstName: "dam"'), [])
+        self.assertEqual(self.emails('lastName: "son"'), [])
+
+    def test_filter_descriptions_state_word_prefix_matching(self):
+        from alx_backend_graphql.schema import schema
+
+        query_type = schema.graphql_schema.query_type
+        self.assertEqual(
+            query_type.fields["allCustomers"].args["firstName"].description, "Prénom : mots commençant par"
+        )
+        self.assertEqual(
+            query_type.fields["allProducts"].args["name"].description, "Nom du produit : mots commençant par"
+        )
+
+    def test_search_is_ranked(self):
+        # "adam" apparaît dans le prénom, le nom et l'email d'Adam
+        self.assertEqual(self.emails('search: "adam"'), ["adam@example.com"])
+        self.assertEqual(self.emails('search: "ad"')[0], "adam@example.com")
+
+        response = self.query('query { allProducts(search: "clavier") { edges { node { name } } } }')
+        names = [edge["node"]["name"] for edge in response.json()["data"]["allProducts"]["edges"]]
+        self.assertEqual(names, ["Clavier mécanique", "Souris"])
+
+    def test_index_follows_updates_and_deletes(self):
+        bruno = Customer.objects.get(first_name="Bruno")
+        bruno.first_name = "Bernard"
+        bruno.save()
+        self.assertEqual(self.emails('firstName: "bru"'), [])
+        self.assertEqual(self.emails('firstName: "bern"'), ["bruno@example.com"])
+        bruno.delete()
+        self.assertEqual(self.emails('search: "bern"'), [])
+
+
+class KeysetPaginationTests(CrmGraphQLTestCase):
+    def page(self, arguments, fields="edges { cursor node { totalAmount } } pageInfo { hasNextPage hasPreviousPage endCursor startCursor }"):
+        response = self.query(f"query {{ allOrders({arguments}) {{ {fields} }} }}")
+        self.assertResponseNoErrors(response)
+        return response.json()["data"]["allOrders"]
+
+    def test_pages_follow_the_cursor_without_offset_or_count(self):
+        seed_orders(7)
+        ids = list(Order.objects.order_by("-order_date", "-id").values_list("pk", flat=True))
+        for position, pk in enumerate(ids):
+            Order.objects.filter(pk=pk).update(total_amount=position)
+
+        seen = []
+        after = ""
+        while True:
+            with CaptureQueriesContext(connection) as ctx:
+                data = self.page(f"first: 3{after}")
+            sql = " ".join(q["sql"] for q in ctx.captured_queries)
+            self.assertNotIn("COUNT(", sql)
+            self.assertNotIn("OFFSET", sql)
+            seen.extend(int(float(edge["node"]["totalAmount"])) for edge in data["edges"])
+            if not data["pageInfo"]["hasNextPage"]:
+                break
+            after = f', after: "{data["pageInfo"]["endCursor"]}"'
+        self.assertEqual(seen, list(range(7)))
+
+    def test_backward_pagination(self):
+        seed_orders(5)
+        first_page = self.page("first: 2")
+        previous = self.page(f'last: 2, before: "{first_page["edges"][1]["cursor"]}"')
+        self.assertEqual(len(previous["edges"]), 1)
+        self.assertEqual(previous["edges"][0]["cursor"], first_page["edges"][0]["cursor"])
+        self.assertFalse(previous["pageInfo"]["hasPreviousPage"])
+
+    def test_total_count_is_opt_in(self):
+        seed_orders(4)
+        data = self.page('first: 1, status: "pending"', fields="totalCount edges { node { id } }")
+        self.assertEqual(data["totalCount"], 4)
+        self.assertEqual(len(data["edges"]), 1)
+
+    def test_invalid_cursor_is_an_error(self):
+        response = self.query('query { allOrders(after: "nope") { edges { node { id } } } }')
+        self.assertResponseHasErrors(response)
+
+    def test_cursor_with_mistyped_values_is_an_error(self):
+        # Curseur décodable, mais dont les valeurs ne sont pas une date et un id
+        cursor = base64.urlsafe_b64encode(b'keyset:["hier","abc"]').decode()
+        response = self.query(f'query {{ allOrders(after: "{cursor}") {{ edges {{ node {{ id }} }} }} }}')
+        self.assertResponseHasErrors(response)
+        self.assertEqual(response.json()["errors"][0]["message"], f"Curseur invalide : {cursor}")
+
+
+class PersistedQueryTests(CrmGraphQLTestCase):
+    QUERY = "query { allProducts { edges { node { name } } } }"
+
+    def setUp(self):
+        super().setUp()
+        document_cache.clear()
+        Product.objects.create(name="Stylo", price=Decimal("1.00"))
+
+    def post(self, payload):
+        return self.client.post(self.GRAPHQL_URL, json.dumps(payload), content_type="application/json")
+
+    def test_automatic_persisted_query_protocol(self):
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(self.QUERY + " ")}}
+        response = self.post({"extensions": extensions})
+        self.assertEqual(response.json()["errors"][0]["message"], "PersistedQueryNotFound")
+
+        response = self.post({"query": self.QUERY + " ", "extensions": extensions})
+        self.assertResponseNoErrors(response)
+
+        response = self.post({"extensions": extensions})
+        self.assertResponseNoErrors(response)
+        self.assertEqual(response.json()["data"]["allProducts"]["edges"][0]["node"]["name"], "Stylo")
+
+    def test_client_registrations_stay_out_of_process_memory(self):
+        registry = PersistedQueryRegistry([self.QUERY])
+        for i in range(50):
+            query = f"query Q{i} {{ hello }}"
+            extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(query)}}
+            registry.resolve(query, extensions)
+            self.assertEqual(registry.resolve(None, extensions), query)
+        self.assertEqual(list(registry._static), [query_hash(self.QUERY)])
+        # Les requêtes des settings restent servies sans le cache
+        caches["default"].clear()
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(self.QUERY)}}
+        self.assertEqual(registry.resolve(None, extensions), self.QUERY)
+        with self.assertRaises(PersistedQueryNotFound):
+            registry.resolve(None, {"persistedQuery": {"version": 1, "sha256Hash": query_hash("query Q0 { hello }")}})
+
+    def test_hash_mismatch_is_rejected(self):
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": "0" * 64}}
+        response = self.post({"query": self.QUERY, "extensions": extensions})
+        self.assertResponseHasErrors(response)
+
+    def test_parsed_documents_are_cached(self):
+        for _ in range(3):
+            self.assertResponseNoErrors(self.query(self.QUERY))
+        response = self.query("query { nope }")
+        self.assertResponseHasErrors(response)
+        stats = self.client.get("/graphql/stats").json()["documents"]
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+
+
+def shared_file_caches(test):
+    """
+    Caches du projet sans CRM_CACHE_URL (fichiers), dans un répertoire propre
+    au test, le temps du test. Retourne le répertoire, à passer aux autres
+    processus (CRM_CACHE_DIR).
+    """
+    from alx_backend_graphql import settings as project_settings
+
+    directory = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+    override = override_settings(CACHES={
+        alias: {
+            **config,
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.path.join(directory, alias),
+        }
+        for alias, config in project_settings.CACHES.items()
+    })
+    override.enable()
+    test.addCleanup(override.disable)
+    return directory
+
+
+class OtherProcessResponseCache(ResponseCache):
+    """
+    Cache de réponses d'un autre processus (worker Celery, cron) : chaque
+    invalidation est faite par un nouveau processus Python, avec les settings
+    du projet et les caches fichiers de `directory` (shared_file_caches).
+    """
+
+    CODE = (
+        "import sys, django; django.setup()\n"
+        "from crm.response_cache import response_cache\n"
+        "response_cache.invalidate(*sys.argv[1:])\n"
+    )
+
+    def __init__(self, directory):
+        super().__init__(alias=response_cache.alias)
+        self.directory = directory
+
+    def invalidate(self, *labels):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "alx_backend_graphql.settings", "CRM_CACHE_DIR": self.directory}
+        env.pop("CRM_CACHE_URL", None)
+        subprocess.run([sys.executable, "-c", self.CODE, *labels], env=env, cwd=settings.BASE_DIR, check=True)
+
+
+class ResponseCacheTests(CrmGraphQLTestCase):
+    PRODUCTS = "query { allProducts { edges { node { name stockQuantity } } } }"
+    ORDERS = "query { allOrders { edges { node { totalAmount } } } }"
+
+    def setUp(self):
+        super().setUp()
+        seed_orders(2)
+
+    def count_queries(self, query):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.query(query)
+        self.assertResponseNoErrors(response)
+        return len(ctx.captured_queries), response.json()["data"]
+
+    def test_repeated_query_is_served_from_cache(self):
+        executed, first = self.count_queries(self.PRODUCTS)
+        self.assertGreater(executed, 0)
+        cached, second = self.count_queries(self.PRODUCTS)
+        self.assertEqual(cached, 0)
+        self.assertEqual(first, second)
+
+    def test_invalidation_is_scoped_to_written_models(self):
+        self.count_queries(self.PRODUCTS)
+        self.count_queries(self.ORDERS)
+
+        customer = Customer.objects.first()
+        Order.objects.create(customer=customer, total_amount=Decimal("1.00"))
+
+        self.assertEqual(self.count_queries(self.PRODUCTS)[0], 0)
+        executed, data = self.count_queries(self.ORDERS)
+        self.assertGreater(executed, 0)
+        self.assertEqual(len(data["allOrders"]["edges"]), 3)
+
+    def test_bulk_writes_invalidate(self):
+        self.count_queries(self.PRODUCTS)
+        response = self.query("mutation { updateLowStockProducts(minStock: 1000) { updatedCount } }")
+        self.assertResponseNoErrors(response)
+        executed, data = self.count_queries(self.PRODUCTS)
+        self.assertGreater(executed, 0)
+        self.assertEqual(data["allProducts"]["edges"][0]["node"]["stockQuantity"], 150)
+
+    def test_writes_from_another_process_invalidate(self):
+        directory = shared_file_caches(self)
+        self.count_queries(self.PRODUCTS)
+        # Écriture d'un worker : ni signal ni invalidation dans ce processus
+        Product.objects.update(stock_quantity=7)
+        self.assertEqual(self.count_queries(self.PRODUCTS)[0], 0)
+        OtherProcessResponseCache(directory).invalidate(Product._meta.label)
+        executed, data = self.count_queries(self.PRODUCTS)
+        self.assertGreater(executed, 0)
+        self.assertEqual(data["allProducts"]["edges"][0]["node"]["stockQuantity"], 7)
+
+    def test_mutations_are_not_cached(self):
+        mutation = 'mutation { createProduct(name: "X", price: 1, stockQuantity: 1) { success } }'
+        self.query(mutation)
+        self.query(mutation)
+        self.assertEqual(Product.objects.filter(name="X").count(), 2)
+
+
+class AsyncGraphQLViewTests(CrmGraphQLTestCase):
+    ASYNC_URL = "/graphql/async"
+    ORDERS_QUERY = """
+        query {
+            allOrders(first: 50) {
+                totalCount
+                edges {
+                    node {
+                        customer { email orders { edges { node { totalAmount } } } }
+                        items { quantity order { id } product { name orderitemSet { quantity } } }
+                    }
+                }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+
+    async def apost(self, query, url=None):
+        await sync_to_async(caches[response_cache.alias].clear)()
+        response = await self.async_client.post(
+            url or self.ASYNC_URL, {"query": query}, content_type="application/json"
+        )
+        return response.json()
+
+    def count_queries(self, query):
+        # Client synchrone : la vue asynchrone tourne sous async_to_sync et ses
+        # requêtes SQL (sync_to_async) dans ce thread, où elles sont comptées
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.ASYNC_URL, {"query": query}, content_type="application/json")
+        self.assertResponseNoErrors(response)
+        return len(ctx.captured_queries), response.json()["data"]
+
+    async def test_async_view_matches_sync_view(self):
+        await sync_to_async(seed_orders)(3)
+        sync_data = await self.apost(self.ORDERS_QUERY, url=self.GRAPHQL_URL)
+        async_data = await self.apost(self.ORDERS_QUERY)
+        self.assertNotIn("errors", async_data)
+        self.assertEqual(async_data, sync_data)
+        self.assertEqual(async_data["data"]["allOrders"]["totalCount"], 3)
+
+    def test_query_count_is_constant_in_page_size(self):
+        seed_orders(2)
+        small, _ = self.count_queries(self.ORDERS_QUERY)
+        seed_orders(10)
+        large, data = self.count_queries(self.ORDERS_QUERY)
+        self.assertEqual(len(data["allOrders"]["edges"]), 12)
+        self.assertEqual(small, large)
+
+    def test_deferred_columns_are_not_loaded_per_row(self):
+        seed_orders(5)
+        executed, data = self.count_queries("""
+            query {
+                allOrders { edges { node { items { order { totalAmount } } } } }
+            }
+        """)
+        self.assertEqual(len(data["allOrders"]["edges"]), 5)
+        # Page des commandes, lignes (JOIN commande)
+        self.assertEqual(executed, 2)
+
+    async def test_concurrent_loads_share_one_batch(self):
+        batches = []
+
+        async def abatch_load(keys):
+            batches.append(list(keys))
+            await asyncio.sleep(0)
+            return {key: key * 10 for key in keys}
+
+        loader = DataLoader(None, abatch_load)
+        loader.prime([1, 2, 3])
+        values = await asyncio.gather(*(loader.aload(key) for key in (1, 2, 3, 4)))
+        self.assertEqual(values, [10, 20, 30, 40])
+        self.assertEqual(batches, [[1, 2, 3], [4]])
+
+    async def test_mutations_run_in_a_transaction(self):
+        customer = await Customer.objects.acreate(first_name="Ada", last_name="L", email="ada@example.com")
+        product = await Product.objects.acreate(name="P", price=Decimal("2.50"), stock_quantity=1)
+        mutation = """
+            mutation {
+                createOrder(customerId: %d, productIds: [%d], quantities: [%d]) {
+                    success errors order { customer { email } items { product { name } } }
+                }
+            }
+        """
+        content = await self.apost(mutation % (customer.pk, product.pk, 1))
+        self.assertTrue(content["data"]["createOrder"]["success"])
+        self.assertEqual(content["data"]["createOrder"]["order"]["customer"]["email"], "ada@example.com")
+
+        content = await self.apost(mutation % (customer.pk, product.pk, 1))
+        self.assertFalse(content["data"]["createOrder"]["success"])
+        self.assertEqual(await Order.objects.acount(), 1)
+
+
+class QueryCostTests(CrmGraphQLTestCase):
+    NESTED = """
+        query ($first: Int) {
+            allOrders(first: $first) {
+                edges { node { customer { orders { edges { node { items { product { name } } } } } } } }
+            }
+        }
+    """
+
+    def test_cost_is_reported_in_extensions(self):
+        response = self.query(
+            "query { allOrders(first: 50) { edges { node { customer { email } items { product { name } } } } } }"
+        )
+        self.assertResponseNoErrors(response)
+        cost = response.json()["extensions"]["cost"]
+        self.assertEqual(cost["cost"], 1 + 50 * (1 + 1 + 10 * 1))
+        self.assertEqual(cost["depth"], 6)
+
+    def test_connection_arguments_multiply_the_cost(self):
+        small = self.query(self.NESTED, variables={"first": 2}).json()["extensions"]["cost"]["cost"]
+        large = self.query(self.NESTED, variables={"first": 4}).json()["extensions"]["cost"]["cost"]
+        self.assertEqual(large - 1, 2 * (small - 1))
+
+    def test_over_budget_query_is_rejected_before_execution(self):
+        seed_orders(2)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.query(self.NESTED, variables={"first": 100})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        error = response.json()["errors"][0]
+        self.assertEqual(error["extensions"]["code"], "QUERY_TOO_COMPLEX")
+        self.assertGreater(error["extensions"]["cost"], 10000)
+
+    def test_depth_limit(self):
+        query = "query { allOrders(first: 1) { edges { node { " \
+            + "items { order { " * 5 + "id" + " } }" * 5 + " } } } }"
+        response = self.query(query)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("depth", response.json()["errors"][0]["message"])
+
+
+class ResolverMetricsTests(CrmGraphQLTestCase):
+    QUERY = "query { allOrders { edges { node { totalAmount customer { email } items { quantity } } } } }"
+
+    def setUp(self):
+        super().setUp()
+        metrics.sink.reset()
+        seed_orders(3)
+
+    def profile(self, url="/graphql"):
+        response = self.client.post(
+            url, {"query": self.QUERY}, content_type="application/json", HTTP_X_GRAPHQL_DEBUG="1"
+        )
+        self.assertResponseNoErrors(response)
+        profile = response.json()["extensions"]["profile"]
+        return {entry["path"]: entry for entry in profile["resolvers"]}, profile
+
+    def test_profile_is_returned_with_the_debug_header(self):
+        paths, profile = self.profile()
+        self.assertEqual(paths["Query.allOrders"]["rows"], 3)
+        self.assertEqual(paths["OrderType.items"]["calls"], 3)
+        self.assertEqual(paths["OrderType.items"]["rows"], 9)
+        # Page (JOIN client) puis lignes préchargées, toutes deux dans allOrders
+        self.assertEqual(paths["Query.allOrders"]["queries"], 2)
+        self.assertEqual(profile["queries"], 2)
+        self.assertNotIn("OrderType.totalAmount", paths)
+
+    def test_profile_is_not_returned_without_the_header(self):
+        response = self.query(self.QUERY)
+        self.assertResponseNoErrors(response)
+        self.assertNotIn("profile", response.json().get("extensions", {}))
+
+    def test_async_view_is_profiled(self):
+        paths, _ = self.profile("/graphql/async")
+        self.assertEqual(paths["Query.allOrders"]["rows"], 3)
+        self.assertEqual(paths["Query.allOrders"]["queries"], 2)
+
+    def test_histograms_are_exported_in_prometheus_format(self):
+        self.query(self.QUERY)
+        response = self.client.get("/graphql/metrics")
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn("# TYPE crm_graphql_resolver_duration_seconds histogram", body)
+        self.assertIn('crm_graphql_resolver_queries_bucket{path="Query.allOrders",le="2"} 1', body)
+        self.assertIn('crm_graphql_resolver_rows_total{path="OrderType.items"} 9', body)
+
+    def test_aliases_do_not_create_new_paths(self):
+        aliases = " ".join(f"a{i}: allOrders(first: 1) {{ edges {{ node {{ items {{ quantity }} }} }} }}" for i in range(50))
+        self.assertResponseNoErrors(self.query(f"query {{ {aliases} }}"))
+        self.assertEqual(sorted(metrics.sink.calls), ["OrderType.items", "Query.allOrders"])
+        self.assertEqual(metrics.sink.calls["Query.allOrders"], 50)
+
+
+class CustomerStatsTests(CrmGraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customers = [
+            Customer.objects.create(first_name="Client", last_name=str(i), email=f"stats{i}@example.com")
+            for i in range(4)
+        ]
+        self.product = Product.objects.create(name="P", price=Decimal("10.00"), stock_quantity=1000)
+
+    def order(self, customer, quantity):
+        return OrderSpec(customer.pk, [self.product.pk], [quantity])
+
+    def test_create_orders_updates_aggregates_in_one_statement(self):
+        first, second = self.customers[:2]
+        with CaptureQueriesContext(connection) as ctx:
+            create_orders([self.order(first, 1), self.order(first, 2), self.order(second, 5)])
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('UPDATE "crm_customer"')]
+        self.assertEqual(len(updates), 1)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.order_count, first.lifetime_revenue), (2, Decimal("30.00")))
+        self.assertEqual((second.order_count, second.lifetime_revenue), (1, Decimal("50.00")))
+        self.assertEqual(first.last_order_date, Order.objects.filter(customer=first).latest("order_date").order_date)
+
+    def test_add_orders_is_chunked_by_customer(self):
+        results = create_orders([self.order(customer, i + 1) for i, customer in enumerate(self.customers)])
+        Customer.objects.update(order_count=0, lifetime_revenue=0, last_order_date=None)
+        with CaptureQueriesContext(connection) as ctx:
+            updated = customer_stats.add_orders([order for order, _ in results], chunk_size=3)
+        self.assertEqual(updated, 4)
+        self.assertEqual(sum(q["sql"].startswith('UPDATE "crm_customer"') for q in ctx.captured_queries), 2)
+        self.assertEqual(
+            list(Customer.objects.order_by("pk").values_list("order_count", "lifetime_revenue")),
+            [(1, Decimal("10.00")), (1, Decimal("20.00")), (1, Decimal("30.00")), (1, Decimal("40.00"))],
+        )
+        self.assertFalse(Customer.objects.filter(last_order_date=None).exists())
+
+    def test_single_order_writes_refresh_the_customer(self):
+        customer = self.customers[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=customer, total_amount=Decimal("12.50"))
+        customer.refresh_from_db()
+        self.assertEqual((customer.order_count, customer.lifetime_revenue), (1, Decimal("12.50")))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        customer.refresh_from_db()
+        self.assertEqual((customer.order_count, customer.lifetime_revenue), (0, Decimal("0")))
+        self.assertIsNone(customer.last_order_date)
+
+    def test_bulk_order_deletes_refresh_each_customer_once(self):
+        first, second = self.customers[:2]
+        create_orders([self.order(first, 1), self.order(first, 2), self.order(second, 3), self.order(second, 4)])
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            # Plusieurs commandes par client, en deux suppressions : un seul recalcul
+            Order.objects.filter(customer=first).delete()
+            Order.objects.filter(customer=second, total_amount=Decimal("30.00")).delete()
+        aggregates = [q["sql"] for q in ctx.captured_queries if 'MAX("crm_order"."order_date")' in q["sql"]]
+        self.assertEqual(len(aggregates), 1)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.order_count, first.lifetime_revenue), (0, Decimal("0")))
+        self.assertEqual((second.order_count, second.lifetime_revenue), (1, Decimal("40.00")))
+
+    def test_rebuild_command(self):
+        create_orders([self.order(customer, i + 1) for i, customer in enumerate(self.customers)])
+        Customer.objects.update(order_count=0, lifetime_revenue=0, last_order_date=None)
+        call_command("rebuild_customer_stats", chunk_size=3, stdout=io.StringIO())
+        self.assertEqual(
+            list(Customer.objects.order_by("pk").values_list("order_count", "lifetime_revenue")),
+            [(1, Decimal("10.00")), (1, Decimal("20.00")), (1, Decimal("30.00")), (1, Decimal("40.00"))],
+        )
+
+    def test_top_customers_are_paginated_by_keyset(self):
+        create_orders([self.order(customer, i + 1) for i, customer in enumerate(self.customers)])
+        query = """
+            query ($after: String) {
+                allCustomers(orderBy: "-lifetime_revenue", first: 2, after: $after, lifetimeRevenueMin: 15) {
+                    edges { node { lastName orderCount lifetimeRevenue } }
+                    pageInfo { hasNextPage endCursor }
+                }
+            }
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.query(query)
+        self.assertResponseNoErrors(response)
+        self.assertNotIn("OFFSET", ctx.captured_queries[-1]["sql"])
+        page = response.json()["data"]["allCustomers"]
+        self.assertEqual([e["node"]["lastName"] for e in page["edges"]], ["3", "2"])
+        self.assertTrue(page["pageInfo"]["hasNextPage"])
+
+        response = self.query(query, variables={"after": page["pageInfo"]["endCursor"]})
+        page = response.json()["data"]["allCustomers"]
+        self.assertEqual([e["node"]["lastName"] for e in page["edges"]], ["1"])
+        self.assertFalse(page["pageInfo"]["hasNextPage"])
+
+    def test_nullable_sort_falls_back_to_offset(self):
+        create_orders([self.order(self.customers[2], 1)])
+        response = self.query('query { allCustomers(orderBy: "last_order_date", first: 4) { edges { node { lastName } } } }')
+        self.assertResponseNoErrors(response)
+        names = [e["node"]["lastName"] for e in response.json()["data"]["allCustomers"]["edges"]]
+        self.assertEqual(names[-1], "2")
+
+
+class CrmStatsTests(CrmGraphQLTestCase):
+    STATS = """
+        query {
+            crmStats { totalCustomers activeCustomers totalOrders totalRevenue }
+            totalCustomers
+            totalOrders
+            totalRevenue
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()
+        seed_orders(3)
+        Customer.objects.create(first_name="Sans", last_name="Commande", email="none@example.com")
+        Order.objects.filter(pk=Order.objects.order_by("pk").first().pk).update(status="paid")
+
+    def stats(self, query):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.query(query)
+        self.assertResponseNoErrors(response)
+        return [q["sql"] for q in ctx.captured_queries], response.json()["data"]
+
+    def test_all_kpis_in_one_statement(self):
+        queries, data = self.stats(self.STATS)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            data["crmStats"],
+            {"totalCustomers": 4, "activeCustomers": 3, "totalOrders": 3, "totalRevenue": "90.00"},
+        )
+        self.assertEqual(
+            (data["totalCustomers"], data["totalOrders"], data["totalRevenue"]), (4, 3, "90.00")
+        )
+
+    def test_period_and_status_arguments(self):
+        today = timezone.now().date()
+        _, data = self.stats('query { crmStats(status: "paid") { activeCustomers totalOrders totalRevenue } }')
+        self.assertEqual(data["crmStats"], {"activeCustomers": 1, "totalOrders": 1, "totalRevenue": "30.00"})
+
+        _, data = self.stats(
+            'query { crmStats(from: "%s", to: "%s") { totalCustomers totalOrders } }'
+            % (today - timedelta(days=7), today - timedelta(days=1))
+        )
+        self.assertEqual(data["crmStats"], {"totalCustomers": 0, "totalOrders": 0})
+
+    def test_stats_are_cached_until_a_write(self):
+        self.stats(self.STATS)
+        queries, _ = self.stats("query { crmStats { totalOrders } }")
+        self.assertEqual(queries, [])
+
+        Order.objects.create(customer=Customer.objects.first(), total_amount=Decimal("5.00"))
+        queries, data = self.stats("query { crmStats { totalOrders totalRevenue } }")
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(data["crmStats"], {"totalOrders": 4, "totalRevenue": "95.00"})
+
+    def test_writes_from_another_process_invalidate(self):
+        directory = shared_file_caches(self)
+        self.stats('query { crmStats(status: "paid") { totalOrders } }')
+        # Commandes passées payées par un worker : aucun signal dans ce processus
+        Order.objects.update(status="paid")
+        _, data = self.stats('query { crmStats(status: "paid") { totalOrders } }')
+        self.assertEqual(data["crmStats"], {"totalOrders": 1})
+        OtherProcessResponseCache(directory).invalidate(Order._meta.label)
+        queries, data = self.stats('query { crmStats(status: "paid") { totalOrders } }')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(data["crmStats"], {"totalOrders": 3})
+
+    def test_unknown_status_is_an_error(self):
+        response = self.query('query { crmStats(status: "lost") { totalOrders } }')
+        self.assertResponseHasErrors(response)
+
+
+class SqliteProfileTests(TestCase):
+    def test_new_connections_get_the_production_pragmas(self):
+        pragmas = current_pragmas(connection, ["synchronous", "busy_timeout", "cache_size", "temp_store"])
+        # 1 : NORMAL ; 2 : MEMORY (la base de test en mémoire reste en journal "memory")
+        self.assertEqual(pragmas, {"synchronous": 1, "busy_timeout": 20000, "cache_size": -64 * 1024, "temp_store": 2})
+        # DEFERRED : seuls les blocs write_atomic() prennent le verrou d'écriture d'entrée
+        self.assertIsNone(connection.transaction_mode)
+
+    def write_lock_taken(self, block):
+        """True si, dans `block(alias)`, un autre processus ne peut plus commencer à écrire."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "lock.sqlite3")
+            settings_dict = {**connection.settings_dict, "NAME": path}
+            other = connections["default"].__class__(settings_dict, alias="lock_test")
+            connections["lock_test"] = other
+            try:
+                with other.schema_editor() as editor:
+                    editor.create_model(Product)
+                    editor.create_model(JobCheckpoint)
+                with block("lock_test"):
+                    Product.objects.using("lock_test").count()
+                    writer = sqlite3.connect(path, timeout=0, isolation_level=None)
+                    try:
+                        writer.execute("BEGIN IMMEDIATE")
+                        writer.execute("ROLLBACK")
+                        return False
+                    except sqlite3.OperationalError:
+                        return True
+                    finally:
+                        writer.close()
+            finally:
+                del connections["lock_test"]
+                other.close()
+
+    def test_read_only_atomic_blocks_do_not_take_the_write_lock(self):
+        self.assertFalse(self.write_lock_taken(lambda using: transaction.atomic(using=using)))
+
+    def test_write_paths_take_the_write_lock_up_front(self):
+        self.assertTrue(self.write_lock_taken(lambda using: write_atomic(using=using)))
+
+    def journal_mode(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = {**connection.settings_dict, "NAME": os.path.join(directory, "wal.sqlite3")}
+            other = connections["default"].__class__(settings_dict, alias="wal_test")
+            try:
+                return current_pragmas(other, ["journal_mode"])["journal_mode"]
+            finally:
+                other.close()
+
+    def test_journal_mode_is_left_alone_by_default(self):
+        # Ni db.sqlite3-wal ni db.sqlite3-shm en développement
+        self.assertEqual(self.journal_mode(), "delete")
+
+    @override_settings(CRM_SQLITE={"JOURNAL_MODE": "WAL"})
+    def test_wal_when_enabled(self):
+        self.assertEqual(self.journal_mode(), "wal")
+
+
+class LocalTransportTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        caches[response_cache.alias].clear()
+        seed_orders(2)
+
+    def test_query_runs_in_process(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = local_client().execute(gql("query { crmStats { totalCustomers totalRevenue } }"))
+        self.assertEqual(result, {"crmStats": {"totalCustomers": 2, "totalRevenue": "60.00"}})
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_documents_are_validated_against_the_local_schema(self):
+        with self.assertRaises(GraphQLError):
+            local_client().execute(gql("query { crmStats { unknownField } }"))
+
+    def test_documents_are_parsed_once(self):
+        source = "query { crmStats { totalCustomers } }"
+        self.assertIs(document(source), document(source))
+        self.assertEqual(local_client().execute(document(source)), {"crmStats": {"totalCustomers": 2}})
+
+    def test_schema_is_shared(self):
+        from alx_backend_graphql.schema import schema
+        from . import schema as crm_schema
+
+        self.assertIs(crm_schema.schema, schema)
+        self.assertIs(local_client().transport.schema, schema)
+
+    def test_worker_boot_does_not_import_gql(self):
+        # Processus neuf : les tests ont déjà tout importé
+        code = (
+            "import sys, django; django.setup()\n"
+            "import crm.tasks, crm.cron\n"
+            "print(sorted(name for name in ('gql', 'requests') if name in sys.modules))\n"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+        output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "[]")
+
+    def test_report_task(self):
+        with self.assertLogs(level="INFO") as logs:
+            generate_crm_report()
+        self.assertIn("Report: 2 customers, 2 orders, 60.00 revenue.", logs.output[-1])
+
+    def test_low_stock_cron(self):
+        eager_celery(self)
+        Product.objects.update(stock_quantity=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            message = update_low_stock()
+        self.assertIn("1 tranche(s)", message)
+        self.assertEqual(set(Product.objects.values_list("stock_quantity", flat=True)), {53})
+
+
+class OrderReminderTests(CrmGraphQLTestCase):
+    RECENT = """
+        query($after: String) {
+            recentOrders(hours: 24, first: 2, after: $after) {
+                pageInfo { hasNextPage endCursor }
+                edges { node { totalAmount } }
+            }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        seed_orders(5, items_per_order=1)
+        old = Order.objects.order_by("pk").first()
+        Order.objects.filter(pk=old.pk).update(order_date=timezone.now() - timedelta(days=2))
+        self.old_id = old.pk
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send(self, order):
+        with self.lock:
+            self.sent.append(order["customer"]["email"])
+
+    def test_recent_orders_pages_oldest_first(self):
+        Order.objects.filter(pk=self.old_id + 1).update(total_amount=Decimal("1.00"))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.query(self.RECENT)
+        self.assertResponseNoErrors(response)
+        page = response.json()["data"]["recentOrders"]
+        self.assertTrue(page["pageInfo"]["hasNextPage"])
+        self.assertEqual(page["edges"][0]["node"]["totalAmount"], "1.00")
+        self.assertFalse(any("OFFSET" in q["sql"] for q in ctx.captured_queries))
+
+        after = page["pageInfo"]["endCursor"]
+        response = self.query(self.RECENT, variables={"after": after})
+        self.assertEqual(len(response.json()["data"]["recentOrders"]["edges"]), 2)
+
+    def test_each_run_only_processes_new_orders(self):
+        self.assertEqual(send_order_reminders(page_size=2, workers=2, send=self.send), (4, 0))
+        self.assertEqual(sorted(self.sent), [f"client{i}@example.com" for i in range(1, 5)])
+        position = checkpoints.load(CHECKPOINT)
+        self.assertEqual(set(position), {"cursor", "order_date", "id", "recent"})
+
+        self.assertEqual(send_order_reminders(page_size=2, send=self.send), (0, 0))
+
+        Order.objects.create(customer=Customer.objects.get(email="client0@example.com"))
+        self.assertEqual(send_order_reminders(page_size=2, send=self.send), (1, 0))
+        self.assertEqual(self.sent[-1], "client0@example.com")
+
+    def test_orders_committed_late_are_sent_once(self):
+        send_order_reminders(send=self.send)
+        last = Order.objects.order_by("order_date").last().order_date
+        customer = Customer.objects.get(email="client0@example.com")
+        # Transaction validée après la dernière commande traitée : date antérieure
+        late = Order.objects.create(customer=customer)
+        Order.objects.filter(pk=late.pk).update(order_date=last - timedelta(seconds=60))
+        too_late = Order.objects.create(customer=Customer.objects.get(email="client1@example.com"))
+        Order.objects.filter(pk=too_late.pk).update(order_date=last - timedelta(seconds=600))
+
+        self.sent.clear()
+        self.assertEqual(send_order_reminders(send=self.send), (1, 0))
+        self.assertEqual(self.sent, ["client0@example.com"])
+        # Recouvrement relu, commandes déjà traitées non rappelées
+        self.assertEqual(send_order_reminders(send=self.send), (0, 0))
+
+    def test_failures_are_counted_and_skipped(self):
+        def send(order):
+            if order["customer"]["email"] == "client2@example.com":
+                raise RuntimeError("SMTP indisponible")
+            self.send(order)
+
+        with self.assertLogs("crm.reminders", level="ERROR"):
+            self.assertEqual(send_order_reminders(send=send), (3, 1))
+        self.assertEqual(send_order_reminders(send=send), (0, 0))
+
+
+class SalesRollupTests(CrmGraphQLTestCase):
+    QUERY = """
+        query ($granularity: RevenueGranularity, $productId: Int, $status: String) {
+            revenueByPeriod(granularity: $granularity, productId: $productId, status: $status) {
+                period orderCount quantity revenue
+            }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(first_name="Client", last_name="R", email="rollup@example.com")
+        self.products = [
+            Product.objects.create(name=f"P{i}", price=Decimal("10.00") * (i + 1), stock_quantity=1000)
+            for i in range(2)
+        ]
+
+    def order(self, quantities):
+        # Quantité 0 : produit absent de la commande
+        lines = [(p.pk, q) for p, q in zip(self.products, quantities) if q]
+        return OrderSpec(self.customer.pk, [pk for pk, _ in lines], [q for _, q in lines])
+
+    def rollup(self):
+        return (
+            sorted(DailyStatusSales.objects.values_list("status", "order_count", "revenue")),
+            sorted(DailyProductSales.objects.values_list("product_id", "order_count", "quantity", "revenue")),
+        )
+
+    def revenue(self, **variables):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.query(self.QUERY, variables=variables)
+        self.assertResponseNoErrors(response)
+        return [q["sql"] for q in ctx.captured_queries], response.json()["data"]["revenueByPeriod"]
+
+    def test_create_orders_increments_the_rollup(self):
+        create_orders([self.order([1, 2])])
+        with CaptureQueriesContext(connection) as ctx:
+            create_orders([self.order([1, 0]), self.order([3, 1])])
+        rollup_writes = [q["sql"] for q in ctx.captured_queries if '"crm_daily' in q["sql"]]
+        # INSERT ... DO NOTHING puis UPDATE, par table
+        self.assertEqual(len(rollup_writes), 4)
+
+        first, second = self.products
+        self.assertEqual(self.rollup(), (
+            [("pending", 3, Decimal("110.00"))],
+            [(first.pk, 3, 5, Decimal("50.00")), (second.pk, 2, 3, Decimal("60.00"))],
+        ))
+
+    def test_increment_is_chunked_by_key(self):
+        first, second = self.products
+        day = timezone.localdate()
+        rows = {
+            (day, first.pk): {"order_count": 1, "quantity": 2, "revenue": Decimal("20.00")},
+            (day, second.pk): {"order_count": 1, "quantity": 1, "revenue": Decimal("20.00")},
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            rollup._increment(DailyProductSales, ("day", "product_id"), rows, chunk_size=1)
+            rollup._increment(DailyProductSales, ("day", "product_id"), rows, chunk_size=1)
+        # INSERT ... DO NOTHING puis UPDATE, par paquet d'une clé
+        self.assertEqual(sum('"crm_daily' in q["sql"] for q in ctx.captured_queries), 8)
+        self.assertEqual(self.rollup()[1], [
+            (first.pk, 2, 4, Decimal("40.00")), (second.pk, 2, 2, Decimal("40.00")),
+        ])
+
+    def test_revenue_by_period_reads_only_the_rollup(self):
+        create_orders([self.order([1, 1]), self.order([2, 0])])
+        queries, rows = self.revenue(granularity="MONTH")
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"crm_dailystatussales"', queries[0])
+        self.assertNotIn('"crm_order"', queries[0])
+        month_start = timezone.localdate().replace(day=1).isoformat()
+        self.assertEqual(rows, [{"period": month_start, "orderCount": 2, "quantity": None, "revenue": "50.00"}])
+
+        _, rows = self.revenue(productId=self.products[0].pk)
+        self.assertEqual([(r["orderCount"], r["quantity"], r["revenue"]) for r in rows], [(2, 3, "30.00")])
+
+        _, rows = self.revenue(status="paid")
+        self.assertEqual(rows, [])
+
+    def test_unit_writes_and_rebuild_match_incremental_totals(self):
+        create_orders([self.order([1, 1]), self.order([2, 3])])
+        expected = self.rollup()
+
+        order = Order.objects.order_by("pk").first()
+        order.status = "paid"
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        statuses, _ = self.rollup()
+        self.assertEqual(statuses, [("paid", 1, Decimal("30.00")), ("pending", 1, Decimal("80.00"))])
+        order.status = "pending"
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertEqual(self.rollup(), expected)
+
+        DailyStatusSales.objects.all().delete()
+        DailyProductSales.objects.update(quantity=0)
+        out = io.StringIO()
+        call_command("rebuild_sales_rollup", stdout=out)
+        self.assertIn("2 commandes agrégées", out.getvalue())
+        self.assertEqual(self.rollup(), expected)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.all().delete()
+        self.assertEqual(self.rollup(), ([], []))
+
+    def test_cascade_delete_refreshes_each_day_once(self):
+        create_orders([self.order([1, 1]), self.order([2, 3])])
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            # Deux commandes et leurs quatre lignes : un seul recalcul du jour
+            self.customer.delete()
+        recomputes = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('DELETE FROM "crm_dailystatussales"')]
+        self.assertEqual(len(recomputes), 1)
+        self.assertEqual(self.rollup(), ([], []))
+
+    def test_invalid_arguments(self):
+        response = self.query('query { revenueByPeriod(status: "paid", productId: 1) { revenue } }')
+        self.assertResponseHasErrors(response)
+        response = self.query('query { revenueByPeriod(from: "2024-02-01", to: "2024-01-01") { revenue } }')
+        self.assertResponseHasErrors(response)
+
+
+@override_settings(CRM_EXPORT={"CHUNK_SIZE": 2, "LINES_PER_WRITE": 3})
+class ExportTests(TestCase):
+    def setUp(self):
+        seed_orders(5, items_per_order=2)
+        Order.objects.filter(pk=Order.objects.order_by("pk").first().pk).update(status="paid")
+        self.user = User.objects.create_user("export")
+        self.user.user_permissions.add(
+            *Permission.objects.filter(codename__in=["view_order", "view_customer"])
+        )
+        self.client.force_login(self.user)
+
+    def export(self, path):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            body = b"".join(response.streaming_content).decode("utf-8")
+        # Requêtes de l'export, sans celles de la session et des permissions
+        return [q["sql"] for q in ctx.captured_queries if '"crm_' in q["sql"]], body
+
+    def test_orders_csv_has_one_row_per_item(self):
+        queries, body = self.export("/export/orders")
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 10)
+        first = rows[0]
+        self.assertEqual((first["status"], first["total_amount"], first["customer_email"]),
+                         ("paid", "30.00", "client0@example.com"))
+        self.assertEqual((first["product_name"], first["quantity"], first["unit_price"]), ("Produit 0", "1", "10.00"))
+        # Une requête pour les commandes jointes aux clients, lue par paquets de 2,
+        # et une requête de lignes jointes aux produits par paquet
+        self.assertEqual(len(queries), 1 + 3)
+        self.assertTrue(all("LIMIT" not in sql and "COUNT" not in sql for sql in queries))
+
+    def test_filters_and_ndjson(self):
+        _, body = self.export("/export/orders?format=ndjson&status=paid")
+        [record] = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(record["status"], "paid")
+        self.assertEqual([item["product_name"] for item in record["items"]], ["Produit 0", "Produit 1"])
+
+        _, body = self.export("/export/customers?format=ndjson&order_by=-created_at&email=client3@example.com")
+        [customer] = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual((customer["last_name"], customer["order_count"], customer["lifetime_revenue"]),
+                         ("3", 1, "30.00"))
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get("/export/orders?status=lost").status_code, 400)
+        self.assertEqual(self.client.get("/export/orders?format=xml").status_code, 400)
+        self.assertEqual(self.client.get("/export/invoices").status_code, 404)
+
+    def test_anonymous_requests_are_redirected_to_login(self):
+        self.client.logout()
+        for kind in ("customers", "orders"):
+            response = self.client.get(f"/export/{kind}")
+            self.assertEqual(response.status_code, 302)
+            self.assertIn(settings.LOGIN_URL, response["Location"])
+
+    def test_view_permissions_are_required(self):
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        self.assertEqual(self.client.get("/export/customers").status_code, 403)
+        # Commandes : view_order ne suffit pas, les lignes contiennent les clients
+        self.user.user_permissions.remove(Permission.objects.get(codename="view_customer"))
+        self.client.force_login(User.objects.get(pk=self.user.pk))
+        self.assertEqual(self.client.get("/export/orders").status_code, 403)
+        self.assertEqual(self.client.get("/export/customers").status_code, 403)
+
+    def test_formulas_are_escaped_in_csv(self):
+        Customer.objects.filter(email="client0@example.com").update(
+            first_name="=HYPERLINK(\"http://example.com\")", last_name="@SUM(A1)", phone="+33600000000",
+        )
+        _, body = self.export("/export/customers?email=client0@example.com")
+        [row] = csv.DictReader(io.StringIO(body))
+        self.assertEqual(row["first_name"], "'=HYPERLINK(\"http://example.com\")")
+        self.assertEqual(row["last_name"], "'@SUM(A1)")
+        self.assertEqual(row["phone"], "+33600000000")
+        # NDJSON : valeurs telles quelles
+        _, body = self.export("/export/customers?format=ndjson&email=client0@example.com")
+        self.assertEqual(json.loads(body)["last_name"], "@SUM(A1)")
+
+
+@override_settings(CRM_DATABASE_ROUTING={"PRIMARY": "default", "REPLICAS": ["replica"], "PIN_SECONDS": 5})
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Primaire : la base de test ; réplica : un second fichier SQLite, migré
+    mais jamais répliqué. Une ligne n'existant que d'un côté montre où la
+    lecture a été faite.
+    """
+
+    PRODUCTS = "query { allProducts { edges { node { name } } } }"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        replica = {"ENGINE": "django.db.backends.sqlite3", "NAME": os.path.join(cls.replica_dir.name, "replica.sqlite3")}
+        configured = connections.configure_settings({"default": dict(connections.settings["default"]), "replica": replica})
+        connections.settings["replica"] = configured["replica"]
+        call_command("migrate", database="replica", verbosity=0)
+        # Alias créé par le test : inconnu du lanceur (bases de test, checks)
+        cls.databases = {"default", "replica"}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        cls.replica_dir.cleanup()
+
+    def setUp(self):
+        caches[response_cache.alias].clear()
+        routing._pools.clear()
+        Product.objects.create(name="Primaire", price=Decimal("1.00"))
+        Product.objects.using("replica").create(name="Réplica", price=Decimal("1.00"))
+
+    def graphql(self, client, query):
+        response = client.post("/graphql", {"query": query}, content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["data"]
+
+    def product_names(self, client):
+        data = self.graphql(client, self.PRODUCTS)
+        return [edge["node"]["name"] for edge in data["allProducts"]["edges"]]
+
+    def test_queries_read_replica_and_writers_stay_on_primary(self):
+        self.assertEqual(self.product_names(self.client), ["Réplica"])
+
+        data = self.graphql(
+            self.client,
+            'mutation { createProduct(name: "Nouveau", price: 2, stockQuantity: 1) { success } }',
+        )
+        self.assertTrue(data["createProduct"]["success"])
+        self.assertIn("crm_primary", self.client.cookies)
+        self.assertFalse(Product.objects.using("replica").filter(name="Nouveau").exists())
+
+        # Le client qui vient d'écrire lit le primaire ; les autres, le réplica
+        self.assertEqual(self.product_names(self.client), ["Primaire", "Nouveau"])
+        caches[response_cache.alias].clear()
+        self.assertEqual(self.product_names(Client()), ["Réplica"])
+
+    def test_unreachable_replica_is_ejected(self):
+        with mock.patch.object(routing.ReplicaPool, "is_healthy", return_value=False):
+            self.assertEqual(self.product_names(self.client), ["Primaire"])
+        self.assertEqual(routing.get_pool().ejected(), ["replica"])
+        # Écarté EJECT_SECONDS, même redevenu joignable
+        self.assertEqual(self.product_names(self.client), ["Primaire"])
+
+    def test_round_robin_skips_ejected_replicas(self):
+        pool = routing.ReplicaPool(["r1", "r2", "r3"], eject_seconds=60)
+        down = {"r2"}
+        with mock.patch.object(routing.ReplicaPool, "is_healthy", side_effect=lambda alias: alias not in down):
+            self.assertEqual([pool.choose() for _ in range(4)], ["r1", "r3", "r1", "r3"])
+            self.assertEqual(pool.ejected(), ["r2"])
+            down.update({"r1", "r3"})
+            self.assertIsNone(pool.choose())
+
+
+class InactiveCustomerCleanupTests(TestCase):
+    def setUp(self):
+        seed_orders(4, items_per_order=2)
+        long_ago = timezone.now() - timedelta(days=400)
+        self.customers = list(Customer.objects.order_by("pk"))
+        # client0 : ancienne commande ; client1 : commande récente ;
+        # client2 : aucune commande ; client3 : créé récemment, sans commande
+        Customer.objects.filter(pk__in=[c.pk for c in self.customers[:3]]).update(created_at=long_ago)
+        Order.objects.filter(customer=self.customers[0]).update(order_date=long_ago)
+        Order.objects.filter(customer__in=self.customers[2:]).delete()
+
+    def remaining(self):
+        return sorted(Customer.objects.values_list("email", flat=True))
+
+    def test_batches_delete_inactive_customers_and_their_orders(self):
+        with CaptureQueriesContext(connection) as ctx:
+            batches = list(iter_cleanup(chunk_size=2, sleep=0))
+        self.assertEqual([(count, deleted) for _, count, deleted in batches], [(2, 1), (2, 1)])
+        self.assertEqual(self.remaining(), ["client1@example.com", "client3@example.com"])
+        self.assertFalse(Order.objects.filter(customer_id=self.customers[0].pk).exists())
+        self.assertEqual(OrderItem.objects.count(), 2)
+        self.assertEqual(checkpoints.load(CLEANUP_CHECKPOINT), {})
+        # Pas de collecte en cascade : ni SELECT des commandes, ni DELETE par objet
+        statements = [q["sql"] for q in ctx.captured_queries]
+        self.assertFalse(any(sql.startswith('SELECT "crm_order') for sql in statements))
+        # Par lot : lignes, commandes, clients, index de recherche ; puis la position,
+        # et les deux agrégats du jour de la commande supprimée (recalculé)
+        self.assertEqual(sum(sql.startswith("DELETE") for sql in statements), 2 * 4 + 1 + 2)
+
+    def test_raw_delete_contract(self):
+        # API privée de Django utilisée par delete_customers : un DELETE, pas de signal
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append(sender)
+
+        for signal in (pre_delete, post_delete):
+            signal.connect(receiver, sender=OrderItem, weak=False)
+            self.addCleanup(signal.disconnect, receiver, sender=OrderItem)
+        items = OrderItem.objects.filter(order__customer=self.customers[0])
+        with CaptureQueriesContext(connection) as ctx:
+            deleted = cleanup._raw_delete(items)
+        self.assertEqual(deleted, 2)
+        self.assertEqual([q["sql"].split()[0] for q in ctx.captured_queries], ["DELETE"])
+        self.assertEqual(received, [])
+        self.assertFalse(items.exists())
+
+    def test_interrupted_run_resumes_after_last_batch(self):
+        run = iter_cleanup(chunk_size=1, sleep=0)
+        next(run)
+        run.close()
+        position = checkpoints.load(CLEANUP_CHECKPOINT)
+        self.assertEqual(position["after_id"], self.customers[0].pk)
+
+        out = io.StringIO()
+        call_command("clean_inactive_customers", chunk_size=1, sleep=0, stdout=out)
+        self.assertIn("supprimés : 1 (3 parcourus", out.getvalue())
+        self.assertEqual(self.remaining(), ["client1@example.com", "client3@example.com"])
+
+    def test_chunk_size_must_be_positive(self):
+        for chunk_size in (0, -1):
+            with self.assertRaisesMessage(CommandError, "--chunk-size doit être au moins 1"):
+                call_command("clean_inactive_customers", chunk_size=chunk_size, stdout=io.StringIO())
+        self.assertEqual(len(self.remaining()), 4)
+
+
+class RestockJobTests(CrmGraphQLTestCase):
+    START = """
+        mutation { startRestock(minStock: 10, incrementBy: 50) { success message jobId } }
+    """
+    STATUS = """
+        query($id: UUID!) {
+            jobStatus(id: $id) { status progress shardsTotal shardsDone processed result error }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        eager_celery(self)
+        self.products = [
+            Product.objects.create(name=f"Produit {i}", price=Decimal("1.00"), stock_quantity=i % 2 * 100)
+            for i in range(10)
+        ]
+
+    def job_status(self, job_id):
+        response = self.query(self.STATUS, variables={"id": job_id})
+        self.assertResponseNoErrors(response)
+        return response.json()["data"]["jobStatus"]
+
+    def test_shards_cover_the_id_space(self):
+        low = Product.objects.filter(stock_quantity__lt=10)
+        first, last = self.products[0].pk, self.products[-2].pk
+        self.assertEqual(
+            jobs.id_shards(low, shard_size=4),
+            [(first, first + 4), (first + 4, first + 8), (first + 8, last + 1)],
+        )
+        self.assertEqual(jobs.id_shards(low.none(), shard_size=4), [])
+
+    def test_start_restock_fans_out_and_aggregates(self):
+        with self.settings(CRM_JOBS={"SHARD_SIZE": 3}), self.captureOnCommitCallbacks(execute=True):
+            response = self.query(self.START)
+        self.assertResponseNoErrors(response)
+        data = response.json()["data"]["startRestock"]
+        self.assertTrue(data["success"])
+        self.assertIn("3 tranche(s)", data["message"])
+
+        status = self.job_status(data["jobId"])
+        self.assertEqual(
+            status,
+            {"status": "SUCCESS", "progress": 1.0, "shardsTotal": 3, "shardsDone": 3,
+             "processed": 5, "result": json.dumps({"updatedCount": 5}), "error": ""},
+        )
+        self.assertEqual(set(Product.objects.values_list("stock_quantity", flat=True)), {50, 100})
+
+    def test_job_status_is_polled_while_pending(self):
+        response = self.query(self.START)
+        job_id = response.json()["data"]["startRestock"]["jobId"]
+        self.assertEqual(self.job_status(job_id)["status"], "PENDING")
+        # Les tâches partent au commit ; l'avancement n'est pas servi depuis le cache
+        jobs.add_progress(job_id, processed=2, shards_done=1)
+        status = self.job_status(job_id)
+        self.assertEqual((status["status"], status["processed"], status["progress"]), ("RUNNING", 2, 1.0))
+
+    def test_progress_from_a_worker_process_is_not_served_stale(self):
+        directory = shared_file_caches(self)
+        response = self.query(self.START)
+        job_id = response.json()["data"]["startRestock"]["jobId"]
+        self.assertEqual(self.job_status(job_id)["status"], "PENDING")
+        # Avancement écrit par un worker Celery : invalidation faite par un autre processus
+        with mock.patch.object(jobs, "response_cache", OtherProcessResponseCache(directory)), \
+                self.captureOnCommitCallbacks(execute=True):
+            jobs.add_progress(job_id, processed=2, shards_done=1)
+        status = self.job_status(job_id)
+        self.assertEqual((status["status"], status["processed"]), ("RUNNING", 2))
+
+    def test_failed_shard_fails_the_job(self):
+        job = Job.objects.create(kind="restock", shards_total=1)
+        with self.assertRaises(ValueError):
+            tasks.restock_shard.apply(args=(str(job.pk), None, 50, 1, 100))
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failure")
+        self.assertIn("Tranche [1, 100)", job.error)
+
+
+class ImportCrmTests(TestCase):
+    CUSTOMERS = (
+        "first_name,last_name,email,phone\n"
+        "Zoé,Martin,zoe@example.com,0600000000\n"
+        "Sans,Email,,\n"
+        "Paul,Durand,paul@example.com,\n"
+        "Paul,Doublon,paul@example.com,\n"
+        "Ada,Existante,ada@example.com,0611111111\n"
+        "Bad,Email,pas-un-email,\n"
+    )
+
+    def setUp(self):
+        Customer.objects.create(first_name="Ada", last_name="Lovelace", email="ada@example.com")
+
+    def import_file(self, content, suffix, *args, **options):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        out, err = io.StringIO(), io.StringIO()
+        call_command("import_crm", *args, path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_customers_are_validated_and_deduplicated(self):
+        out, err = self.import_file(self.CUSTOMERS, ".csv", "customers", batch_size=3)
+        self.assertIn("6 lignes", out)
+        self.assertIn("2 créées, 0 mises à jour, 2 ignorées, 2 invalides", out)
+        self.assertIn("Ligne 3 : email : champ requis", err)
+        self.assertIn("Ligne 7 :", err)
+        self.assertEqual(Customer.objects.get(email="paul@example.com").last_name, "Durand")
+        self.assertEqual(Customer.objects.get(email="ada@example.com").last_name, "Lovelace")
+        # bulk_create n'émet pas post_save : lignes indexées à chaque lot
+        found = get_search_backend().search(Customer.objects.all(), "zoe")
+        self.assertEqual([c.email for c in found], ["zoe@example.com"])
+
+    def test_only_imported_rows_are_indexed(self):
+        search = get_search_backend()
+        with mock.patch.object(search, "rebuild") as rebuild, \
+                mock.patch.object(search, "index_many", wraps=search.index_many) as index_many:
+            self.import_file(self.CUSTOMERS, ".csv", "customers", on_conflict="update")
+        rebuild.assert_not_called()
+        [(_, pks), _] = index_many.call_args
+        self.assertEqual(
+            sorted(pks),
+            sorted(Customer.objects.filter(
+                email__in=["zoe@example.com", "paul@example.com", "ada@example.com"]
+            ).values_list("pk", flat=True)),
+        )
+        # Client mis à jour : nouvelles valeurs cherchables
+        found = search.search(Customer.objects.all(), "existante")
+        self.assertEqual([c.email for c in found], ["ada@example.com"])
+
+    def test_one_in_query_per_batch(self):
+        rows = iter_csv(io.StringIO(self.CUSTOMERS))
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in iter_import("customers", rows, batch_size=3):
+                pass
+        selects = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('SELECT "crm_customer"."email"')]
+        self.assertEqual(len(selects), 2)
+
+    def test_batch_size_must_be_positive(self):
+        for batch_size in (0, -1):
+            with self.assertRaisesMessage(CommandError, "--batch-size doit être au moins 1"):
+                self.import_file(self.CUSTOMERS, ".csv", "customers", batch_size=batch_size)
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_update_conflicts(self):
+        out, _ = self.import_file(self.CUSTOMERS, ".csv", "customers", on_conflict="update")
+        self.assertIn("2 créées, 1 mises à jour, 1 ignorées, 2 invalides", out)
+        ada = Customer.objects.get(email="ada@example.com")
+        self.assertEqual((ada.last_name, ada.phone), ("Existante", "0611111111"))
+        self.assertEqual(Customer.objects.get(email="paul@example.com").last_name, "Doublon")
+
+    def test_products_from_ndjson(self):
+        content = "\n".join([
+            json.dumps({"name": "Clavier", "price": "49.90", "stock_quantity": 3}),
+            "{pas du json",
+            json.dumps({"name": "Souris", "price": -1}),
+            json.dumps({"name": "Écran", "price": 199, "is_available": "non"}),
+            "",
+        ])
+        out, err = self.import_file(content, ".ndjson", "products")
+        self.assertIn("2 créées", out)
+        self.assertIn("Ligne 2 : JSON invalide", err)
+        self.assertIn("Ligne 3 : price", err)
+        self.assertEqual(
+            list(Product.objects.order_by("name").values_list("name", "price", "stock_quantity", "is_available")),
+            [("Clavier", Decimal("49.90"), 3, True), ("Écran", Decimal("199.00"), 0, False)],
+        )
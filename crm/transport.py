@@ -0,0 +1,79 @@
+# crm/transport.py
+"""
+Transport gql exécutant les opérations directement sur le schéma du
+processus (alx_backend_graphql.schema.schema) : ni aller-retour HTTP, ni
+requête d'introspection, ni dépendance au serveur web. Utilisé par les tâches
+Celery (crm/tasks.py) et les jobs cron (crm/cron.py).
+
+Le LocalSchemaTransport fourni par gql est asynchrone : sous Client.execute
+il tourne dans une boucle asyncio, où l'ORM synchrone de Django est refusé.
+Celui-ci exécute l'opération de manière synchrone, comme la vue WSGI.
+
+Module (et gql) importé à l'appel par les tâches et les jobs, pas à leur
+import : le démarrage du worker Celery et de manage.py n'en paie pas le coût.
+"""
+from functools import lru_cache
+from types import SimpleNamespace
+
+from gql import Client, gql
+from gql.transport import Transport
+from graphql import execute_sync, get_operation_ast
+
+from . import routing
+from .metrics import metrics
+from .middleware import ResolverMetricsMiddleware
+
+
+def default_schema():
+    # Schéma du projet, construit une fois et partagé avec les vues
+    from alx_backend_graphql.schema import schema
+
+    return schema
+
+
+@lru_cache(maxsize=128)
+def document(source):
+    """Requête gql analysée une fois par processus (documents constants des tâches et jobs)."""
+    return gql(source)
+
+
+class LocalSchemaTransport(Transport):
+    """Transport gql synchrone sur un schéma graphene local."""
+
+    def __init__(self, schema=None):
+        self._schema = schema
+
+    @property
+    def schema(self):
+        if self._schema is None:
+            self._schema = default_schema()
+        return self._schema
+
+    def get_context(self, request):
+        # Un contexte par opération : loaders et mémos (crmStats) n'y survivent pas
+        return SimpleNamespace(user=None, graphql_async=False)
+
+    def get_middleware(self):
+        return [ResolverMetricsMiddleware()] if metrics.enabled else []
+
+    def execute(self, request, *args, **kwargs):
+        operation_ast = get_operation_ast(request.document, request.operation_name)
+        operation_type = operation_ast.operation if operation_ast else None
+        with routing.operation(operation_type), metrics.profile(request.operation_name):
+            return execute_sync(
+                self.schema.graphql_schema,
+                request.document,
+                context_value=self.get_context(request),
+                variable_values=request.variable_values,
+                operation_name=request.operation_name,
+                middleware=self.get_middleware(),
+            )
+
+
+def local_client(schema=None):
+    """
+    Client gql sur le schéma local. Le document est validé côté client
+    contre ce même schéma (execute_sync ne valide pas).
+    """
+    transport = LocalSchemaTransport(schema)
+    return Client(schema=transport.schema.graphql_schema, transport=transport)
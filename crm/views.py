@@ -1,3 +1,345 @@
-from django.shortcuts import render
+import json
+from inspect import isawaitable
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.db import connection, transaction
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.views.decorators.http import require_GET
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, OperationType, execute, execute_sync, get_operation_ast
+from graphql.error import GraphQLError
+
+from . import routing
+from .complexity import query_cost
+from .documents import document_cache, persisted_queries
+from .exports import EXPORTS, FORMATS, select, stream
+from .metrics import metrics
+from .middleware import AsyncORMMiddleware, ResolverMetricsMiddleware
+from .response_cache import response_cache
+from .sqlite import write_atomic
+
+
+class CachedGraphQLView(GraphQLView):
+    """
+    GraphQLView avec requêtes persistées (protocole APQ) et cache LRU des
+    documents analysés et validés : une requête déjà vue est exécutée
+    directement, sans repasser par parse() ni validate(). Les réponses des
+    opérations `query` passent par le cache de réponses.
+    """
+
+    document_cache = document_cache
+    persisted_queries = persisted_queries
+    response_cache = response_cache
+    query_cost = query_cost
+    metrics = metrics
+
+    def get_middleware(self, request):
+        middleware = list(super().get_middleware(request) or ())
+        if self.metrics.enabled:
+            middleware.append(ResolverMetricsMiddleware())
+        return middleware
+
+    @staticmethod
+    def get_extensions(request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        return extensions or {}
+
+    def get_document(self, request, data, query):
+        """Retourne (query, document, erreurs) après résolution APQ et cache."""
+        try:
+            query = self.persisted_queries.resolve(query, self.get_extensions(request, data))
+        except GraphQLError as error:
+            return query, None, [error]
+        if not query:
+            return query, None, None
+        document, errors = self.document_cache.get(self.schema.graphql_schema, query)
+        return query, document, errors
+
+    def check_cost(self, request, document, variables, operation_name):
+        """
+        Calcule le coût de l'opération (rapporté dans `extensions`) et retourne
+        les erreurs si elle dépasse le budget : elle n'est alors pas exécutée.
+        """
+        cost, errors = self.query_cost.validate(self.schema.graphql_schema, document, variables, operation_name)
+        request.graphql_cost = cost
+        return errors
+
+    def get_result_extensions(self, request, execution_result):
+        extensions = dict(execution_result.extensions or {})
+        cost = getattr(request, "graphql_cost", None)
+        if cost is not None:
+            extensions["cost"] = {
+                "cost": cost.cost,
+                "depth": cost.depth,
+                "maxCost": self.query_cost.max_cost,
+                "maxDepth": self.query_cost.max_depth,
+            }
+        return extensions
+
+    def add_profile(self, request, result, profile):
+        """Ajoute le profil des résolveurs à `extensions` si l'en-tête de debug est présent."""
+        if profile is not None and self.metrics.debug_requested(request):
+            result.extensions = {**(result.extensions or {}), "profile": profile.summary()}
+        return result
+
+    def execute_document(self, request, document, variables, operation_name):
+        with self.metrics.profile(operation_name) as profile:
+            result = execute_sync(
+                self.schema.graphql_schema,
+                document,
+                root_value=self.get_root_value(request),
+                context_value=self.get_context(request),
+                variable_values=variables,
+                operation_name=operation_name,
+                middleware=self.get_middleware(request),
+                execution_context_class=self.execution_context_class,
+            )
+        return self.add_profile(request, result, profile)
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.encode_result(request, execution_result, id, show_graphiql)
+
+    def encode_result(self, request, execution_result, id=None, show_graphiql=False):
+        """Sérialise un ExecutionResult : (corps JSON, code HTTP), comme GraphQLView.get_response."""
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if not execution_result:
+            return None, status_code
+
+        response = {}
+        if execution_result.errors:
+            set_rollback()
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.errors and any(
+            not getattr(e, "path", None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+
+        extensions = self.get_result_extensions(request, execution_result)
+        if extensions:
+            response["extensions"] = extensions
+
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        query, document, errors = self.get_document(request, data, query)
+        if errors:
+            return ExecutionResult(errors=errors)
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if request.method.lower() == "get":
+            if operation_ast and operation_ast.operation != OperationType.QUERY:
+                if show_graphiql:
+                    return None
+
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["POST"],
+                        "Can only perform a {} operation from a POST request.".format(
+                            operation_ast.operation.value
+                        ),
+                    )
+                )
+
+        errors = self.check_cost(request, document, variables, operation_name)
+        if errors:
+            return ExecutionResult(errors=errors)
+
+        operation_type = operation_ast.operation if operation_ast else None
+        with routing.operation(operation_type):
+            return self.execute_operation(request, document, query, variables, operation_name, operation_type)
+
+    def execute_operation(self, request, document, query, variables, operation_name, operation_type):
+        try:
+            if (
+                operation_type == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with write_atomic():
+                    result = self.execute_document(request, document, variables, operation_name)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            if operation_type == OperationType.QUERY and self.response_cache.enabled:
+                return self.response_cache.fetch(
+                    request, self.schema.graphql_schema, query, document, variables, operation_name,
+                    lambda: self.execute_document(request, document, variables, operation_name),
+                )
+
+            return self.execute_document(request, document, variables, operation_name)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+class AsyncGraphQLView(CachedGraphQLView):
+    """
+    Variante asynchrone pour le déploiement ASGI : les opérations `query` sont
+    exécutées par l'exécuteur asynchrone de graphql-core, les résolveurs de
+    relations utilisant les DataLoaders et l'ORM asynchrones (aload, ain_bulk,
+    async for). Les mutations, qui ont besoin de transactions, passent par
+    l'exécuteur synchrone dans un thread (sync_to_async).
+    GraphiQL et les requêtes groupées (batch) passent par la vue synchrone.
+    """
+
+    view_is_async = True
+
+    def get_middleware(self, request):
+        # AsyncORMMiddleware au plus près des résolveurs
+        return [AsyncORMMiddleware(), *(super().get_middleware(request) or ())]
+
+    def error_response(self, request, error):
+        response = error.response
+        response["Content-Type"] = "application/json"
+        response.content = self.json_encode(request, {"errors": [self.format_error(error)]})
+        return response
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() not in ("get", "post") or self.batch:
+            return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+        try:
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+            result, status_code = await self.aget_response(request, data)
+            return HttpResponse(status=status_code, content=result, content_type="application/json")
+        except HttpError as e:
+            return self.error_response(request, e)
+
+    async def aget_response(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = await self.aexecute_graphql_request(
+            request, data, query, variables, operation_name
+        )
+        return self.encode_result(request, execution_result, id)
+
+    async def aexecute_document(self, request, document, variables, operation_name):
+        with self.metrics.profile(operation_name) as profile:
+            result = execute(
+                self.schema.graphql_schema,
+                document,
+                root_value=self.get_root_value(request),
+                context_value=self.get_context(request),
+                variable_values=variables,
+                operation_name=operation_name,
+                middleware=self.get_middleware(request),
+                execution_context_class=self.execution_context_class,
+            )
+            if isawaitable(result):
+                result = await result
+        return self.add_profile(request, result, profile)
+
+    async def aexecute_graphql_request(self, request, data, query, variables, operation_name):
+        query, document, errors = self.get_document(request, data, query)
+        if errors:
+            return ExecutionResult(errors=errors)
+        if not query:
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return await sync_to_async(self.execute_graphql_request)(
+                request, data, query, variables, operation_name
+            )
+
+        errors = self.check_cost(request, document, variables, operation_name)
+        if errors:
+            return ExecutionResult(errors=errors)
+
+        # Utilisateur chargé ici : le cache de réponses en dépend
+        request.user = await request.auser()
+        request.graphql_async = True
+        with routing.read_replica():
+            try:
+                if self.response_cache.enabled:
+                    return await self.response_cache.afetch(
+                        request, self.schema.graphql_schema, query, document, variables, operation_name,
+                        lambda: self.aexecute_document(request, document, variables, operation_name),
+                    )
+                return await self.aexecute_document(request, document, variables, operation_name)
+            except Exception as e:
+                return ExecutionResult(errors=[e])
+
+
+def graphql_stats(request):
+    """Compteurs des caches GraphQL (documents et réponses)."""
+    return JsonResponse({"documents": document_cache.stats(), "responses": response_cache.stats()})
+
+
+def graphql_metrics(request):
+    """Histogrammes des résolveurs au format texte Prometheus."""
+    body = metrics.sink.render_prometheus()
+    if body is None:
+        raise Http404("Le sink de métriques configuré n'expose pas de format Prometheus.")
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@require_GET
+@login_required
+def export(request, kind):
+    """
+    Export en flux des commandes ou des clients (crm/exports.py), filtré par
+    les paramètres d'OrderFilter / CustomerFilter ; ?format=csv (défaut) ou ndjson.
+    Réservé aux utilisateurs qui ont les permissions view_* de l'export (403 sinon).
+    """
+    exporter = EXPORTS.get(kind)
+    if exporter is None:
+        raise Http404(f"Export inconnu : {kind}")
+    if not request.user.has_perms(exporter.permissions):
+        raise PermissionDenied
+    params = request.GET.copy()
+    format = params.pop("format", ["csv"])[-1]
+    if format not in FORMATS:
+        return HttpResponseBadRequest(f"Format inconnu : {format}")
+
+    with routing.read_replica() as alias:
+        queryset, errors = select(exporter, params)
+    if errors:
+        return JsonResponse({"errors": errors.get_json_data()}, status=400)
+    if alias is not None:
+        # Lu après la vue, hors de l'état de routage de la requête
+        queryset = queryset.using(alias)
+    _, content_type = FORMATS[format]
+    response = StreamingHttpResponse(stream(exporter, queryset, format), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{kind}.{format}"'
+    return response
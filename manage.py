@@ -6,6 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
+    if sys.argv[1:2] == ['test']:
+        # Caches en mémoire pour les tests (pas de Redis requis)
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql.test_settings')
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql.settings')
     try:
         from django.core.management import execute_from_command_line